@@ -2,11 +2,13 @@
 认证相关API路由
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 import asyncio
 import logging
+from datetime import datetime, timedelta
 from functools import wraps
 
+from services.async_runtime import run_sync
 from services.auth_service import auth_service
 from services.supabase_client import db_client
 
@@ -14,11 +16,15 @@ logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+# 使用统计最多回看的天数：小时曲线 / 天曲线和汇总
+USAGE_HOURLY_MAX_DAYS = 7
+USAGE_DAILY_MAX_DAYS = 365
+
 def async_route(f):
-    """装饰器：让Flask路由支持异步函数"""
+    """装饰器：让Flask路由支持异步函数（在进程常驻的事件循环上执行，不再每个请求新建循环）"""
     @wraps(f)
     def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
+        return run_sync(f(*args, **kwargs))
     return wrapper
 
 def jwt_required(f):
@@ -43,7 +49,8 @@ def jwt_required(f):
                 return jsonify({'error': 'Token is invalid or expired'}), 401
             
             request.current_user = payload
-            return f(*args, **kwargs)
+            # 被装饰的视图可能是 async 函数，交给 Flask 转换成同步调用
+            return current_app.ensure_sync(f)(*args, **kwargs)
         except Exception as e:
             logger.error(f"JWT verification error: {e}")
             return jsonify({'error': 'Token verification failed'}), 401
@@ -373,3 +380,53 @@ async def check_api_usage():
             'error': str(e),
             'message': '检查API使用情况时发生错误'
         }), 500
+
+@auth_bp.route('/usage', methods=['GET'])
+@jwt_required
+@async_route
+async def get_api_usage_stats():
+    """
+    API使用统计（读小时 / 天汇总表）
+    
+    参数: granularity=hour|day（默认 day），days=回看天数，endpoint=只看某个路由
+    """
+    try:
+        user_id = request.current_user['user_id']
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ('hour', 'day'):
+            return jsonify({'success': False, 'error': 'granularity must be hour or day'}), 400
+        
+        max_days = USAGE_HOURLY_MAX_DAYS if granularity == 'hour' else USAGE_DAILY_MAX_DAYS
+        days = max(1, min(request.args.get('days', 7 if granularity == 'hour' else 30, type=int), max_days))
+        endpoint = request.args.get('endpoint') or None
+        
+        now = datetime.utcnow()
+        since_date = (now - timedelta(days=days - 1)).date().isoformat()
+        since = (now - timedelta(days=days)).isoformat() + 'Z' if granularity == 'hour' else since_date
+        
+        summary, series, quota = await asyncio.gather(
+            db_client.get_api_usage_summary(user_id, since_date),
+            db_client.get_api_usage_series(user_id, since, granularity, endpoint),
+            db_client.check_api_usage_limit(user_id)
+        )
+        if summary is None or series is None:
+            return jsonify({'success': False, 'error': '获取使用统计失败'}), 500
+        
+        totals = next((row for row in summary if row.get('endpoint') is None), None)
+        return jsonify({
+            'success': True,
+            'granularity': granularity,
+            'since': since,
+            'totals': totals,
+            'endpoints': [row for row in summary if row.get('endpoint') is not None],
+            'series': series,
+            'quota': quota
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error in usage stats endpoint: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': '获取API使用统计时发生错误'
+        }), 500
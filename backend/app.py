@@ -5,9 +5,11 @@ Beee Media 主应用文件
 
 import os
 import sys
+import json
 import logging
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from functools import wraps
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -22,7 +24,8 @@ load_dotenv()
 
 # 导入服务和配置
 from config.config import get_config
-from services.supabase_client import db_client
+from services.async_runtime import iterate_sync, run_sync
+from services.supabase_client import db_client, decode_keyset_cursor
 from services.sendgrid_client import email_client
 from services.auth_service import auth_service
 from api.auth import auth_bp, jwt_required
@@ -30,7 +33,13 @@ from api.auth import auth_bp, jwt_required
 # 导入现有的TikHub功能
 import sys
 sys.path.append('services')
-from services.comprehensive_search_client import ComprehensiveSearchClient
+from services.bio_analysis import analyze_bios
+from services.comprehensive_search_client import ComprehensiveSearchClient, TikHubError
+from services.creator_metrics import compute_metrics, score_creators
+from services.cursor_store import CursorState, CursorStore, SeenSet
+from services.result_cache import SearchResultCache
+from services.result_sets import NUMERIC_FIELDS, ResultSetStore
+from services.write_behind import SearchHistoryWriter, UsageLogWriter
 
 # 配置日志
 logging.basicConfig(
@@ -43,8 +52,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class AsyncRuntimeFlask(Flask):
+    """
+    async 视图在每个 worker 进程常驻的事件循环上执行
+
+    Flask 默认为每个 async 请求新建一个事件循环，连接池无法复用，也无法和其他请求并发；
+    这里改为提交到常驻循环，工作线程只负责等待结果，多个请求的上游 I/O 在同一个循环里并发。
+    这是同步 WSGI（gunicorn gthread）到异步代码的过渡层：并发请求数仍受每个 worker 的线程数
+    （GUNICORN_THREADS）限制，而一个 worker 里所有请求共用这一个循环，
+    所以在循环上执行的代码不能有阻塞调用，SQLite、文件、bcrypt 等一律经 asyncio.to_thread 执行
+    """
+    
+    def async_to_sync(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return run_sync(func(*args, **kwargs))
+        return wrapper
+
 # 创建Flask应用
-app = Flask(__name__)
+app = AsyncRuntimeFlask(__name__)
 
 # 加载配置
 config = get_config()
@@ -66,6 +92,38 @@ app.register_blueprint(auth_bp)
 # 创建TikHub客户端
 tikhub_client = ComprehensiveSearchClient()
 
+# 创作者搜索结果缓存（只缓存成功的结果）
+search_result_cache = SearchResultCache(
+    ttl=config.SEARCH_CACHE_TTL,
+    stale_ttl=config.SEARCH_CACHE_STALE_TTL,
+    max_entries=config.SEARCH_CACHE_MAX_ENTRIES,
+    should_cache=lambda result: bool(result and result.get('success'))
+)
+
+# 搜索分页游标（每页一次上游调用，跨页去重），各 worker 共用，翻页请求可以落到任意 worker
+cursor_store = CursorStore(config.SEARCH_STATE_DB, ttl=config.SEARCH_CURSOR_TTL, max_cursors=config.SEARCH_CURSOR_MAX)
+
+# 服务端结果集（排序/筛选/分页不再重新请求TikHub），和游标共用一个 SQLite 文件，各 worker 都能访问
+result_set_store = ResultSetStore(config.SEARCH_STATE_DB, ttl=config.RESULT_SET_TTL, max_sets=config.RESULT_SET_MAX)
+
+# 每页向TikHub请求的条数，以及可翻到的最大offset（与全量搜索一致）
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_OFFSET = 10000
+
+# API使用日志后台批量写入
+usage_log_writer = UsageLogWriter(
+    batch_size=config.USAGE_LOG_BATCH_SIZE,
+    flush_interval=config.USAGE_LOG_FLUSH_MS / 1000
+)
+
+# 搜索历史后台批量写入，数据库变慢或不可用时先写本地 spool
+search_history_writer = SearchHistoryWriter(
+    spool_path=config.SEARCH_HISTORY_SPOOL,
+    spool_max_bytes=config.SEARCH_HISTORY_SPOOL_MAX_MB * 1024 * 1024,
+    batch_size=config.SEARCH_HISTORY_BATCH_SIZE,
+    flush_interval=config.SEARCH_HISTORY_FLUSH_MS / 1000
+)
+
 # ================================
 # 静态文件服务
 # ================================
@@ -108,6 +166,51 @@ def before_request():
     if request.path.startswith('/api/'):
         request.start_time = datetime.utcnow()
 
+def current_user_payload():
+    """当前请求的登录用户（没有或无效token时为None）；jwt_required 之外的路由在这里解析token，结果缓存在请求上"""
+    payload = getattr(request, 'current_user', None)
+    if payload is None and request.headers.get('Authorization'):
+        try:
+            payload = auth_service.verify_jwt_token(request.headers['Authorization'].split(' ')[1])
+        except IndexError:
+            payload = None  # 忽略token格式错误
+        request.current_user = payload
+    return payload
+
+async def charge_api_usage():
+    """
+    计量：登录用户每次需要请求TikHub的调用计一次（请求参数校验通过之后、请求上游之前调用）
+
+    increment_api_usage 原子地检查额度并增加计数，已到上限时不再增加计数，返回429响应；
+    放行时返回None。匿名请求只受速率限制，数据库不可用时不拦截请求
+    """
+    payload = current_user_payload()
+    if not payload:
+        return None
+    usage = await db_client.increment_and_check_api_usage(payload['user_id'])
+    if usage is not None and not usage['allowed']:
+        return jsonify({
+            'success': False,
+            'error': 'API usage limit exceeded',
+            'message': 'API使用次数已达上限',
+            'usage': usage
+        }), 429
+    return None
+
+def parse_follower_range(data):
+    """解析粉丝数范围 (min_followers, max_followers)，格式错误时抛出 ValueError"""
+    try:
+        return int(data.get('min_followers', 0) or 0), int(data.get('max_followers', 10000000) or 10000000)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid follower range')
+
+def invalid_follower_range_response():
+    return jsonify({
+        'success': False,
+        'error': 'Invalid follower range',
+        'message': '粉丝数范围格式错误'
+    }), 400
+
 @app.after_request
 def after_request(response):
     """请求后处理"""
@@ -115,23 +218,19 @@ def after_request(response):
     if request.path.startswith('/api/') and hasattr(request, 'start_time'):
         response_time = (datetime.utcnow() - request.start_time).total_seconds() * 1000
         
-        # 如果是认证用户，记录API使用
-        auth_header = request.headers.get('Authorization')
-        if auth_header:
-            try:
-                token = auth_header.split(' ')[1]
-                payload = auth_service.verify_jwt_token(token)
-                if payload:
-                    asyncio.create_task(db_client.log_api_usage(
-                        user_id=payload['user_id'],
-                        endpoint=request.path,
-                        method=request.method,
-                        response_status=response.status_code,
-                        response_time_ms=int(response_time),
-                        ip_address=get_remote_address()
-                    ))
-            except:
-                pass  # 忽略token验证错误
+        # 如果是认证用户，记录API使用（只入队，由后台线程批量写入；使用计数由 charge_api_usage 在请求时增加）
+        payload = current_user_payload()
+        if payload:
+            usage_log_writer.log(
+                user_id=payload['user_id'],
+                endpoint=request.path,
+                # 路由模板，汇总统计按它分组，不会因为路径里的 id 而每个资源一行
+                route=request.url_rule.rule if request.url_rule else None,
+                method=request.method,
+                response_status=response.status_code,
+                response_time_ms=int(response_time),
+                ip_address=get_remote_address()
+            )
     
     return response
 
@@ -144,15 +243,14 @@ def after_request(response):
 async def search_creators():
     """搜索创作者（公开API，无需认证）"""
     try:
-        # 公开API，无需认证
-        user_id = 'anonymous'
+        # 公开API，无需认证；带了有效token时记录搜索历史
+        user = current_user_payload()
+        user_id = user['user_id'] if user else 'anonymous'
 
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         keyword = data.get('keyword', '')
         country = data.get('country', 'US')
         region = data.get('region', '')
-        min_followers = data.get('min_followers', 0)
-        max_followers = data.get('max_followers', 10000000)
         
         if not keyword:
             return jsonify({
@@ -160,35 +258,101 @@ async def search_creators():
                 'error': 'Missing keyword',
                 'message': '请输入搜索关键词'
             }), 400
+        try:
+            min_followers, max_followers = parse_follower_range(data)
+        except ValueError:
+            return invalid_follower_range_response()
         
         logger.info(f"🔍 用户 {user_id} 搜索创作者: {keyword}")
         
-        # 调用TikHub API
-        search_results = await search_creators_from_tikhub(
-            keyword, country, region, min_followers, max_followers
-        )
+        cache_key = search_result_cache.make_key(keyword, country, region, min_followers, max_followers)
+        cursor = data.get('cursor')
         
-        if search_results['success']:
-            # 保存搜索历史（如果数据库可用）
-            try:
-                await db_client.save_search_history(user_id, {
-                    'query': keyword,
-                    'type': 'creators',
-                    'filters': {
+        if cursor:
+            # 翻页：每页只调用一次上游，并跳过前面各页已返回的创作者
+            state = await asyncio.to_thread(cursor_store.take, cursor)
+            if state is None or state.query != cache_key:
+                return jsonify({
+                    'success': False,
+                    'error': 'Invalid or expired cursor',
+                    'message': '分页已失效，请重新搜索'
+                }), 400
+            
+            # 翻页总会请求上游，计费；超出额度时游标放回去，之后仍可继续
+            rejected = await charge_api_usage()
+            if rejected is not None:
+                await asyncio.to_thread(cursor_store.restore, cursor, state)
+                return rejected
+            
+            # 第一页的结果集随结果缓存共享给相同查询，第一次翻页时复制一份再追加
+            shared_result_set = state.pages == 1
+            
+            # 和第一页一样只接受不超过结果缓存 TTL 的 TikHub 响应缓存
+            search_results = await search_next_page_from_tikhub(state, keyword, min_followers, max_followers,
+                                                                max_age=search_result_cache.ttl)
+            cache_status = 'bypass'
+            
+            if state.result_set_id and search_results['success']:
+                if shared_result_set:
+                    state.result_set_id = await asyncio.to_thread(result_set_store.fork, state.result_set_id,
+                                                                  search_results['data'])
+                elif not await asyncio.to_thread(result_set_store.extend, state.result_set_id, search_results['data']):
+                    state.result_set_id = None
+        else:
+            # 命中结果缓存（包括过期后先返回旧结果）不请求上游，不计费
+            if not search_result_cache.contains(cache_key):
+                rejected = await charge_api_usage()
+                if rejected is not None:
+                    return rejected
+            
+            # 调用TikHub API（相同查询优先使用缓存结果）
+            # 未命中时只接受不超过结果缓存 TTL 的 TikHub 响应缓存，后台刷新则直接请求上游，
+            # 否则磁盘上保存一天的搜索响应会让刷新一直拿回同一份旧结果
+            search_results, cache_status = await search_result_cache.get_or_load(
+                cache_key,
+                lambda: load_search_results(keyword, country, region, min_followers, max_followers,
+                                            max_age=search_result_cache.ttl),
+                refresh_loader=lambda: load_search_results(keyword, country, region, min_followers,
+                                                           max_followers, max_age=0)
+            )
+            state = CursorState(cache_key, SEARCH_PAGE_SIZE,
+                                SeenSet(creator['unique_id'] for creator in search_results['data']))
+            if search_results['success']:
+                # 命中缓存时复用加载时保存的结果集，不再重复写入；结果集比缓存先过期时重新保存
+                state.result_set_id = search_results.get('result_set_id')
+                if not (state.result_set_id and await asyncio.to_thread(result_set_store.touch, state.result_set_id)):
+                    state.result_set_id, _ = await asyncio.to_thread(result_set_store.put, search_results['data'])
+                    # 更新缓存里的引用（只替换这一个字段，其他读取方看到的仍是完整结果）
+                    search_results['result_set_id'] = state.result_set_id
+                
+                # 保存搜索历史：只入队，由后台线程批量写入，不占用本次请求的响应时间
+                # （队列满时会同步写本地 spool 文件，所以放到线程池里调用）
+                if user:
+                    await asyncio.to_thread(search_history_writer.record, user_id, keyword, {
                         'country': country,
                         'region': region,
                         'min_followers': min_followers,
                         'max_followers': max_followers
-                    },
-                    'results_count': len(search_results['data']),
-                    'results_data': search_results['data'][:5]  # 只保存前5个结果作为快照
-                })
-            except:
-                pass  # 数据库不可用时忽略
-            
-            logger.info(f"✅ 找到 {len(search_results['data'])} 个创作者")
+                    }, search_results['data'], state.result_set_id)
+        
+        if search_results['success']:
+            logger.info(f"✅ 找到 {len(search_results['data'])} 个创作者 (缓存: {cache_status}, 第 {state.pages} 页)")
+        
+        if search_results['success'] or cursor:
+            # 是否还有下一页看上游这一页有没有返回视频，而不是过滤后剩下的创作者：
+            # 整页创作者都被粉丝数条件过滤掉时仍要继续翻页。
+            # 翻页失败时 offset 没有推进，重新发放游标以便重试；
+            # 缓存中的结果对象是共享的，复制后再附加游标
+            has_more = state.next_offset < SEARCH_MAX_OFFSET and (not search_results['success'] or search_results['has_more'])
+            next_cursor = await asyncio.to_thread(cursor_store.issue, state) if has_more else None
+            search_results = dict(search_results,
+                                  has_more=has_more,
+                                  next_cursor=next_cursor,
+                                  result_set_id=state.result_set_id)
         
-        return jsonify(search_results)
+        response = jsonify(search_results)
+        response.headers['X-Cache'] = cache_status.upper()
+        return response
         
     except Exception as e:
         logger.error(f"搜索创作者时发生错误: {e}")
@@ -198,22 +362,140 @@ async def search_creators():
             'message': '搜索过程中发生错误'
         }), 500
 
-async def search_creators_from_tikhub(keyword, country='US', region='', min_followers=0, max_followers=10000000):
-    """调用TikHub API搜索创作者"""
+@app.route('/api/creators/search/stream', methods=['POST'])
+@limiter.limit("30 per minute")
+def search_creators_stream():
+    """流式搜索创作者：逐个返回创作者（NDJSON；请求头 Accept: text/event-stream 时为 SSE）"""
+    data = request.get_json(silent=True) or {}
+    keyword = data.get('keyword', '')
+    
+    if not keyword:
+        return jsonify({
+            'success': False,
+            'error': 'Missing keyword',
+            'message': '请输入搜索关键词'
+        }), 400
+    try:
+        min_followers, max_followers = parse_follower_range(data)
+    except ValueError:
+        return invalid_follower_range_response()
+    
+    try:
+        pages = max(1, min(int(data.get('pages', 3)), config.STREAM_MAX_PAGES))
+    except (TypeError, ValueError):
+        pages = 3
+    
+    # 流式搜索总会请求上游，计费
+    rejected = run_sync(charge_api_usage())
+    if rejected is not None:
+        return rejected
+    use_sse = 'text/event-stream' in request.headers.get('Accept', '')
+    
+    logger.info(f"🔍 流式搜索创作者: {keyword} ({pages} 页)")
+    
+    events = iterate_sync(stream_creators_from_tikhub(
+        keyword,
+        data.get('country', 'US'),
+        data.get('region', ''),
+        min_followers,
+        max_followers,
+        pages=pages,
+        enhance=bool(data.get('enhance', False))
+    ))
+    
+    def generate():
+        for event in events:
+            payload = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['type']}\ndata: {payload}\n\n" if use_sse else payload + "\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/creators/results/<result_set_id>', methods=['GET'])
+@limiter.limit("120 per minute")
+def query_result_set(result_set_id):
+    """
+    在已有的搜索结果上排序、筛选、分页（不重新请求TikHub）
+    
+    查询参数: sort, order=asc|desc, page, per_page, min_<字段>/max_<字段>, has_email=true|false, language
+    """
+    result_set = result_set_store.get(result_set_id)
+    if result_set is None:
+        return jsonify({
+            'success': False,
+            'error': 'Result set not found',
+            'message': '搜索结果已过期，请重新搜索'
+        }), 404
+    
+    args = request.args
+    sort_by = args.get('sort') or None
+    if sort_by and sort_by not in NUMERIC_FIELDS:
+        return jsonify({
+            'success': False,
+            'error': f'Unsupported sort field: {sort_by}',
+            'message': '不支持的排序字段'
+        }), 400
+    
+    try:
+        page = max(1, args.get('page', 1, type=int))
+        per_page = max(1, min(args.get('per_page', 10, type=int), 100))
+        ranges = {}
+        for field in NUMERIC_FIELDS:
+            low, high = args.get(f'min_{field}'), args.get(f'max_{field}')
+            if low or high:
+                ranges[field] = (float(low) if low else None, float(high) if high else None)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid filter value',
+            'message': '筛选条件格式错误'
+        }), 400
+    
+    has_email = args.get('has_email')
+    total, rows = result_set.query(
+        sort_by=sort_by,
+        descending=args.get('order', 'desc') != 'asc',
+        ranges=ranges,
+        has_email=None if has_email is None else has_email.lower() in ('1', 'true', 'yes'),
+        language=args.get('language') or None,
+        offset=(page - 1) * per_page,
+        limit=per_page
+    )
+    
+    return jsonify({
+        'success': True,
+        'data': rows,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (total + per_page - 1) // per_page
+    })
+
+async def search_creators_from_tikhub(keyword, country='US', region='', min_followers=0, max_followers=10000000,
+                                      max_age=None):
+    """
+    调用TikHub API搜索创作者（由 search_result_cache 在常驻事件循环上调用）
+    
+    max_age: TikHub 响应缓存最多能旧多少秒，0 表示直接请求上游
+    """
     try:
         logger.info(f"🔍 调用TikHub API搜索: {keyword}")
         
         # 调用TikHub comprehensive_search API
         search_params = {
             'keyword': keyword,
-            'count': 20,
-            'sort_type': 1
+            'count': SEARCH_PAGE_SIZE,
+            'sort_type': 1,
+            'max_age': max_age
         }
         
-        videos = tikhub_client.comprehensive_search(**search_params)
-        
-        if not videos:
-            logger.error("TikHub API返回空数据")
+        try:
+            videos = await tikhub_client.comprehensive_search_async(**search_params)
+        except TikHubError as e:
+            logger.error(f"TikHub API调用失败: {e}")
             return {
                 'success': False,
                 'error': 'TikHub API error',
@@ -222,59 +504,10 @@ async def search_creators_from_tikhub(keyword, country='US', region='', min_foll
                 'total': 0
             }
         
-        # 提取创作者信息
-        creators_data = []
-        
         logger.info(f"📊 找到 {len(videos)} 个搜索结果")
         
-        unique_creators = {}
-        
-        for video in videos:
-            # 根据实际API结构，author和statistics直接在顶层
-            author = video.get("author", {})
-            statistics = video.get("statistics", {})
-            
-            unique_id = author.get("unique_id", "")
-            if not unique_id or unique_id in unique_creators:
-                continue
-                
-            # 获取粉丝数
-            follower_count = author.get("follower_count", 0)
-            
-            # 应用粉丝数过滤
-            if follower_count < min_followers or follower_count > max_followers:
-                continue
-            
-            # 提取创作者信息
-            creator_info = {
-                'search_keyword': keyword,
-                'nickname': author.get("nickname", ""),
-                'unique_id': unique_id,
-                'follower_count': follower_count,
-                'total_video_count': author.get("aweme_count", 0),
-                'total_likes_count': author.get("total_favorited", 0),
-                'tiktok_account_url': f"https://www.tiktok.com/@{unique_id}",
-                'tiktok_account_bio_description': author.get("signature", ""),
-                'bio_link_url': extract_bio_link(author.get("signature", "")),
-                'language': detect_language(author.get("signature", "")),
-                'avatar_url': author.get("avatar_larger", {}).get("url_list", [""])[0] if author.get("avatar_larger") else "",
-                
-                # 视频信息
-                'latest_video_link': f"https://www.tiktok.com/@{unique_id}/video/{video.get('aweme_id', '')}",
-                'latest_video_play_count': statistics.get("play_count", 0),
-                'video_cover_url': video.get("video", {}).get("cover", {}).get("url_list", [""])[0] if video.get("video") else "",
-                'video_play_url': video.get("video", {}).get("play_addr", {}).get("url_list", [""])[0] if video.get("video") else "",
-                
-                # 计算字段
-                'days_since_last_video': calculate_days_since_last_video(video.get("create_time", 0)),
-                'avg_video_play_count': statistics.get("play_count", 0),  # 当前视频的播放量
-                'median_view_count': statistics.get("play_count", 0),    # 当前视频的播放量
-                'expected_price': calculate_expected_price(follower_count, statistics.get("play_count", 0)),
-                'email': extract_email_from_bio(author.get("signature", ""))
-            }
-            
-            unique_creators[unique_id] = creator_info
-            creators_data.append(creator_info)
+        # 提取创作者信息
+        creators_data = extract_creators_from_videos(videos, keyword, min_followers, max_followers)
         
         logger.info(f"✅ 找到 {len(creators_data)} 个符合条件的创作者")
         
@@ -282,6 +515,8 @@ async def search_creators_from_tikhub(keyword, country='US', region='', min_foll
             'success': True,
             'data': creators_data,
             'total': len(creators_data),
+            # 上游这一页是否有视频（过滤前），决定还能不能翻页
+            'has_more': bool(videos),
             'message': f'找到 {len(creators_data)} 个创作者'
         }
         
@@ -295,56 +530,251 @@ async def search_creators_from_tikhub(keyword, country='US', region='', min_foll
             'total': 0
         }
 
-def calculate_expected_price(follower_count, avg_play_count):
-    """计算预期价格"""
-    # 简单的价格计算公式
-    base_price = follower_count * 0.001  # 每个粉丝0.001元
-    engagement_bonus = avg_play_count * 0.0001  # 播放量奖励
-    return round(base_price + engagement_bonus, 2)
-
-def extract_email_from_bio(bio):
-    """从简介中提取邮箱"""
-    import re
-    if not bio:
-        return ""
-    
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    matches = re.findall(email_pattern, bio)
-    return matches[0] if matches else ""
-
-def extract_bio_link(bio_text):
-    """从个人简介中提取链接"""
-    if not bio_text:
-        return ""
-    
-    # 提取各种链接格式
-    link_patterns = [
-        r'https?://[^\s]+',
-        r'linktr\.ee/[^\s]+',
-        r'bio\.link/[^\s]+',
-        r'beacons\.ai/[^\s]+'
-    ]
+async def load_search_results(keyword, country='US', region='', min_followers=0, max_followers=10000000,
+                              max_age=None):
+    """
+    结果缓存的加载函数：搜索成功时把结果保存为服务端结果集，
+    result_set_id 和结果一起缓存，命中缓存的请求共用这个结果集
+    """
+    search_results = await search_creators_from_tikhub(keyword, country, region, min_followers, max_followers,
+                                                       max_age=max_age)
+    if search_results['success']:
+        search_results['result_set_id'], _ = await asyncio.to_thread(result_set_store.put, search_results['data'])
+    return search_results
+
+async def search_next_page_from_tikhub(state, keyword, min_followers=0, max_followers=10000000, max_age=None):
+    """
+    按游标取下一页：一次上游调用，跳过之前各页已返回的创作者
     
-    for pattern in link_patterns:
-        match = re.search(pattern, bio_text, re.IGNORECASE)
-        if match:
-            return match.group(0)
+    上游失败时不推进 offset，返回 success=False，调用方重新发放游标以便重试；
+    只有上游正常返回空页才结束翻页
     
-    return ""
+    max_age: TikHub 响应缓存最多能旧多少秒（与第一页相同）
+    """
+    try:
+        videos = await tikhub_client.comprehensive_search_async(keyword, SEARCH_PAGE_SIZE, 1, offset=state.next_offset,
+                                                                max_age=max_age)
+    except TikHubError as e:
+        logger.error(f"TikHub API调用失败 (offset={state.next_offset}): {e}")
+        return {
+            'success': False,
+            'error': 'TikHub API error',
+            'message': 'API调用失败，请重试',
+            'data': [],
+            'total': 0
+        }
+    
+    state.pages += 1
+    if videos:
+        state.next_offset += SEARCH_PAGE_SIZE
+    else:
+        # 上游没有更多结果，之后不再发放游标
+        state.next_offset = SEARCH_MAX_OFFSET
+    
+    creators_data = extract_creators_from_videos(videos, keyword, min_followers, max_followers, state.seen)
+    
+    return {
+        'success': True,
+        'data': creators_data,
+        'total': len(creators_data),
+        'has_more': bool(videos),
+        'message': f'找到 {len(creators_data)} 个创作者'
+    }
 
-def detect_language(text):
-    """检测文本语言"""
-    if not text:
-        return "en"
+async def stream_creators_from_tikhub(keyword, country='US', region='', min_followers=0, max_followers=10000000,
+                                      pages=3, enhance=False):
+    """
+    流式搜索创作者，每页结果一到就逐个产出（同时预取下一页）
     
-    # 简单的语言检测
-    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-    english_chars = len(re.findall(r'[a-zA-Z]', text))
+    产出的事件:
+        {'type': 'creator', 'data': {...}}                    新发现的创作者
+        {'type': 'update', 'unique_id': ..., 'data': {...}}   enhance=True 时，增强完成后的字段更新
+        {'type': 'error', 'error': ..., 'message': ..., 'page': n}  某一页上游调用失败（之后不再翻页）
+        {'type': 'done', 'total': n, 'pages': n, 'enhanced': n, 'result_set_id': ...}
     
-    if chinese_chars > english_chars:
-        return "zh-CN"
-    else:
-        return "en"
+    完成时全部结果（含增强字段）保存为服务端结果集，之后的排序/筛选/分页走 /api/creators/results
+    """
+    count = 20
+    queue = asyncio.Queue()
+    seen = set()
+    creators = []
+    summary = {'total': 0, 'pages': 0, 'enhanced': 0}
+    semaphore = asyncio.Semaphore(config.STREAM_ENHANCE_WORKERS)
+    enhance_tasks = set()
+    
+    def fetch_page(page):
+        return asyncio.ensure_future(
+            tikhub_client.comprehensive_search_async(keyword, count, 1, offset=page * count)
+        )
+    
+    async def enhance_one(creator):
+        try:
+            async with semaphore:
+                enhanced = await tikhub_client.enhance_creator_data_async(creator)
+        except Exception as e:
+            logger.warning(f"增强创作者 {creator['unique_id']} 失败: {e}")
+            return
+        summary['enhanced'] += 1
+        fields = enhanced_creator_fields(enhanced)
+        creator.update(fields)
+        await queue.put({'type': 'update', 'unique_id': creator['unique_id'], 'data': fields})
+    
+    async def produce():
+        next_page = fetch_page(0)
+        try:
+            for page in range(pages):
+                try:
+                    videos = await next_page
+                except TikHubError as e:
+                    # 上游失败要让客户端知道，不能当成"没有更多结果"
+                    logger.error(f"流式搜索第 {page + 1} 页失败: {e}")
+                    message = f'第 {page + 1} 页搜索失败，结果可能不完整' if page else 'TikHub搜索失败，请稍后重试'
+                    await queue.put({'type': 'error', 'error': 'TikHub API error', 'message': message, 'page': page + 1})
+                    break
+                next_page = None
+                if not videos:
+                    break
+                
+                summary['pages'] += 1
+                if page + 1 < pages:
+                    next_page = fetch_page(page + 1)
+                
+                for creator in extract_creators_from_videos(videos, keyword, min_followers, max_followers, seen):
+                    summary['total'] += 1
+                    creators.append(creator)
+                    await queue.put({'type': 'creator', 'data': creator})
+                    if enhance:
+                        task = asyncio.ensure_future(enhance_one(creator))
+                        enhance_tasks.add(task)
+                        task.add_done_callback(enhance_tasks.discard)
+            
+            if enhance_tasks:
+                await asyncio.gather(*list(enhance_tasks))
+        except Exception as e:
+            logger.error(f"流式搜索失败: {e}")
+            await queue.put({'type': 'error', 'error': str(e), 'message': '搜索过程中发生错误'})
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+            await queue.put(None)
+    
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+        
+        result_set_id = (await asyncio.to_thread(result_set_store.put, creators))[0] if creators else None
+        logger.info(f"✅ 流式搜索完成: {summary['total']} 个创作者, {summary['pages']} 页")
+        yield {'type': 'done', **summary, 'result_set_id': result_set_id}
+    finally:
+        # 客户端断开时停止上游请求
+        producer.cancel()
+        for task in list(enhance_tasks):
+            task.cancel()
+
+def extract_creators_from_videos(videos, keyword, min_followers=0, max_followers=10000000, seen=None):
+    """从一页搜索结果中提取创作者，按 unique_id 去重（传入 seen 可跨页去重，会被原地更新）"""
+    seen = set() if seen is None else seen
+    matched = []
+    
+    for video in videos:
+        # 根据实际API结构，author和statistics直接在顶层
+        author = video.get("author", {})
+        
+        unique_id = author.get("unique_id", "")
+        if not unique_id or unique_id in seen:
+            continue
+            
+        # 获取粉丝数
+        follower_count = author.get("follower_count", 0)
+        
+        # 应用粉丝数过滤
+        if follower_count < min_followers or follower_count > max_followers:
+            continue
+        
+        seen.add(unique_id)
+        matched.append(video)
+    
+    # 整页的简介一次解析完，指标一次向量化计算（搜索结果里只有当前这一个视频的播放量）
+    authors = [video.get("author", {}) for video in matched]
+    bios = analyze_bios((author.get("signature", "") for author in authors), all_emails=False)
+    metrics = compute_metrics(
+        [[video.get("statistics", {}).get("play_count", 0)] for video in matched],
+        [author.get("follower_count", 0) for author in authors],
+        [author.get("total_favorited", 0) for author in authors],
+        [author.get("aweme_count", 1) for author in authors]
+    ).records()
+    creators_data = []
+    
+    for video, email, bio_link, language, creator_metrics in zip(matched, bios.emails, bios.links, bios.languages, metrics):
+        author = video.get("author", {})
+        statistics = video.get("statistics", {})
+        unique_id = author.get("unique_id", "")
+        follower_count = author.get("follower_count", 0)
+        
+        # 提取创作者信息
+        creator_info = {
+            'search_keyword': keyword,
+            'nickname': author.get("nickname", ""),
+            'unique_id': unique_id,
+            'sec_user_id': author.get("sec_uid", ""),
+            'follower_count': follower_count,
+            'total_video_count': author.get("aweme_count", 0),
+            'total_likes_count': author.get("total_favorited", 0),
+            'tiktok_account_url': f"https://www.tiktok.com/@{unique_id}",
+            'tiktok_account_bio_description': author.get("signature", ""),
+            'bio_link_url': bio_link,
+            'language': language,
+            'avatar_url': author.get("avatar_larger", {}).get("url_list", [""])[0] if author.get("avatar_larger") else "",
+            
+            # 视频信息
+            'latest_video_link': f"https://www.tiktok.com/@{unique_id}/video/{video.get('aweme_id', '')}",
+            'latest_video_play_count': statistics.get("play_count", 0),
+            'video_cover_url': video.get("video", {}).get("cover", {}).get("url_list", [""])[0] if video.get("video") else "",
+            'video_play_url': video.get("video", {}).get("play_addr", {}).get("url_list", [""])[0] if video.get("video") else "",
+            
+            # 计算字段
+            'days_since_last_video': calculate_days_since_last_video(video.get("create_time", 0)),
+            'avg_video_play_count': creator_metrics['avg_video_play_count'],  # 当前视频的播放量
+            'median_view_count': creator_metrics['median_view_count'],        # 当前视频的播放量
+            'expected_price': creator_metrics['expected_price'],
+            'email': email
+        }
+        
+        creators_data.append(creator_info)
+    
+    return creators_data
+
+# 增强数据中最新5个视频对应的搜索结果字段前缀
+VIDEO_SLOT_NAMES = ['latest', 'second_latest', 'third_latest', 'fourth_latest', 'fifth_latest']
+
+def enhanced_creator_fields(enhanced):
+    """把 enhance_creator_data 的结果映射为搜索结果中的字段"""
+    fields = {
+        'follower_count': enhanced.get('follower_count', 0),
+        'total_video_count': enhanced.get('aweme_count', 0),
+        'total_likes_count': enhanced.get('total_favorited', 0),
+        'days_since_last_video': enhanced.get('days_since_last_video', -1)
+    }
+    if enhanced.get('bio_link_url'):
+        fields['bio_link_url'] = enhanced['bio_link_url']
+    if enhanced.get('language'):
+        fields['language'] = enhanced['language']
+    
+    has_videos = False
+    for i, name in enumerate(VIDEO_SLOT_NAMES, 1):
+        if enhanced.get(f"video_{i}_link"):
+            fields[f'{name}_video_link'] = enhanced[f"video_{i}_link"]
+            fields[f'{name}_video_play_count'] = enhanced.get(f"video_{i}_play_count", 0)
+            has_videos = True
+    
+    if has_videos:
+        fields.update(score_creators([enhanced]).records()[0])
+    
+    return fields
 
 def calculate_days_since_last_video(create_time):
     """计算距离最新视频发布的天数"""
@@ -364,18 +794,46 @@ def calculate_days_since_last_video(create_time):
 # 用户收藏功能
 # ================================
 
+# 批量收藏/取消收藏一次最多处理的创作者数
+FAVORITES_BATCH_MAX = 500
+
+# 收藏 / 搜索历史列表每页条数上限
+LIST_PAGE_MAX = 100
+
+def parse_list_page_args():
+    """解析列表分页参数 (limit, cursor)，游标格式错误时抛出 ValueError"""
+    limit = max(1, min(request.args.get('limit', 50, type=int), LIST_PAGE_MAX))
+    cursor = request.args.get('cursor') or None
+    if cursor:
+        decode_keyset_cursor(cursor)
+    return limit, cursor
+
+def invalid_cursor_response():
+    return jsonify({
+        'success': False,
+        'error': 'Invalid cursor',
+        'message': '分页参数无效'
+    }), 400
+
 @app.route('/api/creators/favorites', methods=['GET'])
 @jwt_required
 async def get_user_favorites():
-    """获取用户收藏的创作者"""
+    """获取用户收藏的创作者（按收藏时间倒序分页，只返回列表字段）"""
     try:
         user_id = request.current_user['user_id']
-        favorites = await db_client.get_user_favorites(user_id)
+        try:
+            limit, cursor = parse_list_page_args()
+        except ValueError:
+            return invalid_cursor_response()
+        
+        favorites, next_cursor = await db_client.get_user_favorites(user_id, limit, cursor)
         
         return jsonify({
             'success': True,
             'data': favorites,
-            'total': len(favorites)
+            'total': len(favorites),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
         
     except Exception as e:
@@ -386,6 +844,34 @@ async def get_user_favorites():
             'message': '获取收藏列表失败'
         }), 500
 
+@app.route('/api/creators/favorites/<creator_unique_id>', methods=['GET'])
+@jwt_required
+async def get_favorite_creator(creator_unique_id):
+    """获取单个收藏的详情（含创作者快照）"""
+    try:
+        user_id = request.current_user['user_id']
+        favorite = await db_client.get_favorite_creator(user_id, creator_unique_id)
+        
+        if not favorite:
+            return jsonify({
+                'success': False,
+                'error': 'Favorite not found',
+                'message': '收藏不存在'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': favorite
+        })
+        
+    except Exception as e:
+        logger.error(f"获取收藏详情失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': '获取收藏详情失败'
+        }), 500
+
 @app.route('/api/creators/favorites', methods=['POST'])
 @jwt_required
 async def add_favorite_creator():
@@ -402,40 +888,110 @@ async def add_favorite_creator():
                 'message': '创作者数据无效'
             }), 400
         
-        # 检查是否已收藏
-        is_favorited = await db_client.is_creator_favorited(
-            user_id, creator_data['unique_id']
-        )
+        # 一条语句完成收藏：已收藏时返回原有记录，不再先查询再插入
+        result = await db_client.upsert_favorite_creator(user_id, creator_data)
+        
+        if not result:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to add favorite',
+                'message': '收藏失败'
+            }), 500
+        
+        favorite, created = result
+        return jsonify({
+            'success': True,
+            'message': '收藏成功' if created else '该创作者已在收藏列表中',
+            'created': created,
+            'data': favorite
+        }), 201 if created else 200
+            
+    except Exception as e:
+        logger.error(f"添加收藏失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': '添加收藏失败'
+        }), 500
+
+@app.route('/api/creators/favorites/batch', methods=['POST'])
+@jwt_required
+async def add_favorite_creators_batch():
+    """批量收藏创作者（例如收藏整页搜索结果），一条语句完成"""
+    try:
+        user_id = request.current_user['user_id']
+        creators = (request.get_json() or {}).get('creators') or []
+        creators = [creator for creator in creators if isinstance(creator, dict) and creator.get('unique_id')]
         
-        if is_favorited:
+        if not creators or len(creators) > FAVORITES_BATCH_MAX:
             return jsonify({
                 'success': False,
-                'error': 'Already favorited',
-                'message': '该创作者已在收藏列表中'
+                'error': 'Invalid creators',
+                'message': f'请提供 1-{FAVORITES_BATCH_MAX} 个有效的创作者'
             }), 400
         
-        # 添加收藏
-        favorite = await db_client.add_favorite_creator(user_id, creator_data)
+        favorites = await db_client.upsert_favorite_creators(user_id, creators)
+        if favorites is None:
+            return jsonify({
+                'success': False,
+                'error': 'Failed to add favorites',
+                'message': '批量收藏失败'
+            }), 500
+        
+        created = sum(1 for favorite in favorites if favorite['created'])
+        return jsonify({
+            'success': True,
+            'message': f'新收藏 {created} 个创作者',
+            'created': created,
+            'total': len(favorites),
+            'data': favorites
+        })
+        
+    except Exception as e:
+        logger.error(f"批量收藏失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': '批量收藏失败'
+        }), 500
+
+@app.route('/api/creators/favorites/batch', methods=['DELETE'])
+@jwt_required
+async def remove_favorite_creators_batch():
+    """批量取消收藏，一条语句完成"""
+    try:
+        user_id = request.current_user['user_id']
+        unique_ids = (request.get_json() or {}).get('unique_ids') or []
+        unique_ids = list(dict.fromkeys(uid for uid in unique_ids if isinstance(uid, str) and uid))
         
-        if favorite:
+        if not unique_ids or len(unique_ids) > FAVORITES_BATCH_MAX:
             return jsonify({
-                'success': True,
-                'message': '收藏成功',
-                'data': favorite
-            })
-        else:
+                'success': False,
+                'error': 'Invalid unique_ids',
+                'message': f'请提供 1-{FAVORITES_BATCH_MAX} 个创作者ID'
+            }), 400
+        
+        removed = await db_client.remove_favorite_creators(user_id, unique_ids)
+        if removed is None:
             return jsonify({
                 'success': False,
-                'error': 'Failed to add favorite',
-                'message': '收藏失败'
+                'error': 'Failed to remove favorites',
+                'message': '批量取消收藏失败'
             }), 500
-            
+        
+        return jsonify({
+            'success': True,
+            'message': f'已取消收藏 {len(removed)} 个创作者',
+            'removed': removed,
+            'total': len(removed)
+        })
+        
     except Exception as e:
-        logger.error(f"添加收藏失败: {e}")
+        logger.error(f"批量取消收藏失败: {e}")
         return jsonify({
             'success': False,
             'error': str(e),
-            'message': '添加收藏失败'
+            'message': '批量取消收藏失败'
         }), 500
 
 @app.route('/api/creators/favorites/<creator_unique_id>', methods=['DELETE'])
@@ -474,17 +1030,22 @@ async def remove_favorite_creator(creator_unique_id):
 @app.route('/api/search/history', methods=['GET'])
 @jwt_required
 async def get_search_history():
-    """获取用户搜索历史"""
+    """获取用户搜索历史（按时间倒序分页，只返回列表字段）"""
     try:
         user_id = request.current_user['user_id']
-        limit = request.args.get('limit', 50, type=int)
+        try:
+            limit, cursor = parse_list_page_args()
+        except ValueError:
+            return invalid_cursor_response()
         
-        history = await db_client.get_user_search_history(user_id, limit)
+        history, next_cursor = await db_client.get_user_search_history(user_id, limit, cursor)
         
         return jsonify({
             'success': True,
             'data': history,
-            'total': len(history)
+            'total': len(history),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
         
     except Exception as e:
@@ -495,6 +1056,34 @@ async def get_search_history():
             'message': '获取搜索历史失败'
         }), 500
 
+@app.route('/api/search/history/<history_id>', methods=['GET'])
+@jwt_required
+async def get_search_history_entry(history_id):
+    """获取单条搜索历史的详情（含结果快照）"""
+    try:
+        user_id = request.current_user['user_id']
+        entry = await db_client.get_search_history_entry(user_id, history_id)
+        
+        if not entry:
+            return jsonify({
+                'success': False,
+                'error': 'Search history not found',
+                'message': '搜索历史不存在'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': entry
+        })
+        
+    except Exception as e:
+        logger.error(f"获取搜索历史详情失败: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': '获取搜索历史详情失败'
+        }), 500
+
 # ================================
 # 趋势数据API (保持原有功能)
 # ================================
@@ -526,6 +1115,20 @@ def health_check():
         'validation': config_validation
     })
 
+@app.route('/api/cache/stats')
+def cache_stats():
+    """缓存命中率和请求合并统计"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'search_results': search_result_cache.stats(),
+            'tikhub_responses': tikhub_client.cache.stats() if tikhub_client.cache else None,
+            'tikhub_inflight': tikhub_client.inflight.stats(),
+            'usage_log_writer': usage_log_writer.stats(),
+            'search_history_writer': search_history_writer.stats()
+        }
+    })
+
 @app.route('/api/config')
 def get_public_config():
     """获取公开配置"""
@@ -57,6 +57,36 @@ class Config:
     CACHE_TYPE = os.getenv('CACHE_TYPE', 'simple')
     CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', '300'))
     
+    # 创作者搜索结果缓存：新鲜时间 / 过期后仍返回旧结果并后台刷新的时间 / 最多缓存的查询数
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', '600'))
+    SEARCH_CACHE_STALE_TTL = int(os.getenv('SEARCH_CACHE_STALE_TTL', '3600'))
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '1000'))
+    
+    # 分页游标和服务端结果集的 SQLite 文件，同一台机器上的 gunicorn worker 共用
+    SEARCH_STATE_DB = os.getenv('SEARCH_STATE_DB', 'state/search_state.sqlite3')
+    
+    # 创作者搜索分页游标：有效秒数 / 最多保存的游标数
+    SEARCH_CURSOR_TTL = int(os.getenv('SEARCH_CURSOR_TTL', '1800'))
+    SEARCH_CURSOR_MAX = int(os.getenv('SEARCH_CURSOR_MAX', '10000'))
+    
+    # 服务端结果集（排序/筛选/分页，保存在 SEARCH_STATE_DB 里）：闲置多少秒后丢弃 / 最多保存的结果集数
+    RESULT_SET_TTL = int(os.getenv('RESULT_SET_TTL', '1800'))
+    RESULT_SET_MAX = int(os.getenv('RESULT_SET_MAX', '2000'))
+    
+    # 流式创作者搜索：最多翻页数 / 同时增强的创作者数
+    STREAM_MAX_PAGES = int(os.getenv('STREAM_MAX_PAGES', '10'))
+    STREAM_ENHANCE_WORKERS = int(os.getenv('STREAM_ENHANCE_WORKERS', '5'))
+    
+    # API使用日志批量写入：每批最多条数 / 最长等待毫秒数
+    USAGE_LOG_BATCH_SIZE = int(os.getenv('USAGE_LOG_BATCH_SIZE', '200'))
+    USAGE_LOG_FLUSH_MS = int(os.getenv('USAGE_LOG_FLUSH_MS', '1000'))
+    
+    # 搜索历史批量写入：每批最多条数 / 最长等待毫秒数 / 数据库不可用时的本地 spool 文件及大小上限
+    SEARCH_HISTORY_BATCH_SIZE = int(os.getenv('SEARCH_HISTORY_BATCH_SIZE', '100'))
+    SEARCH_HISTORY_FLUSH_MS = int(os.getenv('SEARCH_HISTORY_FLUSH_MS', '2000'))
+    SEARCH_HISTORY_SPOOL = os.getenv('SEARCH_HISTORY_SPOOL', 'spool/search_history.jsonl')
+    SEARCH_HISTORY_SPOOL_MAX_MB = int(os.getenv('SEARCH_HISTORY_SPOOL_MAX_MB', '16'))
+    
     @classmethod
     def validate_config(cls) -> Dict[str, Any]:
         """验证配置"""
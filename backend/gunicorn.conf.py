@@ -0,0 +1,10 @@
+"""
+gunicorn 配置
+worker 退出（包括收到 SIGTERM 正常停止）时先写完后台队列中的使用日志和搜索历史，
+这时常驻事件循环和它的线程池都还在运行
+"""
+
+
+def worker_exit(server, worker):
+    from services.write_behind import close_all
+    close_all()
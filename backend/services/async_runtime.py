@@ -0,0 +1,119 @@
+"""
+常驻事件循环
+为同步调用方提供一个长期存活的后台事件循环（每个进程一个），
+让异步客户端的连接池可以在多次同步调用之间复用
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_thread: Optional[threading.Thread] = None
+_pid: Optional[int] = None
+# 解释器正在退出，线程池已不可用
+_exiting = False
+
+
+class _InlineExecutor(concurrent.futures.ThreadPoolExecutor):
+    """在提交任务的线程里直接执行，不启动线程（解释器退出阶段线程池已不能再提交任务）"""
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop):
+    asyncio.set_event_loop(loop)
+    if _exiting:
+        loop.set_default_executor(_InlineExecutor(max_workers=1))
+    else:
+        # asyncio.to_thread 用的线程池：数据库等阻塞调用都在这里执行，默认的 min(32, CPU+4) 太小
+        loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+            max_workers=int(os.getenv('ASYNC_RUNTIME_IO_THREADS', '64')),
+            thread_name_prefix="async-runtime-io"
+        ))
+    loop.run_forever()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）当前进程的后台事件循环"""
+    global _loop, _thread, _pid
+
+    with _lock:
+        # fork之后子进程不能复用父进程的循环线程
+        if _loop is None or _pid != os.getpid() or not _thread.is_alive():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_run_loop, args=(_loop,), name="async-runtime", daemon=True)
+            _thread.start()
+            _pid = os.getpid()
+            logger.debug("后台事件循环已启动")
+        return _loop
+
+
+def use_inline_executor():
+    """
+    解释器退出阶段（atexit）调用：线程池此时已关闭，后台循环之后的阻塞调用
+    （asyncio.to_thread、地址解析等）改为在循环线程里直接执行，退出前的收尾写入仍能完成
+    """
+    global _exiting
+
+    with _lock:
+        _exiting = True
+        if _loop is not None and _pid == os.getpid() and _thread.is_alive():
+            _loop.call_soon_threadsafe(_loop.set_default_executor, _InlineExecutor(max_workers=1))
+
+
+def in_runtime_thread() -> bool:
+    """当前线程是否就是后台事件循环线程"""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+def run_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """
+    在后台事件循环上执行协程，并阻塞等待结果
+
+    协程在调用方 contextvars 上下文的副本中运行，Flask 的 request 等上下文在协程里仍然可用
+    """
+    if in_runtime_thread():
+        # 在循环线程里阻塞等待自己会死锁
+        coro.close()
+        raise RuntimeError("run_sync() 不能在后台事件循环线程中调用，请直接 await")
+
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    return future.result(timeout)
+
+
+def iterate_sync(agen: AsyncIterator[Any]) -> Iterator[Any]:
+    """在后台事件循环上逐项驱动异步生成器，供同步代码（如 Flask 流式响应）迭代"""
+    try:
+        while True:
+            try:
+                yield run_sync(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        # 调用方提前停止迭代（例如客户端断开）时也要让生成器执行清理
+        run_sync(agen.aclose())
+
+
+def spawn(coro: Awaitable[Any]) -> concurrent.futures.Future:
+    """把协程提交到后台事件循环执行，不等待结果（用于后台任务）"""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future: concurrent.futures.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"后台任务失败: {future.exception()!r}")
@@ -3,6 +3,7 @@
 处理用户注册、登录、JWT token管理
 """
 
+import asyncio
 import os
 import jwt
 import hashlib
@@ -86,7 +87,7 @@ class AuthService:
             
             # 创建用户
             verification_token = self.generate_verification_token()
-            hashed_password = self.hash_password(password)
+            hashed_password = await asyncio.to_thread(self.hash_password, password)
             
             user_data = {
                 'email': email,
@@ -160,7 +161,7 @@ class AuthService:
                     'message': '该账户使用Google登录，请使用Google登录方式'
                 }
             
-            if not self.verify_password(password, user['password_hash']):
+            if not await asyncio.to_thread(self.verify_password, password, user['password_hash']):
                 return {
                     'success': False,
                     'error': 'Invalid password',
@@ -214,8 +215,8 @@ class AuthService:
         """Google OAuth登录"""
         try:
             # 验证Google token
-            idinfo = id_token.verify_oauth2_token(
-                google_token, requests.Request(), self.google_client_id
+            idinfo = await asyncio.to_thread(
+                id_token.verify_oauth2_token, google_token, requests.Request(), self.google_client_id
             )
             
             google_user_id = idinfo['sub']
@@ -223,12 +224,13 @@ class AuthService:
             name = idinfo['name']
             avatar_url = idinfo.get('picture')
             
-            # 检查用户是否已存在
-            user = await db_client.get_user_by_google_id(google_user_id)
+            # 检查用户是否已存在，同时检查邮箱是否已被其他方式注册（两个查询并发）
+            user, existing_user = await asyncio.gather(
+                db_client.get_user_by_google_id(google_user_id),
+                db_client.get_user_by_email(email)
+            )
             
             if not user:
-                # 检查邮箱是否已被其他方式注册
-                existing_user = await db_client.get_user_by_email(email)
                 if existing_user:
                     # 更新现有用户的Google ID
                     user = await db_client.update_user(existing_user['id'], {
@@ -323,17 +325,15 @@ class AuthService:
         """验证邮箱"""
         try:
             # 查找具有此验证token的用户
-            result = db_client.client.table('users').select('*').eq('verification_token', verification_token).execute()
+            user = await db_client.get_user_by_verification_token(verification_token)
             
-            if not result.data:
+            if not user:
                 return {
                     'success': False,
                     'error': 'Invalid verification token',
                     'message': '验证链接无效或已过期'
                 }
             
-            user = result.data[0]
-            
             if user.get('email_verified', False):
                 return {
                     'success': False,
@@ -438,19 +438,17 @@ class AuthService:
         """重置密码"""
         try:
             # 查找具有此重置token的用户
-            result = db_client.client.table('users').select('*').eq('verification_token', reset_token).execute()
+            user = await db_client.get_user_by_verification_token(reset_token)
             
-            if not result.data:
+            if not user:
                 return {
                     'success': False,
                     'error': 'Invalid reset token',
                     'message': '重置链接无效或已过期'
                 }
             
-            user = result.data[0]
-            
             # 加密新密码
-            hashed_password = self.hash_password(new_password)
+            hashed_password = await asyncio.to_thread(self.hash_password, new_password)
             
             # 更新用户密码并清除重置token
             updated_user = await db_client.update_user(user['id'], {
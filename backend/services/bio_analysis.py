@@ -0,0 +1,76 @@
+"""
+创作者简介批量解析
+一次处理一批简介（signature），用预编译的正则同时提取邮箱、链接和语言。
+Web 搜索和全量搜索引擎共用这里的规则
+"""
+
+import re
+from typing import Iterable, List, NamedTuple
+
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+# 完整 URL 优先，其次是常见的无协议短链接
+URL_PATTERN = re.compile(r'https?://[^\s]+', re.IGNORECASE)
+SHORT_LINK_PATTERN = re.compile(r'(?:linktr\.ee|bio\.link|beacons\.ai)/[^\s]+', re.IGNORECASE)
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+LATIN_PATTERN = re.compile(r'[a-zA-Z]')
+
+# 简介为空或识别不出语言时的值，由界面显示为"未知"，按语言筛选时不会被当成英文
+UNKNOWN_LANGUAGE = ""
+
+
+class BioFields(NamedTuple):
+    """与输入简介一一对应的解析结果"""
+    emails: List[str]
+    links: List[str]
+    languages: List[str]
+
+
+def _emails(bio: str, all_emails: bool) -> str:
+    if '@' not in bio:
+        return ""
+    if not all_emails:
+        match = EMAIL_PATTERN.search(bio)
+        return match.group(0) if match else ""
+    return '; '.join(EMAIL_PATTERN.findall(bio))
+
+
+def _link(bio: str) -> str:
+    if '/' not in bio:
+        return ""
+    match = URL_PATTERN.search(bio) or SHORT_LINK_PATTERN.search(bio)
+    return match.group(0) if match else ""
+
+
+def _language(bio: str) -> str:
+    # 纯 ASCII 文本不可能包含中文，省掉两次全文扫描
+    if bio.isascii():
+        return "en" if LATIN_PATTERN.search(bio) else UNKNOWN_LANGUAGE
+    cjk = len(CJK_PATTERN.findall(bio))
+    latin = len(LATIN_PATTERN.findall(bio))
+    if cjk > latin:
+        return "zh-CN"
+    return "en" if latin else UNKNOWN_LANGUAGE
+
+
+def analyze_bios(bios: Iterable[str], all_emails: bool = True) -> BioFields:
+    """
+    批量解析简介
+
+    Args:
+        bios: 简介文本，None 视为空
+        all_emails: True 时返回全部邮箱（用 "; " 连接），False 时只返回第一个
+
+    Returns:
+        BioFields(emails, links, languages)，顺序与输入一致；识别不出语言时为空字符串
+    """
+    emails, links, languages = [], [], []
+    for bio in bios:
+        if not bio:
+            emails.append("")
+            links.append("")
+            languages.append(UNKNOWN_LANGUAGE)
+            continue
+        emails.append(_emails(bio, all_emails))
+        links.append(_link(bio))
+        languages.append(_language(bio))
+    return BioFields(emails, links, languages)
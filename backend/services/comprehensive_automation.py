@@ -20,8 +20,8 @@ logger = logging.getLogger(__name__)
 class TikTokCreatorAutomation:
     """TikTok创作者数据自动化收集系统"""
     
-    def __init__(self):
-        self.client = ComprehensiveSearchClient()
+    def __init__(self, client: ComprehensiveSearchClient = None):
+        self.client = client or ComprehensiveSearchClient()
         self.output_dir = "output"
         self._ensure_output_dir()
     
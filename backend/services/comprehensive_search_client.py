@@ -4,16 +4,30 @@
 基于综合搜索API的TikTok创作者数据收集客户端
 """
 
-import requests
+import asyncio
 import json
 import logging
-import time
-import re
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 import os
 from dotenv import load_dotenv
 
+try:
+    from .async_runtime import run_sync
+    from .bio_analysis import analyze_bios
+    from .rate_limiter import TokenBucket, get_tikhub_limiter
+    from .response_cache import ResponseCache, get_response_cache
+    from .single_flight import SingleFlight
+    from .tikhub_transport import AsyncTikHubTransport
+except ImportError:
+    # 作为脚本从 services 目录直接导入时
+    from async_runtime import run_sync
+    from bio_analysis import analyze_bios
+    from rate_limiter import TokenBucket, get_tikhub_limiter
+    from response_cache import ResponseCache, get_response_cache
+    from single_flight import SingleFlight
+    from tikhub_transport import AsyncTikHubTransport
+
 # 加载环境变量
 load_dotenv()
 
@@ -24,10 +38,14 @@ TIKHUB_BASE_URL = os.getenv('TIKHUB_BASE_URL', 'https://api.tikhub.io')
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class TikHubError(Exception):
+    """TikHub 请求重试后仍然失败（区别于正常返回的空结果）"""
+
+
 class ComprehensiveSearchClient:
     """综合搜索API客户端"""
     
-    def __init__(self):
+    def __init__(self, rate_limiter: TokenBucket = None, cache: ResponseCache = None):
         self.base_url = TIKHUB_BASE_URL
         self.api_key = TIKHUB_API_KEY
         self.headers = {
@@ -35,33 +53,57 @@ class ComprehensiveSearchClient:
             "Content-Type": "application/json",
             "User-Agent": "TikTok-Automation/2.0"
         }
+        # 所有TikHub请求共用一个令牌桶，替代各处硬编码的sleep
+        self.rate_limiter = rate_limiter or get_tikhub_limiter()
+        self.transport = AsyncTikHubTransport(self.headers, timeout=30, rate_limiter=self.rate_limiter)
+        # 持久化响应缓存，重复的搜索/资料请求不再消耗API额度
+        self.cache = cache if cache is not None else get_response_cache()
+        # 相同的请求同时只发一次，并发调用方共享结果
+        self.inflight = SingleFlight()
+        # 数据增强时单个请求的超时（含排队等待令牌的时间）
+        self.enhance_call_timeout = float(os.getenv('TIKHUB_ENHANCE_TIMEOUT', '45'))
     
     def _make_request(self, url: str, params: Dict = None, max_retries: int = 3) -> Optional[Dict]:
-        """发送API请求，带重试机制"""
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(url, headers=self.headers, params=params, timeout=30)
-                logger.debug(f"请求URL: {response.url}")
-                logger.debug(f"响应状态: {response.status_code}")
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    logger.warning(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {response.status_code} - {response.text[:100]}...")
-                    if attempt < max_retries - 1:
-                        time.sleep(2 ** attempt)  # 指数退避
-                    continue
-                    
-            except requests.exceptions.RequestException as e:
-                logger.warning(f"请求异常 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # 指数退避
-                continue
+        """发送API请求，带重试机制（同步封装）"""
+        return run_sync(self._make_request_async(url, params, max_retries))
+    
+    async def _make_request_async(self, url: str, params: Dict = None, max_retries: int = 3,
+                                  max_age: Optional[float] = None) -> Optional[Dict]:
+        """
+        发送API请求，带重试机制（优先读取响应缓存，合并进行中的相同请求）
         
-        logger.error(f"所有重试尝试失败，URL: {url}")
-        return None
+        max_age: 只接受不超过这么多秒的缓存，0 表示跳过缓存直接请求（新结果仍会写回缓存）
+        """
+        endpoint = url.rstrip("/").rsplit("/", 1)[-1]
+        
+        if self.cache:
+            cached = await self.cache.get_async(endpoint, params, max_age)
+            if cached is not None:
+                logger.debug(f"缓存命中: {endpoint}")
+                return cached
+        
+        key = (endpoint, ResponseCache.make_key(endpoint, params))
+        return await self.inflight.do(key, lambda: self._fetch_async(endpoint, url, params, max_retries))
     
-    def comprehensive_search(self, keyword: str, count: int = 20, sort_type: int = 0) -> List[Dict]:
+    async def _fetch_async(self, endpoint: str, url: str, params: Dict, max_retries: int) -> Optional[Dict]:
+        result = await self.transport.get_json(url, params, max_retries)
+        
+        # 只缓存成功的响应
+        if self.cache and result and result.get("code", 200) == 200:
+            await self.cache.set_async(endpoint, params, result)
+        
+        return result
+    
+    def comprehensive_search(self, keyword: str, count: int = 20, sort_type: int = 0, offset: int = 0) -> List[Dict]:
+        """综合搜索指定关键词（同步封装，参见 comprehensive_search_async；请求失败时返回空列表）"""
+        try:
+            return run_sync(self.comprehensive_search_async(keyword, count, sort_type, offset))
+        except TikHubError as e:
+            logger.error(str(e))
+            return []
+    
+    async def comprehensive_search_async(self, keyword: str, count: int = 20, sort_type: int = 0,
+                                         offset: int = 0, max_age: Optional[float] = None) -> List[Dict]:
         """
         综合搜索指定关键词
         
@@ -69,15 +111,20 @@ class ComprehensiveSearchClient:
             keyword: 搜索关键词
             count: 返回数量
             sort_type: 0-相关度，1-最多点赞
+            offset: 分页偏移量
+            max_age: 响应缓存最多能旧多少秒，0 表示不读缓存（默认按 endpoint 的 TTL）
             
         Returns:
-            List[Dict]: 搜索结果中的视频列表
+            List[Dict]: 搜索结果中的视频列表，没有结果时为空列表
+            
+        Raises:
+            TikHubError: 请求重试后仍然失败
         """
         url = f"{self.base_url}/api/v1/tiktok/app/v3/fetch_general_search_result"
         
         params = {
             "keyword": keyword,
-            "offset": 0,
+            "offset": offset,
             "count": count,
             "sort_type": sort_type,
             "publish_time": 0  # 0-不限制时间
@@ -85,16 +132,13 @@ class ComprehensiveSearchClient:
         
         logger.info(f"🔍 综合搜索关键词: {keyword}")
         
-        # 高并发优化：减少请求间隔
-        time.sleep(0.3)  # 减少到0.3秒，支持高并发
-        
-        result = self._make_request(url, params)
+        result = await self._make_request_async(url, params, max_age=max_age)
         if not result:
             logger.warning(f"第一次请求失败，等待后重试...")
-            time.sleep(2)  # 减少重试等待时间
-            result = self._make_request(url, params)
+            await asyncio.sleep(2)  # 减少重试等待时间
+            result = await self._make_request_async(url, params, max_age=max_age)
             if not result:
-                return []
+                raise TikHubError(f"综合搜索请求失败: {keyword} (offset={offset})")
         
         # 解析数据结构
         data = result.get("data", {})
@@ -148,6 +192,10 @@ class ComprehensiveSearchClient:
         return list(creators.values())
     
     def get_user_profile(self, unique_id: str = None, sec_user_id: str = None) -> Optional[Dict]:
+        """获取用户详细资料（同步封装）"""
+        return run_sync(self.get_user_profile_async(unique_id, sec_user_id))
+    
+    async def get_user_profile_async(self, unique_id: str = None, sec_user_id: str = None) -> Optional[Dict]:
         """获取用户详细资料"""
         if not unique_id and not sec_user_id:
             return None
@@ -162,13 +210,17 @@ class ComprehensiveSearchClient:
         
         logger.debug(f"获取用户资料: {unique_id or sec_user_id}")
         
-        result = self._make_request(url, params)
+        result = await self._make_request_async(url, params)
         if result and result.get("code") == 200:
             return result.get("data", {})
         
         return None
     
     def get_user_profile_web(self, unique_id: str = None, sec_uid: str = None) -> Optional[Dict]:
+        """获取用户详细资料（Web API版本，同步封装）"""
+        return run_sync(self.get_user_profile_web_async(unique_id, sec_uid))
+    
+    async def get_user_profile_web_async(self, unique_id: str = None, sec_uid: str = None) -> Optional[Dict]:
         """获取用户详细资料（Web API版本，包含bioLink和language数据）"""
         if not unique_id and not sec_uid:
             return None
@@ -183,34 +235,36 @@ class ComprehensiveSearchClient:
         
         logger.debug(f"获取用户资料(Web): {unique_id or sec_uid}")
         
-        try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
-            response.raise_for_status()
-            result = response.json()
-            
-            if result and result.get("code") == 200:
-                data = result.get("data", "")
-                if isinstance(data, str):
-                    try:
-                        return json.loads(data)
-                    except json.JSONDecodeError:
-                        logger.warning(f"无法解析用户资料JSON数据: {data[:100]}...")
-                        return None
-                else:
-                    return data
-            
-            logger.warning(f"获取用户资料失败: {result.get('code')} - {result.get('message', 'No message')}")
-            return None
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"请求用户资料失败: {e}")
-            return None
-        except json.JSONDecodeError as e:
-            logger.error(f"解析用户资料JSON失败: {e}")
+        # Web接口保持单次请求，不做重试
+        result = await self._make_request_async(url, params, max_retries=1)
+        if not result:
+            logger.error(f"请求用户资料失败: {unique_id or sec_uid}")
             return None
+        
+        if result.get("code") == 200:
+            data = result.get("data", "")
+            if isinstance(data, str):
+                try:
+                    return json.loads(data)
+                except json.JSONDecodeError:
+                    logger.warning(f"无法解析用户资料JSON数据: {data[:100]}...")
+                    return None
+            else:
+                return data
+        
+        logger.warning(f"获取用户资料失败: {result.get('code')} - {result.get('message', 'No message')}")
+        return None
     
     def get_user_videos(self, sec_user_id: str, count: int = 10) -> List[Dict]:
+        """获取用户的视频列表（同步封装）"""
+        return run_sync(self.get_user_videos_async(sec_user_id, count))
+    
+    async def get_user_videos_async(self, sec_user_id: str, count: int = 10) -> List[Dict]:
         """获取用户的视频列表"""
+        return await self._fetch_user_videos_async(sec_user_id, count) or []
+    
+    async def _fetch_user_videos_async(self, sec_user_id: str, count: int = 10) -> Optional[List[Dict]]:
+        """获取用户的视频列表，请求失败时返回None（区别于没有视频的空列表）"""
         url = f"{self.base_url}/api/v1/tiktok/app/v3/fetch_user_post_videos"
         
         params = {
@@ -221,23 +275,57 @@ class ComprehensiveSearchClient:
         
         logger.debug(f"获取用户视频: {sec_user_id}")
         
-        result = self._make_request(url, params)
+        result = await self._make_request_async(url, params)
         if result and result.get("code") == 200:
             data = result.get("data", {})
             return data.get("aweme_list", [])
         
-        return []
+        return None
     
     def enhance_creator_data(self, creator: Dict) -> Dict:
-        """增强创作者数据，获取更详细的信息和视频数据"""
+        """增强创作者数据（同步封装）"""
+        return run_sync(self.enhance_creator_data_async(creator))
+    
+    async def _call_with_timeout(self, coro, name: str):
+        """带超时执行单个增强请求，失败或超时返回None"""
+        try:
+            return await asyncio.wait_for(coro, timeout=self.enhance_call_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{name} 请求超时 ({self.enhance_call_timeout}s)")
+        except Exception as e:
+            logger.warning(f"{name} 请求失败: {e}")
+        return None
+    
+    async def enhance_creator_data_async(self, creator: Dict) -> Dict:
+        """
+        增强创作者数据，获取更详细的信息和视频数据
+        
+        App资料、Web资料、视频列表三个请求互不依赖，并发发出后合并；
+        某个请求失败时仍返回已获取的字段，失败项记录在 enhancement_missing 中
+        """
         enhanced = creator.copy()
         
-        # 获取用户详细资料（App API）
-        profile = self.get_user_profile(
-            unique_id=creator.get("unique_id"),
-            sec_user_id=creator.get("sec_user_id")
+        profile, web_profile, videos = await asyncio.gather(
+            # 获取用户详细资料（App API）
+            self._call_with_timeout(self.get_user_profile_async(
+                unique_id=creator.get("unique_id"),
+                sec_user_id=creator.get("sec_user_id")
+            ), "profile"),
+            # 获取用户详细资料（Web API，包含bioLink和language数据）
+            self._call_with_timeout(self.get_user_profile_web_async(
+                unique_id=creator.get("unique_id"),
+                sec_uid=creator.get("sec_user_id")
+            ), "web_profile"),
+            # 获取用户最新视频（获取更多视频，然后按时间排序）
+            self._call_with_timeout(self._fetch_user_videos_async(creator.get("sec_user_id", ""), count=15), "videos")
         )
         
+        missing = [name for name, value in (("profile", profile), ("web_profile", web_profile), ("videos", videos))
+                   if value is None]
+        if missing:
+            logger.warning(f"创作者 {creator.get('unique_id') or creator.get('sec_user_id')} 部分数据缺失: {', '.join(missing)}")
+        enhanced["enhancement_missing"] = missing
+        
         if profile:
             user_info = profile.get("user", {})
             # 更新更准确的数据
@@ -249,12 +337,6 @@ class ComprehensiveSearchClient:
                 "verified": user_info.get("verification_type", 0) > 0
             })
         
-        # 获取用户详细资料（Web API，包含bioLink和language数据）
-        web_profile = self.get_user_profile_web(
-            unique_id=creator.get("unique_id"),
-            sec_uid=creator.get("sec_user_id")
-        )
-        
         if web_profile:
             user_info_web = web_profile.get("userInfo", {}).get("user", {})
             
@@ -272,8 +354,7 @@ class ComprehensiveSearchClient:
             enhanced["bio_link_url"] = ""
             enhanced["language"] = ""
         
-        # 获取用户最新视频
-        videos = self.get_user_videos(creator.get("sec_user_id", ""), count=15)  # 获取更多视频，然后按时间排序
+        videos = videos or []
         video_data = []
         latest_video_timestamp = None
         
@@ -308,9 +389,6 @@ class ComprehensiveSearchClient:
         # 添加新字段
         enhanced["days_since_last_video"] = days_since_last_video
         
-        # 高并发优化：减少延迟
-        time.sleep(0.15)  # 减少到0.15秒，提高处理速度
-        
         return enhanced
     
     def _generate_tiktok_url(self, unique_id: str) -> str:
@@ -326,21 +404,8 @@ class ComprehensiveSearchClient:
         return f"https://www.tiktok.com/@unknown/video/{aweme_id}"
     
     def _extract_email_from_bio(self, bio: str) -> str:
-        """从个人简介中提取邮箱地址"""
-        if not bio:
-            return ""
-        
-        # 邮箱正则表达式
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        
-        # 查找所有邮箱
-        emails = re.findall(email_pattern, bio)
-        
-        # 返回第一个找到的邮箱，如果有多个邮箱用分号分隔
-        if emails:
-            return '; '.join(emails)
-        
-        return ""
+        """从个人简介中提取邮箱地址，多个邮箱用分号分隔"""
+        return analyze_bios([bio]).emails[0]
     
     def _calculate_days_since_video(self, video_timestamp: int) -> int:
         """计算视频发布时间距离今天的天数"""
@@ -392,7 +457,6 @@ class ComprehensiveSearchClient:
                 total_videos.extend(videos)
                 if len(total_videos) >= max_creators * 2:  # 获得足够的视频
                     break
-                time.sleep(1)  # 分批间隔
         
         if not total_videos:
             logger.warning("未找到相关视频")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+创作者指标计算（定价与互动率）
+Web 搜索和全量搜索引擎共用的唯一公式，按整批创作者向量化计算:
+
+    平均/中位数播放量: 最新5个视频中播放量 > 0 的视频
+    weighted_views    = 0.4*V1 + 0.25*V2 + 0.15*V3 + 0.1*V4 + 0.1*V5
+    follower_factor   = log10(follower_count + 1)
+    engagement_rate   = (total_likes / total_videos) / avg_play_count
+    expected_price    = max(80, weighted_views/1000 + follower_factor*5 + engagement_rate*50)
+
+定价调整后可以直接重算已保存的结果文件:
+    python creator_metrics.py output/*.csv
+"""
+
+import sys
+from typing import Dict, List, NamedTuple, Sequence
+
+import numpy as np
+
+VIEW_WEIGHTS = np.array([0.4, 0.25, 0.15, 0.1, 0.1])
+VIDEO_SLOTS = len(VIEW_WEIGHTS)
+PRICE_FLOOR = 80.0
+FOLLOWER_WEIGHT = 5.0
+ENGAGEMENT_WEIGHT = 50.0
+
+
+class FieldMap(NamedTuple):
+    """输入记录中各个字段的名称"""
+    play_counts: Sequence[str]
+    followers: str
+    likes: str
+    videos: str
+
+
+# enhance_creator_data 返回的原始增强数据
+ENHANCED_FIELDS = FieldMap(
+    play_counts=[f"video_{i}_play_count" for i in range(1, VIDEO_SLOTS + 1)],
+    followers="follower_count",
+    likes="total_favorited",
+    videos="aweme_count"
+)
+
+# 搜索结果 / 导出文件中的字段
+RESULT_FIELDS = FieldMap(
+    play_counts=[f"{name}_video_play_count" for name in
+                 ("latest", "second_latest", "third_latest", "fourth_latest", "fifth_latest")],
+    followers="follower_count",
+    likes="total_likes_count",
+    videos="total_video_count"
+)
+
+
+class CreatorMetrics(NamedTuple):
+    """一批创作者的派生指标，每列一个数组，顺序与输入一致"""
+    avg_video_play_count: np.ndarray
+    median_view_count: np.ndarray
+    weighted_views: np.ndarray
+    follower_factor: np.ndarray
+    engagement_rate: np.ndarray
+    expected_price: np.ndarray
+
+    def records(self) -> List[Dict]:
+        """写回创作者记录用的字段"""
+        return [
+            {"avg_video_play_count": int(avg), "median_view_count": int(median), "expected_price": float(price)}
+            for avg, median, price in zip(self.avg_video_play_count, self.median_view_count, self.expected_price)
+        ]
+
+
+def compute_metrics(play_counts, follower_counts, total_likes, total_videos) -> CreatorMetrics:
+    """
+    向量化计算指标
+
+    Args:
+        play_counts: (n, k) 播放量矩阵，k <= 5，按视频从新到旧；缺失或 0 表示没有该视频
+        follower_counts / total_likes / total_videos: 长度为 n 的数组；
+            视频总数为 0 时互动率为 0（缺失的视频总数由调用方按 1 传入，与原来的计算一致）
+    """
+    n = len(follower_counts)
+    plays = np.asarray(play_counts, dtype=np.float64)
+    plays = np.nan_to_num(plays.reshape(n, -1) if n else np.zeros((0, VIDEO_SLOTS)))
+    plays = np.clip(plays, 0, None)
+    if plays.shape[1] < VIDEO_SLOTS:
+        plays = np.pad(plays, ((0, 0), (0, VIDEO_SLOTS - plays.shape[1])))
+    plays = plays[:, :VIDEO_SLOTS]
+
+    followers = np.nan_to_num(np.asarray(follower_counts, dtype=np.float64))
+    likes = np.nan_to_num(np.asarray(total_likes, dtype=np.float64))
+    videos = np.nan_to_num(np.asarray(total_videos, dtype=np.float64))
+
+    valid = plays > 0
+    n_valid = valid.sum(axis=1)
+    has_plays = n_valid > 0
+    avg = np.divide(plays.sum(axis=1), n_valid, out=np.zeros(len(plays)), where=has_plays)
+
+    # 中位数：有效值排在前面（无效值置为 inf 排到最后），按每行的有效个数取中间位置
+    ordered = np.sort(np.where(valid, plays, np.inf), axis=1)
+    lower = np.take_along_axis(ordered, np.maximum(n_valid - 1, 0)[:, None] // 2, axis=1)[:, 0]
+    upper = np.take_along_axis(ordered, (n_valid // 2)[:, None], axis=1)[:, 0]
+    median = np.where(has_plays, (lower + upper) / 2, 0.0)
+
+    weighted_views = plays @ VIEW_WEIGHTS
+    follower_factor = np.log10(np.clip(followers, 0, None) + 1)
+
+    per_video_likes = np.divide(likes, videos, out=np.zeros(len(plays)), where=videos > 0)
+    engagement_rate = np.divide(per_video_likes, avg, out=np.zeros(len(plays)), where=(videos > 0) & (avg > 0))
+
+    price = weighted_views / 1000 + follower_factor * FOLLOWER_WEIGHT + engagement_rate * ENGAGEMENT_WEIGHT
+    expected_price = np.round(np.maximum(PRICE_FLOOR, price), 2)
+
+    return CreatorMetrics(
+        avg_video_play_count=avg.astype(np.int64),
+        median_view_count=median.astype(np.int64),
+        weighted_views=weighted_views,
+        follower_factor=follower_factor,
+        engagement_rate=engagement_rate,
+        expected_price=expected_price
+    )
+
+
+def _number(value, default: float = 0.0) -> float:
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def score_creators(creators: Sequence[Dict], fields: FieldMap = ENHANCED_FIELDS) -> CreatorMetrics:
+    """从创作者记录（字典）计算指标"""
+    n = len(creators)
+    plays = np.fromiter(
+        (_number(creator.get(field)) for creator in creators for field in fields.play_counts),
+        dtype=np.float64, count=n * len(fields.play_counts)
+    ).reshape(n, len(fields.play_counts))
+    return compute_metrics(
+        plays,
+        np.fromiter((_number(creator.get(fields.followers)) for creator in creators), dtype=np.float64, count=n),
+        np.fromiter((_number(creator.get(fields.likes)) for creator in creators), dtype=np.float64, count=n),
+        # 缺失的视频总数按 1 计（原来的 enhanced.get("aweme_count", 1)）
+        np.fromiter((_number(creator.get(fields.videos), 1.0) for creator in creators), dtype=np.float64, count=n)
+    )
+
+
+def rescore_dataframe(df, fields: FieldMap = RESULT_FIELDS):
+    """按当前公式重算导出结果中的指标列（原地修改并返回 DataFrame）"""
+    def column(name, default=0.0):
+        return df[name].to_numpy(dtype=np.float64, na_value=default) if name in df else np.full(len(df), default)
+
+    metrics = compute_metrics(
+        np.column_stack([column(name) for name in fields.play_counts]) if len(df) else np.zeros((0, VIDEO_SLOTS)),
+        column(fields.followers),
+        column(fields.likes),
+        column(fields.videos, 1.0)
+    )
+    df["avg_video_play_count"] = metrics.avg_video_play_count
+    df["median_view_count"] = metrics.median_view_count
+    df["expected_price"] = metrics.expected_price
+    return df
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    if len(sys.argv) < 2:
+        print("用法: python creator_metrics.py <结果CSV文件>...")
+        sys.exit(1)
+
+    for path in sys.argv[1:]:
+        df = rescore_dataframe(pd.read_csv(path, encoding='utf-8-sig'))
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+        print(f"✅ 已重算 {len(df)} 个创作者: {path}")
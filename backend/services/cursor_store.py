@@ -0,0 +1,153 @@
+"""
+搜索分页游标
+游标对客户端是不透明的随机字符串，服务端保存对应的查询条件、下一页 offset
+和已返回过的创作者（64位摘要集合），过期或超出容量后丢弃。
+状态保存在各 worker 进程共享的 SQLite 文件里，翻页请求落到任何一个 worker 上都能继续
+"""
+
+import hashlib
+import json
+import secrets
+import time
+from array import array
+from typing import Hashable, Optional
+
+try:
+    from .shared_sqlite import SharedSqlite
+except ImportError:
+    from shared_sqlite import SharedSqlite
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_cursors (
+    cursor TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    query TEXT NOT NULL,
+    next_offset INTEGER NOT NULL,
+    pages INTEGER NOT NULL,
+    result_set_id TEXT,
+    seen BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_search_cursors_expires_at ON search_cursors (expires_at);
+"""
+
+# 每签发这么多个游标清理一次过期和超出容量的游标
+PRUNE_EVERY = 64
+
+
+class SeenSet:
+    """只保存 64 位摘要的去重集合，比直接保存 unique_id 字符串省内存"""
+
+    __slots__ = ("_digests",)
+
+    def __init__(self, items=()):
+        self._digests = set()
+        for item in items:
+            self.add(item)
+
+    @staticmethod
+    def _digest(item: str) -> int:
+        return int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def add(self, item: str):
+        self._digests.add(self._digest(item))
+
+    def __contains__(self, item: str) -> bool:
+        return self._digest(item) in self._digests
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def to_bytes(self) -> bytes:
+        """每个摘要 8 字节"""
+        return array('Q', self._digests).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SeenSet":
+        seen = cls()
+        digests = array('Q')
+        digests.frombytes(data)
+        seen._digests = set(digests)
+        return seen
+
+
+class CursorState:
+    """一个分页会话的状态"""
+
+    __slots__ = ("query", "next_offset", "seen", "pages", "result_set_id")
+
+    def __init__(self, query: Hashable, next_offset: int, seen: SeenSet = None, result_set_id: str = None):
+        self.query = query
+        self.next_offset = next_offset
+        self.seen = seen if seen is not None else SeenSet()
+        self.pages = 1
+        # 各页结果累积到同一个服务端结果集里
+        self.result_set_id = result_set_id
+
+
+class CursorStore:
+    """共享游标存储，每个游标只能使用一次，取下一页时换发新游标"""
+
+    def __init__(self, path: str, ttl: int = 1800, max_cursors: int = 10000):
+        """
+        Args:
+            path: SQLite 文件路径，同一台机器上的 worker 共用
+            ttl: 游标有效秒数
+            max_cursors: 最多保存的游标数，超出后先丢弃最早过期的
+        """
+        self.ttl = ttl
+        self.max_cursors = max_cursors
+        self._db = SharedSqlite(path, SCHEMA)
+        self._issued = 0
+
+    def issue(self, state: CursorState) -> str:
+        """保存状态并返回新游标"""
+        cursor = secrets.token_urlsafe(16)
+        self._save(cursor, state)
+        return cursor
+
+    def restore(self, cursor: str, state: CursorState):
+        """把 take() 取出但没有用掉的状态放回原游标（例如请求被拒绝时），有效期重新计算"""
+        self._save(cursor, state)
+
+    def _save(self, cursor: str, state: CursorState):
+        with self._db.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO search_cursors "
+                "(cursor, expires_at, query, next_offset, pages, result_set_id, seen) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cursor, time.time() + self.ttl, json.dumps(list(state.query), ensure_ascii=False),
+                 state.next_offset, state.pages, state.result_set_id, state.seen.to_bytes())
+            )
+            self._issued += 1
+            if self._issued % PRUNE_EVERY == 0:
+                self._prune(conn)
+
+    def _prune(self, conn):
+        conn.execute("DELETE FROM search_cursors WHERE expires_at < ?", (time.time(),))
+        excess = conn.execute("SELECT COUNT(*) FROM search_cursors").fetchone()[0] - self.max_cursors
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM search_cursors WHERE cursor IN "
+                "(SELECT cursor FROM search_cursors ORDER BY expires_at LIMIT ?)", (excess,)
+            )
+
+    def take(self, cursor: str) -> Optional[CursorState]:
+        """取出游标对应的状态（游标随即失效），不存在或已过期返回None"""
+        # 读取和删除在同一个写事务里，两个 worker 同时拿同一个游标时只有一个能取到
+        with self._db.transaction() as conn:
+            row = conn.execute(
+                "SELECT expires_at, query, next_offset, pages, result_set_id, seen "
+                "FROM search_cursors WHERE cursor = ?", (cursor,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM search_cursors WHERE cursor = ?", (cursor,))
+
+        if row is None or row[0] < time.time():
+            return None
+        state = CursorState(tuple(json.loads(row[1])), row[2], SeenSet.from_bytes(row[5]), row[4])
+        state.pages = row[3]
+        return state
+
+    def __len__(self) -> int:
+        with self._db.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM search_cursors WHERE expires_at >= ?", (time.time(),)).fetchone()[0]
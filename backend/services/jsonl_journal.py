@@ -0,0 +1,127 @@
+"""
+追加写入的 JSONL 日志
+每条记录序列化为一行紧凑 JSON，只写新增数据；按条数/时间间隔 fsync，
+单个文件超过大小上限后滚动到新分段，读取时按顺序遍历所有分段
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+class JsonlJournal:
+    """只追加的 JSONL 日志文件（支持分段滚动）"""
+
+    def __init__(self, path: str, fsync_every: int = 100, fsync_interval: float = 5.0,
+                 max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            path: 日志文件路径，滚动后的分段为 path.1、path.2 ...
+            fsync_every: 每写入多少条记录 fsync 一次，1 表示每条都落盘
+            fsync_interval: 距上次 fsync 超过多少秒也会落盘
+            max_bytes: 单个分段的大小上限，0 表示不滚动
+        """
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment = self._last_segment()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _segment_path(self, segment: int) -> str:
+        return self.path if segment == 0 else f"{self.path}.{segment}"
+
+    def _last_segment(self) -> int:
+        segments = [0]
+        for name in glob.glob(glob.escape(self.path) + ".*"):
+            suffix = name[len(self.path) + 1:]
+            if suffix.isdigit():
+                segments.append(int(suffix))
+        return max(segments)
+
+    def segments(self) -> List[str]:
+        """按写入顺序返回所有存在的分段文件"""
+        paths = [self._segment_path(i) for i in range(self._last_segment() + 1)]
+        return [path for path in paths if os.path.exists(path)]
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self._segment_path(self._segment), 'a', encoding='utf-8')
+        return self._file
+
+    def _rotate(self):
+        """当前分段写满后切换到下一个分段（调用方持有锁）"""
+        self._sync()
+        self._file.close()
+        self._file = None
+        self._segment += 1
+        logger.info(f"📒 日志滚动到分段 {self._segment_path(self._segment)}")
+
+    def _sync(self):
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record: Dict[str, Any]):
+        """追加一条记录"""
+        self.extend([record])
+
+    def extend(self, records: Iterable[Dict[str, Any]]):
+        """追加多条记录，写入成本只与新数据量有关"""
+        lines = "".join(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n" for record in records)
+        if not lines:
+            return
+
+        with self._lock:
+            f = self._open()
+            if self.max_bytes and f.tell() > 0 and f.tell() + len(lines.encode('utf-8')) > self.max_bytes:
+                self._rotate()
+                f = self._open()
+
+            f.write(lines)
+            self._unsynced += lines.count("\n")
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def sync(self):
+        """立即把缓冲的记录落盘"""
+        with self._lock:
+            self._sync()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """按顺序读取所有分段的记录，跳过损坏的行（通常是中断时写了一半的最后一行）"""
+        self.sync()
+        for path in self.segments():
+            with open(path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        logger.warning(f"{path} 第 {line_number} 行损坏，已忽略")
+
+    def remove(self):
+        """删除所有分段"""
+        self.close()
+        for path in self.segments():
+            os.remove(path)
+        self._segment = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
@@ -0,0 +1,159 @@
+"""
+令牌桶限流器
+所有 TikHub 请求共用一个令牌桶，按 QPS + 突发量放行，
+可跨线程、协程使用，并可通过共享文件跨进程共享额度
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能进程内限流
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Exception):
+    """透支已达上限，retry_after 秒后才可能拿到令牌"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"令牌桶透支已达上限，{retry_after:.2f} 秒后重试")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """令牌桶限流器"""
+
+    def __init__(self, qps: float, burst: int = None, shared_path: str = None, max_debt: int = None):
+        """
+        Args:
+            max_debt: 最多透支的令牌数（默认等于突发量），排队等待最长约 max_debt / qps 秒，
+                      超出时不再预定，抛出 RateLimitExceeded
+        """
+        if qps <= 0:
+            raise ValueError("qps 必须大于0")
+
+        self.qps = qps
+        self.burst = burst or max(1, int(qps))
+        self.max_debt = self.burst if max_debt is None else max_debt
+        self._lock = threading.Lock()
+
+        # 进程内状态
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+
+        # 跨进程状态：共享文件里保存 "令牌数 时间戳"
+        self.shared_path = shared_path if shared_path and fcntl else None
+        if shared_path and not fcntl:
+            logger.warning("当前平台不支持文件锁，限流器退回进程内模式")
+
+    def _refill(self, tokens: float, updated: float, now: float) -> float:
+        return min(float(self.burst), tokens + (now - updated) * self.qps)
+
+    def _take(self, tokens: float) -> float:
+        """从 tokens 里取一个令牌，返回剩余令牌数；透支超出上限时抛出 RateLimitExceeded"""
+        # 令牌不足时允许透支，调用方按透支量等待，保证先到先得；透支有上限，排队时间不会无限增长
+        remaining = tokens - 1
+        if remaining < -self.max_debt:
+            raise RateLimitExceeded((-self.max_debt - remaining) / self.qps)
+        return remaining
+
+    def _reserve_local(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = self._take(self._refill(self._tokens, self._updated, now))
+            self._updated = now
+            return max(0.0, -self._tokens / self.qps)
+
+    def _reserve_shared(self) -> float:
+        with self._lock, open(self.shared_path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                now = time.time()
+                try:
+                    tokens, updated = (float(x) for x in f.read().split())
+                except ValueError:
+                    tokens, updated = float(self.burst), now
+
+                tokens = self._refill(tokens, updated, now)
+                try:
+                    tokens = self._take(tokens)
+                except RateLimitExceeded:
+                    # 没有预定令牌，但补充后的令牌数照样写回
+                    f.seek(0)
+                    f.truncate()
+                    f.write(f"{tokens} {now}")
+                    f.flush()
+                    raise
+                f.seek(0)
+                f.truncate()
+                f.write(f"{tokens} {now}")
+                f.flush()
+                return max(0.0, -tokens / self.qps)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self) -> float:
+        """预定一个令牌，返回需要等待的秒数；透支已达上限时抛出 RateLimitExceeded"""
+        if self.shared_path:
+            return self._reserve_shared()
+        return self._reserve_local()
+
+    def acquire(self, max_wait: float = 0):
+        """
+        阻塞当前线程直到拿到令牌
+
+        Args:
+            max_wait: 透支已达上限时最多退避重试多少秒，超出后抛出 RateLimitExceeded（默认立即抛出）
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            try:
+                wait = self.reserve()
+                break
+            except RateLimitExceeded as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    raise
+                time.sleep(e.retry_after)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, max_wait: float = 0):
+        """在协程中等待令牌，不阻塞事件循环（max_wait 同 acquire）"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            try:
+                wait = self.reserve()
+                break
+            except RateLimitExceeded as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    raise
+                await asyncio.sleep(e.retry_after)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_default_limiter: Optional[TokenBucket] = None
+_default_lock = threading.Lock()
+
+
+def get_tikhub_limiter() -> TokenBucket:
+    """获取全局共享的 TikHub 限流器（由环境变量配置）"""
+    global _default_limiter
+
+    with _default_lock:
+        if _default_limiter is None:
+            qps = float(os.getenv('TIKHUB_QPS', '10'))
+            burst = int(os.getenv('TIKHUB_BURST', '0')) or None
+            shared_path = os.getenv('TIKHUB_RATE_LIMIT_FILE') or None
+            max_debt = int(os.getenv('TIKHUB_MAX_DEBT', '0')) or None
+            _default_limiter = TokenBucket(qps, burst, shared_path, max_debt)
+            logger.info(f"TikHub限流器: QPS={qps}, 突发={_default_limiter.burst}, 透支上限={_default_limiter.max_debt}, 跨进程={'是' if _default_limiter.shared_path else '否'}")
+        return _default_limiter
@@ -0,0 +1,222 @@
+"""
+TikHub 响应磁盘缓存
+按 endpoint + 规范化参数做内容寻址，每个 endpoint 单独设置 TTL，
+超出容量时按最近访问时间 (LRU) 淘汰，并统计命中/未命中次数。
+每个进程（包括 gunicorn fork 出来的 worker）第一次访问时各自打开连接，
+协程里通过 get_async/set_async 在线程池中读写，不阻塞事件循环
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+try:
+    from .shared_sqlite import SharedSqlite
+except ImportError:
+    from shared_sqlite import SharedSqlite
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    endpoint TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at);
+"""
+
+# 各 endpoint 的默认缓存时间（秒），未列出的 endpoint 不缓存
+DEFAULT_TTLS = {
+    "handler_user_profile": 7 * 24 * 3600,
+    "fetch_user_profile": 7 * 24 * 3600,
+    "fetch_user_post_videos": 24 * 3600,
+    "fetch_general_search_result": 24 * 3600,
+}
+
+
+class ResponseCache:
+    """基于 SQLite 的持久化响应缓存"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024 * 1024, ttls: Dict[str, int] = None):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "responses.sqlite3")
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+
+        # 连接延迟到第一次读写时按进程打开，fork 出的 worker 不会沿用父进程的连接
+        self._db = SharedSqlite(self.path, SCHEMA)
+        self._total_bytes: Optional[int] = None
+
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def make_key(endpoint: str, params: Optional[Dict]) -> str:
+        """根据 endpoint 和规范化后的参数生成缓存键"""
+        normalized = {}
+        for name, value in (params or {}).items():
+            if value is None:
+                continue
+            value = str(value).strip()
+            # 搜索关键词不区分大小写
+            if name == "keyword":
+                value = value.lower()
+            normalized[name] = value
+
+        raw = json.dumps([endpoint, normalized], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, endpoint: str) -> int:
+        return self.ttls.get(endpoint, 0)
+
+    def get(self, endpoint: str, params: Optional[Dict], max_age: Optional[float] = None) -> Optional[Any]:
+        """
+        读取缓存，过期或不存在返回None
+
+        Args:
+            max_age: 本次读取能接受的最大缓存时间（秒），比 endpoint 的 TTL 更严格时生效，0 表示不读缓存
+        """
+        ttl = self.ttl_for(endpoint)
+        if max_age is not None:
+            ttl = min(ttl, max_age)
+        if ttl <= 0:
+            return None
+
+        key = self.make_key(endpoint, params)
+        now = time.time()
+        with self._db.connect() as conn:
+            row = conn.execute(
+                "SELECT created_at, payload FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[0] > ttl:
+                self.misses[endpoint] += 1
+                return None
+
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits[endpoint] += 1
+
+        try:
+            return json.loads(zlib.decompress(row[1]))
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"缓存数据损坏，忽略: {e}")
+            return None
+
+    def set(self, endpoint: str, params: Optional[Dict], value: Any):
+        """写入缓存，超出容量时淘汰最久未访问的条目"""
+        if self.ttl_for(endpoint) <= 0:
+            return
+
+        key = self.make_key(endpoint, params)
+        payload = zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        now = time.time()
+
+        with self._db.connect() as conn:
+            if self._total_bytes is None:
+                self._total_bytes = self._stored_bytes(conn)
+            old = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, created_at, accessed_at, size, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, now, now, len(payload), payload)
+            )
+            self._total_bytes += len(payload) - (old[0] if old else 0)
+
+            if self._total_bytes > self.max_bytes:
+                self._evict(conn)
+
+    async def get_async(self, endpoint: str, params: Optional[Dict], max_age: Optional[float] = None) -> Optional[Any]:
+        """在线程池中执行 get()（数据库读取和解压都不占用事件循环），数据库出错时按未命中处理"""
+        try:
+            return await asyncio.to_thread(self.get, endpoint, params, max_age)
+        except sqlite3.Error as e:
+            logger.warning(f"读取响应缓存失败: {e}")
+            return None
+
+    async def set_async(self, endpoint: str, params: Optional[Dict], value: Any):
+        """在线程池中执行 set()，数据库出错时只记录日志"""
+        try:
+            await asyncio.to_thread(self.set, endpoint, params, value)
+        except sqlite3.Error as e:
+            logger.warning(f"写入响应缓存失败: {e}")
+
+    @staticmethod
+    def _stored_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection):
+        """按 LRU 淘汰到容量的 90% 以下（调用方持有连接锁）"""
+        target = int(self.max_bytes * 0.9)
+        # 其他进程可能也写过，先以数据库为准
+        self._total_bytes = self._stored_bytes(conn)
+
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            evicted.append((key,))
+            self._total_bytes -= size
+
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logger.info(f"🧹 响应缓存淘汰 {len(evicted)} 条，当前 {self._total_bytes / 1024 / 1024:.1f} MB")
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中统计"""
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "size_bytes": self._total_bytes or 0,
+            "by_endpoint": {
+                endpoint: {"hits": self.hits[endpoint], "misses": self.misses[endpoint]}
+                for endpoint in sorted(set(self.hits) | set(self.misses))
+            }
+        }
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """获取全局共享的响应缓存（由环境变量配置），关闭时返回None"""
+    global _default_cache
+
+    if os.getenv('TIKHUB_CACHE_ENABLED', 'true').lower() != 'true':
+        return None
+
+    with _default_lock:
+        if _default_cache is None:
+            cache_dir = os.getenv('TIKHUB_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'beee-media', 'tikhub')
+            max_bytes = int(os.getenv('TIKHUB_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+            # 形如 "handler_user_profile=604800,fetch_general_search_result=3600"
+            ttls = {}
+            for item in os.getenv('TIKHUB_CACHE_TTLS', '').split(','):
+                if '=' in item:
+                    endpoint, seconds = item.split('=', 1)
+                    ttls[endpoint.strip()] = int(seconds)
+
+            try:
+                _default_cache = ResponseCache(cache_dir, max_bytes, ttls)
+                logger.info(f"TikHub响应缓存: {_default_cache.path}")
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"无法初始化响应缓存，缓存已禁用: {e}")
+                return None
+        return _default_cache
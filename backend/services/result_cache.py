@@ -0,0 +1,185 @@
+"""
+搜索结果缓存 (stale-while-revalidate)
+按规范化后的查询条件缓存整份搜索结果：TTL 内直接返回；过期但仍在
+stale 窗口内时先返回旧结果，同时在后台刷新；超出窗口才同步重新加载
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    from .async_runtime import get_loop, in_runtime_thread, spawn
+    from .single_flight import SingleFlight
+except ImportError:
+    from async_runtime import get_loop, in_runtime_thread, spawn
+    from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class SearchResultCache:
+    """进程内 LRU 结果缓存，支持过期后后台刷新"""
+
+    def __init__(self, ttl: int = 600, stale_ttl: int = 3600, max_entries: int = 1000,
+                 should_cache: Callable[[Any], bool] = None):
+        """
+        Args:
+            ttl: 结果保持新鲜的秒数
+            stale_ttl: 过期后仍可作为旧结果返回的秒数（期间触发后台刷新）
+            max_entries: 最多缓存多少个查询，超出按 LRU 淘汰
+            should_cache: 判断结果是否可以缓存（例如失败结果不缓存）
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.should_cache = should_cache or (lambda value: value is not None)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: set = set()
+        # 未命中时同一个查询只加载一次，并发请求共享结果
+        self._inflight = SingleFlight()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @staticmethod
+    def make_key(keyword: str, country: str = '', region: str = '',
+                 min_followers: Any = 0, max_followers: Any = 0) -> Tuple:
+        """规范化查询条件：关键词忽略大小写和多余空白，粉丝数统一为整数"""
+        return (
+            " ".join(str(keyword).lower().split()),
+            str(country or '').strip().upper(),
+            str(region or '').strip().lower(),
+            int(min_followers or 0),
+            int(max_followers or 0)
+        )
+
+    def _lookup(self, key: Tuple) -> Tuple[Optional[Any], Optional[str]]:
+        """返回 (结果, 状态)，状态为 'fresh' / 'stale' / None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+
+            age = time.time() - entry[0]
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                return None, None
+
+            self._entries.move_to_end(key)
+            return entry[1], 'fresh' if age <= self.ttl else 'stale'
+
+    def contains(self, key: Tuple) -> bool:
+        """是否有可以直接返回的结果（新鲜的，或已过期但仍在 stale 窗口内）"""
+        return self._lookup(key)[1] is not None
+
+    def set(self, key: Tuple, value: Any):
+        if not self.should_cache(value):
+            return
+
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Tuple = None):
+        """删除单个查询的缓存，不传 key 时清空"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    async def get_or_load(self, key: Tuple, loader: Loader, refresh_loader: Loader = None) -> Tuple[Any, str]:
+        """
+        读取缓存，必要时调用 loader 加载
+
+        loader 总是在常驻事件循环上执行，这样请求结束后后台刷新仍能继续，
+        并且复用同一个 TikHub 连接池
+
+        Args:
+            refresh_loader: 后台刷新过期结果时使用的加载函数（默认同 loader）；
+                下层还有缓存时应当绕过它，否则刷新只会拿回同一份旧数据
+
+        Returns:
+            (结果, 状态)，状态为 'hit' / 'stale' / 'miss'
+        """
+        value, state = self._lookup(key)
+
+        if state == 'fresh':
+            with self._lock:
+                self.hits += 1
+            return value, 'hit'
+
+        if state == 'stale':
+            with self._lock:
+                self.stale_hits += 1
+            self._schedule_refresh(key, refresh_loader or loader)
+            return value, 'stale'
+
+        with self._lock:
+            self.misses += 1
+        value = await self._inflight.do(key, lambda: self._load(key, loader))
+        return value, 'miss'
+
+    async def _load(self, key: Tuple, loader: Loader) -> Any:
+        value = await self._run_in_runtime(loader)
+        self.set(key, value)
+        return value
+
+    async def _run_in_runtime(self, loader: Loader) -> Any:
+        if in_runtime_thread():
+            return await loader()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(loader(), get_loop()))
+
+    def _schedule_refresh(self, key: Tuple, loader: Loader):
+        """后台刷新过期结果，同一个查询同时只刷新一次"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        spawn(self._refresh(key, loader))
+
+    async def _refresh(self, key: Tuple, loader: Loader):
+        try:
+            self.set(key, await loader())
+            with self._lock:
+                self.refreshes += 1
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.warning(f"后台刷新搜索结果失败 {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        with self._lock:
+            served = self.hits + self.stale_hits
+            total = served + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_rate": round(served / total, 4) if total else 0.0,
+                "refreshes": self.refreshes,
+                "refresh_errors": self.refresh_errors,
+                "refreshing": len(self._refreshing),
+                "coalesced": self._inflight.shared,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl
+            }
@@ -0,0 +1,313 @@
+"""
+服务端结果集
+把一次搜索得到的创作者列表按列保存成 numpy 数组，排序、筛选、分页都在服务端完成，
+客户端只取当前页，不用把整份结果下载到浏览器里再排序。
+行数据保存在各 worker 进程共享的 SQLite 文件里，列式结构由每个进程按需构建并缓存
+"""
+
+import json
+import secrets
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from .shared_sqlite import SharedSqlite
+except ImportError:
+    from shared_sqlite import SharedSqlite
+
+SCHEMA = """
+-- 旧版本把整份结果存成一个 blob（result_sets 表），结构不兼容，结果集本身是临时数据，直接删除
+DROP TABLE IF EXISTS result_sets;
+CREATE TABLE IF NOT EXISTS result_set_meta (
+    id TEXT PRIMARY KEY,
+    accessed_at REAL NOT NULL,
+    row_count INTEGER NOT NULL,
+    chunk_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_result_set_meta_accessed_at ON result_set_meta (accessed_at);
+CREATE TABLE IF NOT EXISTS result_set_rows (
+    set_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    rows BLOB NOT NULL,
+    PRIMARY KEY (set_id, seq)
+);
+"""
+
+# 每保存这么多个结果集清理一次过期和超出容量的结果集
+PRUNE_EVERY = 64
+
+# 可排序 / 可按范围筛选的数值列
+NUMERIC_FIELDS = (
+    'follower_count',
+    'expected_price',
+    'days_since_last_video',
+    'total_likes_count',
+    'avg_video_play_count',
+    'total_video_count'
+)
+
+
+def _to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ResultSet:
+    """一份搜索结果的列式存储，可以继续追加（例如按游标翻页得到的后续结果）"""
+
+    def __init__(self, rows: List[Dict] = ()):
+        self._lock = threading.Lock()
+        self.rows: List[Dict] = []
+        self._columns: Dict[str, np.ndarray] = self._build_columns([])
+        self.extend(rows)
+
+    @staticmethod
+    def _build_columns(rows: List[Dict]) -> Dict[str, np.ndarray]:
+        columns = {
+            field: np.fromiter((_to_float(row.get(field)) for row in rows), dtype=np.float64, count=len(rows))
+            for field in NUMERIC_FIELDS
+        }
+        columns['has_email'] = np.fromiter((bool(row.get('email')) for row in rows), dtype=bool, count=len(rows))
+        columns['language'] = np.array([row.get('language') or '' for row in rows], dtype=object)
+        return columns
+
+    def extend(self, rows: List[Dict]):
+        """追加结果（按 unique_id 已去重的行）"""
+        if not rows:
+            return
+        added = self._build_columns(rows)
+        with self._lock:
+            self.rows = self.rows + list(rows)
+            self._columns = {name: np.concatenate([column, added[name]]) for name, column in self._columns.items()}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def query(self, sort_by: str = None, descending: bool = True,
+              ranges: Dict[str, Tuple[Optional[float], Optional[float]]] = None,
+              has_email: Optional[bool] = None, language: Optional[str] = None,
+              offset: int = 0, limit: int = 20) -> Tuple[int, List[Dict]]:
+        """
+        筛选、排序并分页
+
+        Args:
+            sort_by: 排序字段（NUMERIC_FIELDS 之一），不传保持原顺序；缺失值总是排在最后
+            ranges: {字段: (最小值, 最大值)}，边界为 None 表示不限
+            has_email: True 只要有邮箱的，False 只要没有邮箱的
+            language: 语言代码
+
+        Returns:
+            (筛选后的总数, 当前页的行)
+        """
+        with self._lock:
+            rows, columns = self.rows, self._columns
+
+        mask = np.ones(len(rows), dtype=bool)
+        for field, (low, high) in (ranges or {}).items():
+            column = columns[field]
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+        if has_email is not None:
+            mask &= columns['has_email'] == has_email
+        if language:
+            mask &= columns['language'] == language
+
+        indices = np.flatnonzero(mask)
+        if sort_by:
+            values = columns[sort_by][indices]
+            # 稳定排序；降序时取负值，nan 仍然排在最后
+            order = np.argsort(-values if descending else values, kind='stable')
+            indices = indices[order]
+
+        page = indices[offset:offset + limit]
+        return len(indices), [rows[i] for i in page]
+
+
+class ResultSetStore:
+    """
+    共享结果集存储，按 id 访问，闲置过期或超出容量后丢弃
+
+    每次保存或追加的行作为一个分块（zlib 压缩的 JSON）单独存放，追加只写新的分块。
+    结果集只会追加，所以本进程缓存的列式结构只需补上新增的分块
+    """
+
+    def __init__(self, path: str, ttl: int = 1800, max_sets: int = 2000, local_max: int = 256):
+        """
+        Args:
+            path: SQLite 文件路径，同一台机器上的 worker 共用
+            ttl: 结果集闲置多少秒后丢弃
+            max_sets: 最多保存的结果集数
+            local_max: 每个进程最多缓存多少个已构建的结果集
+        """
+        self.ttl = ttl
+        self.max_sets = max_sets
+        self.local_max = local_max
+        self._db = SharedSqlite(path, SCHEMA)
+        self._lock = threading.Lock()
+        # id -> (结果集, 已载入的分块数)
+        self._local: "OrderedDict[str, Tuple[ResultSet, int]]" = OrderedDict()
+        self._puts = 0
+
+    @staticmethod
+    def _encode(rows: List[Dict]) -> bytes:
+        return zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def _decode(payload: bytes) -> List[Dict]:
+        return json.loads(zlib.decompress(payload))
+
+    def _remember(self, result_set_id: str, result_set: Optional[ResultSet], chunks: int = 0):
+        with self._lock:
+            if result_set is None:
+                self._local.pop(result_set_id, None)
+                return
+            self._local[result_set_id] = (result_set, chunks)
+            self._local.move_to_end(result_set_id)
+            while len(self._local) > self.local_max:
+                self._local.popitem(last=False)
+
+    def _cached(self, result_set_id: str) -> Tuple[Optional[ResultSet], int]:
+        with self._lock:
+            return self._local.get(result_set_id, (None, 0))
+
+    def _live_meta(self, conn, result_set_id: str, now: float) -> Optional[Tuple[int, int]]:
+        """未过期时返回 (行数, 分块数) 并刷新访问时间，已过期的顺便删除"""
+        row = conn.execute(
+            "SELECT accessed_at, row_count, chunk_count FROM result_set_meta WHERE id = ?", (result_set_id,)
+        ).fetchone()
+        if row is None or row[0] + self.ttl < now:
+            if row is not None:
+                self._delete(conn, [result_set_id])
+            return None
+        conn.execute("UPDATE result_set_meta SET accessed_at = ? WHERE id = ?", (now, result_set_id))
+        return row[1], row[2]
+
+    @staticmethod
+    def _delete(conn, result_set_ids: List[str]):
+        conn.executemany("DELETE FROM result_set_rows WHERE set_id = ?", [(i,) for i in result_set_ids])
+        conn.executemany("DELETE FROM result_set_meta WHERE id = ?", [(i,) for i in result_set_ids])
+
+    def put(self, rows: List[Dict]) -> Tuple[str, ResultSet]:
+        """保存一份新结果，返回 (id, 结果集)"""
+        result_set = ResultSet(rows)
+        result_set_id = secrets.token_urlsafe(12)
+        with self._db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO result_set_meta (id, accessed_at, row_count, chunk_count) VALUES (?, ?, ?, 1)",
+                (result_set_id, time.time(), len(result_set))
+            )
+            conn.execute(
+                "INSERT INTO result_set_rows (set_id, seq, rows) VALUES (?, 0, ?)",
+                (result_set_id, self._encode(result_set.rows))
+            )
+            self._puts += 1
+            if self._puts % PRUNE_EVERY == 0:
+                self._prune(conn)
+        self._remember(result_set_id, result_set, 1)
+        return result_set_id, result_set
+
+    def _prune(self, conn):
+        expired = [row[0] for row in conn.execute(
+            "SELECT id FROM result_set_meta WHERE accessed_at < ?", (time.time() - self.ttl,)
+        )]
+        excess = conn.execute("SELECT COUNT(*) FROM result_set_meta").fetchone()[0] - len(expired) - self.max_sets
+        if excess > 0:
+            expired += [row[0] for row in conn.execute(
+                "SELECT id FROM result_set_meta WHERE accessed_at >= ? ORDER BY accessed_at LIMIT ?",
+                (time.time() - self.ttl, excess)
+            )]
+        self._delete(conn, expired)
+
+    def touch(self, result_set_id: str) -> bool:
+        """刷新结果集的过期时间，返回它是否还存在（不载入数据）"""
+        with self._db.connect() as conn:
+            return self._live_meta(conn, result_set_id, time.time()) is not None
+
+    def get(self, result_set_id: str) -> Optional[ResultSet]:
+        """取结果集并刷新它的过期时间，不存在或已过期返回None"""
+        with self._db.connect() as conn:
+            meta = self._live_meta(conn, result_set_id, time.time())
+            if meta is None:
+                self._remember(result_set_id, None)
+                return None
+            row_count, chunk_count = meta
+
+            result_set, loaded = self._cached(result_set_id)
+            if result_set is not None and len(result_set) == row_count:
+                return result_set
+            if result_set is None:
+                loaded = 0
+            # 只读取本进程还没有的分块
+            chunks = conn.execute(
+                "SELECT rows FROM result_set_rows WHERE set_id = ? AND seq >= ? ORDER BY seq",
+                (result_set_id, loaded)
+            ).fetchall()
+
+        rows = [row for (payload,) in chunks for row in self._decode(payload)]
+        if result_set is None:
+            result_set = ResultSet(rows)
+        else:
+            result_set.extend(rows)
+        self._remember(result_set_id, result_set, loaded + len(chunks))
+        return result_set
+
+    def extend(self, result_set_id: str, rows: List[Dict]) -> bool:
+        """往已有结果集追加一个分块（例如按游标翻页得到的后续结果），结果集不存在或已过期返回False"""
+        if not rows:
+            return self.touch(result_set_id)
+
+        with self._db.transaction() as conn:
+            meta = self._live_meta(conn, result_set_id, time.time())
+            if meta is None:
+                return False
+            conn.execute(
+                "INSERT INTO result_set_rows (set_id, seq, rows) VALUES (?, ?, ?)",
+                (result_set_id, meta[1], self._encode(list(rows)))
+            )
+            conn.execute(
+                "UPDATE result_set_meta SET row_count = row_count + ?, chunk_count = chunk_count + 1 WHERE id = ?",
+                (len(rows), result_set_id)
+            )
+        return True
+
+    def fork(self, result_set_id: str, rows: List[Dict]) -> Optional[str]:
+        """
+        复制一份结果集并追加 rows，返回新的 id，原结果集不存在或已过期返回None
+
+        相同查询的第一页结果集是共享的（结果缓存命中时复用），翻页时要先复制再追加
+        """
+        fork_id = secrets.token_urlsafe(12)
+        with self._db.transaction() as conn:
+            meta = self._live_meta(conn, result_set_id, time.time())
+            if meta is None:
+                return None
+            row_count, chunk_count = meta
+            conn.execute(
+                "INSERT INTO result_set_meta (id, accessed_at, row_count, chunk_count) VALUES (?, ?, ?, ?)",
+                (fork_id, time.time(), row_count + len(rows), chunk_count + (1 if rows else 0))
+            )
+            conn.execute(
+                "INSERT INTO result_set_rows (set_id, seq, rows) "
+                "SELECT ?, seq, rows FROM result_set_rows WHERE set_id = ?", (fork_id, result_set_id)
+            )
+            if rows:
+                conn.execute(
+                    "INSERT INTO result_set_rows (set_id, seq, rows) VALUES (?, ?, ?)",
+                    (fork_id, chunk_count, self._encode(list(rows)))
+                )
+        return fork_id
+
+    def __len__(self) -> int:
+        with self._db.connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM result_set_meta WHERE accessed_at >= ?", (time.time() - self.ttl,)
+            ).fetchone()[0]
@@ -0,0 +1,113 @@
+"""
+全量搜索检查点
+以追加写入的 JSONL 日志记录搜索进度（offset、已见视频/创作者、已收集创作者）
+和增强进度，中断后可以从日志回放出原来的状态继续执行
+"""
+
+import hashlib
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+try:
+    from .jsonl_journal import JsonlJournal
+except ImportError:
+    from jsonl_journal import JsonlJournal
+
+logger = logging.getLogger(__name__)
+
+
+class SearchCheckpoint:
+    """单个关键词的检查点日志"""
+
+    def __init__(self, path: str):
+        self.path = path
+        # 检查点每条记录都要立即落盘，且不滚动分段
+        self._journal = JsonlJournal(path, fsync_every=1, max_bytes=0)
+
+    @classmethod
+    def for_keyword(cls, keyword: str, directory: str = "output/checkpoints") -> "SearchCheckpoint":
+        """按关键词生成检查点文件路径"""
+        safe = re.sub(r'[^\w\-]+', '_', keyword).strip('_')[:50] or "keyword"
+        digest = hashlib.sha1(keyword.encode('utf-8')).hexdigest()[:8]
+        return cls(os.path.join(directory, f"{safe}_{digest}.jsonl"))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def append(self, record: Dict[str, Any]):
+        """追加一条记录并落盘"""
+        self._journal.append(record)
+
+    def record_page(self, offset: int, next_offset: int, consecutive_empty: int, search_count: int,
+                    video_ids: List[str], creators: List[Dict]):
+        """记录一页搜索结果（只含本页新增的视频ID和创作者）"""
+        self.append({
+            "type": "page",
+            "offset": offset,
+            "next_offset": next_offset,
+            "consecutive_empty": consecutive_empty,
+            "search_count": search_count,
+            "video_ids": video_ids,
+            "creators": creators
+        })
+
+    def record_search_done(self, creator_keys: List[str]):
+        """记录搜索阶段结束，以及最终选中的创作者（按顺序）"""
+        self.append({"type": "search_done", "creator_keys": creator_keys})
+
+    def record_enhanced(self, creator_key: str, data: Dict):
+        """记录一个创作者的增强结果（接口返回的原始数据，指标在整批处理时计算）"""
+        self.append({"type": "enhanced", "key": creator_key, "data": data})
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """回放日志，返回恢复所需的状态；没有检查点时返回None"""
+        if not self.exists():
+            return None
+
+        state = {
+            "next_offset": 0,
+            "consecutive_empty": 0,
+            "search_count": 0,
+            "seen_video_ids": set(),
+            "creators": {},
+            "search_done": False,
+            "final_keys": None,
+            "enhanced": {}
+        }
+
+        for record in self._journal:
+            record_type = record.get("type")
+            if record_type == "page":
+                state["next_offset"] = record["next_offset"]
+                state["consecutive_empty"] = record["consecutive_empty"]
+                state["search_count"] = record["search_count"]
+                state["seen_video_ids"].update(record["video_ids"])
+                for creator in record["creators"]:
+                    state["creators"][_creator_key(creator)] = creator
+            elif record_type == "search_done":
+                state["search_done"] = True
+                state["final_keys"] = record["creator_keys"]
+            elif record_type == "enhanced":
+                state["enhanced"][record["key"]] = record["data"]
+
+        if state["search_done"]:
+            collected = [state["creators"][key] for key in state["final_keys"] if key in state["creators"]]
+        else:
+            collected = list(state["creators"].values())
+        state["collected_creators"] = collected
+        state["seen_creator_ids"] = set(state.pop("creators"))
+        return state
+
+    def reset(self):
+        """丢弃旧的检查点，重新开始"""
+        self._journal.remove()
+
+    def close(self):
+        self._journal.close()
+
+
+def _creator_key(creator: Dict) -> str:
+    """创作者去重键，与 FullScaleSearchEngine._creator_key 一致"""
+    return creator.get("unique_id") or creator.get("user_id") or creator.get("sec_user_id", "")
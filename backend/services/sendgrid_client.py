@@ -3,6 +3,7 @@ SendGrid 邮箱服务客户端
 处理所有邮件发送功能
 """
 
+import asyncio
 import os
 import logging
 from typing import Dict, List, Optional, Any
@@ -60,7 +61,8 @@ class SendGridClient:
                 if text_content:
                     mail.add_content(Content("text/plain", text_content))
             
-            response = self.client.send(mail)
+            # SendGrid SDK 是阻塞调用，放到线程池里执行
+            response = await asyncio.to_thread(self.client.send, mail)
             
             result = {
                 'success': True,
@@ -0,0 +1,61 @@
+"""
+进程间共享的 SQLite 状态库
+gunicorn 的多个 worker 进程读写同一个数据库文件（WAL 模式，读写互不阻塞），
+一个 worker 发出的游标、保存的结果集，请求落到其他 worker 上也能取到。
+每个进程（包括 fork 出来的子进程）各自打开连接
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class SharedSqlite:
+    """按进程打开的 SQLite 连接，同一进程内用锁串行访问"""
+
+    def __init__(self, path: str, schema: str):
+        """
+        Args:
+            path: 数据库文件路径，所在目录不存在时自动创建
+            schema: 建表语句（需要可重复执行，例如 CREATE TABLE IF NOT EXISTS）
+        """
+        self.path = path
+        self.schema = schema
+        self.lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        # fork 之后不能继续使用父进程的连接（调用方持有锁）
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.schema)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """自动提交模式的连接，单条语句即是一个事务"""
+        with self.lock:
+            yield self._connection()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务（BEGIN IMMEDIATE），多条语句对其他进程原子可见"""
+        with self.lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
@@ -0,0 +1,72 @@
+"""
+请求合并 (single-flight)
+同一个 key 同时只执行一次上游调用，并发的相同请求等待并共享这次调用的结果。
+用 concurrent.futures.Future 保存进行中的调用，不同线程、不同事件循环里的调用方都能等待
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """按 key 合并并发的相同调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, concurrent.futures.Future] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行 fn()，如果相同 key 的调用正在进行则等待它的结果
+
+        结果对象会被所有等待者共享，调用方不要原地修改。
+        发起调用的请求被取消时，等待中的请求会自己重新发起
+        """
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = concurrent.futures.Future()
+                    self._calls[key] = future
+                    self.executed += 1
+                else:
+                    self.shared += 1
+
+            if leader:
+                return await self._run(key, future, fn)
+
+            try:
+                # shield：等待者自己被取消时不影响共享的调用
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                logger.debug(f"合并的请求已被取消，重新发起: {key}")
+
+    async def _run(self, key: Hashable, future: concurrent.futures.Future, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"executed": self.executed, "shared": self.shared, "in_flight": len(self._calls)}
@@ -1,36 +1,165 @@
 """
 Supabase 数据库客户端
 处理所有数据库操作
+
+通过 PostgREST 的异步客户端直接访问 Supabase REST 接口：每个事件循环一个
+httpx 连接池（keep-alive），查询不占用线程，同一请求里的多个查询可以并发执行
 """
 
+import asyncio
+import base64
+import importlib.util
+import json
 import os
-from typing import Optional, Dict, List, Any
-from supabase import create_client, Client
+import uuid
+import weakref
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Tuple
+import httpx
+from postgrest import AsyncPostgrestClient
+from postgrest.types import ReturnMethod
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 安装了 h2 才能启用 HTTP/2，否则退回 HTTP/1.1 keep-alive
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class PooledPostgrestClient(AsyncPostgrestClient):
+    """使用自定义连接池参数的 PostgREST 异步客户端"""
+
+    def __init__(self, base_url: str, *, headers: Dict[str, str], timeout: float, limits: httpx.Limits):
+        self.limits = limits
+        super().__init__(base_url, headers=headers, timeout=timeout)
+
+    def create_session(self, base_url, headers, timeout) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=self.limits,
+            http2=HTTP2_AVAILABLE
+        )
+
+
+# 列表只取轻量字段，JSONB 快照（results_data / creator_data）只在详情接口里返回
+SEARCH_HISTORY_LIST_COLUMNS = 'id, search_query, search_type, filters, results_count, created_at'
+FAVORITE_LIST_COLUMNS = 'id, creator_unique_id, creator_nickname, notes, tags, created_at, updated_at'
+
+
+def encode_keyset_cursor(row: Dict[str, Any]) -> str:
+    """用一页最后一行的 (created_at, id) 生成下一页游标"""
+    raw = json.dumps([row['created_at'], row['id']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_keyset_cursor(cursor: str) -> Tuple[str, str]:
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(created_at, str) or not isinstance(row_id, str):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    # 两个值会拼进 PostgREST 的 or 过滤条件，只接受 UUID 和 ISO-8601 时间戳，
+    # 并以规范化后的形式返回，避免客户端借游标注入额外的过滤条件
+    try:
+        row_id = str(uuid.UUID(row_id))
+        created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00')).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return created_at, row_id
+
+
 class SupabaseClient:
     def __init__(self):
         self.url = os.getenv('SUPABASE_URL')
         self.key = os.getenv('SUPABASE_ANON_KEY')
+        self.timeout = float(os.getenv('SUPABASE_TIMEOUT', '10'))
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv('SUPABASE_MAX_CONNECTIONS', '50')),
+            max_keepalive_connections=int(os.getenv('SUPABASE_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=60
+        )
+        # httpx.AsyncClient 绑定在创建它的事件循环上，每个循环各持有一个连接池
+        self._rest_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PooledPostgrestClient]" = weakref.WeakKeyDictionary()
         
-        if not self.url or not self.key:
+        self.enabled = bool(self.url and self.key)
+        if not self.enabled:
             logger.warning("SUPABASE_URL or SUPABASE_ANON_KEY not set, database functionality will be disabled")
-            self.client = None
         else:
-            self.client: Client = create_client(self.url, self.key)
             logger.info("Supabase client initialized")
     
+    def _rest(self) -> PooledPostgrestClient:
+        """当前事件循环上的 PostgREST 客户端"""
+        if not self.enabled:
+            raise RuntimeError("Supabase client not initialized")
+        
+        loop = asyncio.get_running_loop()
+        client = self._rest_clients.get(loop)
+        if client is None or client.session.is_closed:
+            client = PooledPostgrestClient(
+                f"{self.url.rstrip('/')}/rest/v1",
+                headers={
+                    'apikey': self.key,
+                    'Authorization': f'Bearer {self.key}',
+                    'Accept': 'application/json',
+                    'Content-Type': 'application/json'
+                },
+                timeout=self.timeout,
+                limits=self.limits
+            )
+            self._rest_clients[loop] = client
+            logger.debug(f"创建Supabase连接池 (HTTP/2: {HTTP2_AVAILABLE})")
+        return client
+    
+    def _table(self, name: str):
+        return self._rest().from_(name)
+    
+    async def _execute(self, query):
+        return await query.execute()
+    
+    async def _keyset_page(self, table: str, columns: str, user_id: str, limit: int,
+                           cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        按 (created_at, id) 倒序的键集分页，走 (user_id, created_at DESC, id DESC) 复合索引，
+        翻到多深都只读一页的数据
+        
+        Returns:
+            (当前页, 下一页游标)，没有更多数据时游标为None
+        """
+        query = (
+            self._table(table)
+            .select(columns)
+            .eq('user_id', user_id)
+        )
+        # postgrest 0.13 没有 or_()，排序也只支持单列，这两个查询参数直接拼
+        if cursor:
+            created_at, row_id = decode_keyset_cursor(cursor)
+            query.params = query.params.add(
+                'or', f'(created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id}))'
+            )
+        query.params = query.params.add('order', 'created_at.desc,id.desc')
+        
+        # 多取一行判断是否还有下一页
+        result = await self._execute(query.limit(limit + 1))
+        rows = result.data or []
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_keyset_cursor(rows[-1])
+        return rows, None
+    
     # 用户管理
     async def create_user(self, user_data: Dict[str, Any]) -> Optional[Dict]:
         """创建新用户"""
-        if not self.client:
+        if not self.enabled:
             logger.warning("Supabase client not initialized, cannot create user")
             return None
             
         try:
-            result = self.client.table('users').insert(user_data).execute()
+            result = await self._execute(self._table('users').insert(user_data))
             if result.data:
                 logger.info(f"User created successfully: {user_data.get('email')}")
                 return result.data[0]
@@ -41,12 +170,12 @@ class SupabaseClient:
     
     async def get_user_by_email(self, email: str) -> Optional[Dict]:
         """通过邮箱获取用户"""
-        if not self.client:
+        if not self.enabled:
             logger.warning("Supabase client not initialized, cannot get user")
             return None
             
         try:
-            result = self.client.table('users').select('*').eq('email', email).execute()
+            result = await self._execute(self._table('users').select('*').eq('email', email))
             if result.data:
                 return result.data[0]
             return None
@@ -57,7 +186,7 @@ class SupabaseClient:
     async def get_user_by_google_id(self, google_id: str) -> Optional[Dict]:
         """通过Google ID获取用户"""
         try:
-            result = self.client.table('users').select('*').eq('google_id', google_id).execute()
+            result = await self._execute(self._table('users').select('*').eq('google_id', google_id))
             if result.data:
                 return result.data[0]
             return None
@@ -65,10 +194,21 @@ class SupabaseClient:
             logger.error(f"Error getting user by Google ID: {e}")
             return None
     
+    async def get_user_by_verification_token(self, token: str) -> Optional[Dict]:
+        """通过验证/重置token获取用户"""
+        try:
+            result = await self._execute(self._table('users').select('*').eq('verification_token', token))
+            if result.data:
+                return result.data[0]
+            return None
+        except Exception as e:
+            logger.error(f"Error getting user by verification token: {e}")
+            return None
+    
     async def update_user(self, user_id: str, update_data: Dict[str, Any]) -> Optional[Dict]:
         """更新用户信息"""
         try:
-            result = self.client.table('users').update(update_data).eq('id', user_id).execute()
+            result = await self._execute(self._table('users').update(update_data).eq('id', user_id))
             if result.data:
                 logger.info(f"User updated successfully: {user_id}")
                 return result.data[0]
@@ -80,9 +220,9 @@ class SupabaseClient:
     async def update_last_login(self, user_id: str) -> bool:
         """更新用户最后登录时间"""
         try:
-            result = self.client.table('users').update({
+            result = await self._execute(self._table('users').update({
                 'last_login': 'NOW()'
-            }).eq('id', user_id).execute()
+            }).eq('id', user_id))
             return bool(result.data)
         except Exception as e:
             logger.error(f"Error updating last login: {e}")
@@ -101,7 +241,7 @@ class SupabaseClient:
                 'results_data': search_data.get('results_data')
             }
             
-            result = self.client.table('search_history').insert(search_record).execute()
+            result = await self._execute(self._table('search_history').insert(search_record))
             if result.data:
                 logger.info(f"Search history saved for user: {user_id}")
                 return result.data[0]
@@ -110,51 +250,98 @@ class SupabaseClient:
             logger.error(f"Error saving search history: {e}")
             return None
     
-    async def get_user_search_history(self, user_id: str, limit: int = 50) -> List[Dict]:
-        """获取用户搜索历史"""
+    async def save_search_history_batch(self, search_records: List[Dict[str, Any]]) -> bool:
+        """批量保存搜索历史（一次多行插入，不回传写入的行）"""
+        if not search_records:
+            return True
         try:
-            result = self.client.table('search_history') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .order('created_at', desc=True) \
-                .limit(limit) \
-                .execute()
-            
-            return result.data if result.data else []
+            await self._execute(
+                self._table('search_history').insert(search_records, returning=ReturnMethod.minimal)
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error saving search history batch: {e}")
+            return False
+    
+    async def get_user_search_history(self, user_id: str, limit: int = 50,
+                                      cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """获取用户搜索历史（列表字段，不含结果快照），返回 (当前页, 下一页游标)"""
+        try:
+            return await self._keyset_page('search_history', SEARCH_HISTORY_LIST_COLUMNS, user_id, limit, cursor)
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error getting search history: {e}")
-            return []
+            return [], None
     
-    # 收藏管理
-    async def add_favorite_creator(self, user_id: str, creator_data: Dict[str, Any]) -> Optional[Dict]:
-        """添加收藏的创作者"""
+    async def get_search_history_entry(self, user_id: str, history_id: str) -> Optional[Dict]:
+        """获取单条搜索历史的完整记录（含结果快照）"""
         try:
-            favorite_record = {
-                'user_id': user_id,
-                'creator_unique_id': creator_data.get('unique_id'),
-                'creator_nickname': creator_data.get('nickname'),
-                'creator_data': creator_data,
-                'notes': creator_data.get('notes', ''),
-                'tags': creator_data.get('tags', [])
-            }
-            
-            result = self.client.table('favorite_creators').insert(favorite_record).execute()
+            result = await self._execute(
+                self._table('search_history')
+                .select('*')
+                .eq('user_id', user_id)
+                .eq('id', history_id)
+            )
             if result.data:
-                logger.info(f"Creator favorited: {creator_data.get('unique_id')} by user: {user_id}")
                 return result.data[0]
             return None
         except Exception as e:
-            logger.error(f"Error adding favorite creator: {e}")
+            logger.error(f"Error getting search history entry: {e}")
+            return None
+    
+    # 收藏管理
+    @staticmethod
+    def _favorite_record(creator_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'creator_unique_id': creator_data.get('unique_id'),
+            'creator_nickname': creator_data.get('nickname'),
+            'creator_data': creator_data,
+            'notes': creator_data.get('notes', ''),
+            'tags': creator_data.get('tags', [])
+        }
+    
+    async def add_favorite_creator(self, user_id: str, creator_data: Dict[str, Any]) -> Optional[Dict]:
+        """添加收藏的创作者（已收藏时更新快照并返回原有记录）"""
+        result = await self.upsert_favorite_creator(user_id, creator_data)
+        return result[0] if result else None
+    
+    async def upsert_favorite_creator(self, user_id: str, creator_data: Dict[str, Any]) -> Optional[Tuple[Dict, bool]]:
+        """幂等收藏单个创作者，返回 (收藏记录, 是否新收藏)"""
+        rows = await self.upsert_favorite_creators(user_id, [creator_data])
+        if not rows:
+            return None
+        row = rows[0]
+        return row, row.pop('created')
+    
+    async def upsert_favorite_creators(self, user_id: str, creators: List[Dict[str, Any]]) -> Optional[List[Dict]]:
+        """
+        批量幂等收藏（数据库函数 upsert_favorite_creators，一条语句）
+        
+        已收藏的创作者只更新快照，不改用户备注和标签。每行带 created 字段表示是否新收藏
+        """
+        try:
+            result = await self._execute(self._rest().rpc('upsert_favorite_creators', {
+                'p_user_id': user_id,
+                'p_favorites': [self._favorite_record(creator) for creator in creators]
+            }))
+            rows = result.data or []
+            created = sum(1 for row in rows if row['created'])
+            logger.info(f"Creators favorited: {created} new, {len(rows) - created} existing, by user: {user_id}")
+            return rows
+        except Exception as e:
+            logger.error(f"Error upserting favorite creators: {e}")
             return None
     
     async def remove_favorite_creator(self, user_id: str, creator_unique_id: str) -> bool:
         """移除收藏的创作者"""
         try:
-            result = self.client.table('favorite_creators') \
-                .delete() \
-                .eq('user_id', user_id) \
-                .eq('creator_unique_id', creator_unique_id) \
-                .execute()
+            result = await self._execute(
+                self._table('favorite_creators')
+                .delete()
+                .eq('user_id', user_id)
+                .eq('creator_unique_id', creator_unique_id)
+            )
             
             logger.info(f"Creator unfavorited: {creator_unique_id} by user: {user_id}")
             return True
@@ -162,28 +349,59 @@ class SupabaseClient:
             logger.error(f"Error removing favorite creator: {e}")
             return False
     
-    async def get_user_favorites(self, user_id: str) -> List[Dict]:
-        """获取用户收藏的创作者"""
+    async def remove_favorite_creators(self, user_id: str, creator_unique_ids: List[str]) -> Optional[List[str]]:
+        """批量取消收藏（一条 DELETE），返回实际删除的创作者ID"""
         try:
-            result = self.client.table('favorite_creators') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .order('created_at', desc=True) \
-                .execute()
+            result = await self._execute(
+                self._table('favorite_creators')
+                .delete()
+                .eq('user_id', user_id)
+                .in_('creator_unique_id', creator_unique_ids)
+            )
             
-            return result.data if result.data else []
+            removed = [row['creator_unique_id'] for row in result.data or []]
+            logger.info(f"Creators unfavorited: {len(removed)} by user: {user_id}")
+            return removed
+        except Exception as e:
+            logger.error(f"Error removing favorite creators: {e}")
+            return None
+    
+    async def get_user_favorites(self, user_id: str, limit: int = 50,
+                                 cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """获取用户收藏的创作者（列表字段，不含创作者快照），返回 (当前页, 下一页游标)"""
+        try:
+            return await self._keyset_page('favorite_creators', FAVORITE_LIST_COLUMNS, user_id, limit, cursor)
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Error getting user favorites: {e}")
-            return []
+            return [], None
+    
+    async def get_favorite_creator(self, user_id: str, creator_unique_id: str) -> Optional[Dict]:
+        """获取单个收藏的完整记录（含创作者快照）"""
+        try:
+            result = await self._execute(
+                self._table('favorite_creators')
+                .select('*')
+                .eq('user_id', user_id)
+                .eq('creator_unique_id', creator_unique_id)
+            )
+            if result.data:
+                return result.data[0]
+            return None
+        except Exception as e:
+            logger.error(f"Error getting favorite creator: {e}")
+            return None
     
     async def is_creator_favorited(self, user_id: str, creator_unique_id: str) -> bool:
         """检查创作者是否已被收藏"""
         try:
-            result = self.client.table('favorite_creators') \
-                .select('id') \
-                .eq('user_id', user_id) \
-                .eq('creator_unique_id', creator_unique_id) \
-                .execute()
+            result = await self._execute(
+                self._table('favorite_creators')
+                .select('id')
+                .eq('user_id', user_id)
+                .eq('creator_unique_id', creator_unique_id)
+            )
             
             return bool(result.data)
         except Exception as e:
@@ -193,45 +411,126 @@ class SupabaseClient:
     # API使用统计
     async def log_api_usage(self, user_id: str, endpoint: str, method: str, 
                            response_status: int, response_time_ms: int, 
-                           ip_address: str = None) -> bool:
+                           ip_address: str = None, route: str = None) -> bool:
         """记录API使用"""
         try:
             usage_record = {
                 'user_id': user_id,
                 'endpoint': endpoint,
+                'route': route,
                 'method': method,
                 'response_status': response_status,
                 'response_time_ms': response_time_ms,
                 'ip_address': ip_address
             }
             
-            result = self.client.table('api_usage_logs').insert(usage_record).execute()
+            await self._execute(
+                self._table('api_usage_logs').insert(usage_record, returning=ReturnMethod.minimal)
+            )
             
             # 更新用户的API使用计数
             await self.increment_user_api_usage(user_id)
             
-            return bool(result.data)
+            return True
         except Exception as e:
             logger.error(f"Error logging API usage: {e}")
             return False
     
-    async def increment_user_api_usage(self, user_id: str) -> bool:
-        """增加用户API使用计数"""
+    async def log_api_usage_batch(self, usage_records: List[Dict[str, Any]]) -> bool:
+        """
+        批量记录API使用（一次多行插入，不回传写入的行）
+        
+        api_usage_logs 上的语句级触发器会在同一个事务里把这批记录累加到小时 / 天汇总表
+        """
+        if not usage_records:
+            return True
         try:
-            # 获取当前计数
-            user = await self.get_user_by_id(user_id)
-            if user:
-                new_count = user.get('api_usage_count', 0) + 1
-                await self.update_user(user_id, {'api_usage_count': new_count})
+            await self._execute(
+                self._table('api_usage_logs').insert(usage_records, returning=ReturnMethod.minimal)
+            )
             return True
         except Exception as e:
-            logger.error(f"Error incrementing API usage: {e}")
+            logger.error(f"Error logging API usage batch: {e}")
             return False
     
+    async def get_api_usage_summary(self, user_id: str, since: str, until: str = None) -> Optional[List[Dict]]:
+        """
+        用户在一段时间内按接口汇总的使用情况（读天汇总，不扫原始日志）
+        
+        Args:
+            since / until: UTC 日期 (YYYY-MM-DD)，until 不传表示到今天
+        
+        Returns:
+            每个接口一行，endpoint 为 None 的一行是合计；出错时返回None
+        """
+        try:
+            result = await self._execute(self._rest().rpc('api_usage_summary', {
+                'p_user_id': user_id,
+                'p_since': since,
+                'p_until': until
+            }))
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error getting API usage summary: {e}")
+            return None
+    
+    async def get_api_usage_series(self, user_id: str, since: str, granularity: str = 'day',
+                                   endpoint: str = None) -> Optional[List[Dict]]:
+        """
+        用户的使用曲线（按小时或按天，每个接口每个时间段一行）
+        
+        Args:
+            since: 起始时间，按小时时为 ISO 时间，按天时为 UTC 日期
+            granularity: 'hour' 或 'day'
+        """
+        view, bucket = (
+            ('api_usage_hourly_stats', 'bucket_start') if granularity == 'hour'
+            else ('api_usage_daily_stats', 'bucket_date')
+        )
+        try:
+            query = (
+                self._table(view)
+                .select('*')
+                .eq('user_id', user_id)
+                .gte(bucket, since)
+            )
+            if endpoint:
+                query = query.eq('endpoint', endpoint)
+            result = await self._execute(query.order(bucket))
+            return result.data or []
+        except Exception as e:
+            logger.error(f"Error getting API usage series: {e}")
+            return None
+    
+    async def increment_user_api_usage(self, user_id: str, amount: int = 1) -> bool:
+        """增加用户API使用计数"""
+        return await self.increment_and_check_api_usage(user_id, amount) is not None
+    
+    async def increment_and_check_api_usage(self, user_id: str, amount: int = 1) -> Optional[Dict[str, Any]]:
+        """原子地增加API使用计数（数据库函数 increment_api_usage），一次调用返回新计数和是否超限"""
+        try:
+            result = await self._execute(self._rest().rpc('increment_api_usage', {
+                'p_user_id': user_id,
+                'p_amount': amount
+            }))
+            if not result.data:
+                return None
+            
+            row = result.data[0]
+            return {
+                'allowed': not row['exceeded'],
+                'usage_count': row['usage_count'],
+                'usage_limit': row['usage_limit'],
+                'remaining': max(0, row['usage_limit'] - row['usage_count'])
+            }
+        except Exception as e:
+            logger.error(f"Error incrementing API usage: {e}")
+            return None
+    
     async def get_user_by_id(self, user_id: str) -> Optional[Dict]:
         """通过ID获取用户"""
         try:
-            result = self.client.table('users').select('*').eq('id', user_id).execute()
+            result = await self._execute(self._table('users').select('*').eq('id', user_id))
             if result.data:
                 return result.data[0]
             return None
@@ -242,9 +541,15 @@ class SupabaseClient:
     async def check_api_usage_limit(self, user_id: str) -> Dict[str, Any]:
         """检查用户API使用限制"""
         try:
-            user = await self.get_user_by_id(user_id)
-            if not user:
+            # 只取需要的两列，不拉整行
+            result = await self._execute(
+                self._table('users')
+                .select('api_usage_count, api_usage_limit')
+                .eq('id', user_id)
+            )
+            if not result.data:
                 return {'allowed': False, 'reason': 'User not found'}
+            user = result.data[0]
             
             usage_count = user.get('api_usage_count', 0)
             usage_limit = user.get('api_usage_limit', 100)
@@ -271,7 +576,7 @@ class SupabaseClient:
     async def log_email_sent(self, email_data: Dict[str, Any]) -> Optional[Dict]:
         """记录邮件发送"""
         try:
-            result = self.client.table('email_logs').insert(email_data).execute()
+            result = await self._execute(self._table('email_logs').insert(email_data))
             if result.data:
                 return result.data[0]
             return None
@@ -0,0 +1,97 @@
+"""
+TikHub 异步传输层
+基于 httpx 的连接池 + keep-alive，可用时启用 HTTP/2，
+避免每次请求都重新进行 TCP/TLS 握手
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import weakref
+from typing import Dict, Optional
+
+import httpx
+
+try:
+    from .rate_limiter import RateLimitExceeded, TokenBucket
+except ImportError:
+    from rate_limiter import RateLimitExceeded, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# 安装了 h2 才能启用 HTTP/2，否则退回 HTTP/1.1 keep-alive
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+class AsyncTikHubTransport:
+    """带连接池的异步HTTP传输"""
+
+    def __init__(self, headers: Dict[str, str], timeout: float = 30,
+                 max_connections: int = None, max_keepalive: int = None,
+                 rate_limiter: TokenBucket = None):
+        self.headers = headers
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        # 限流器透支已达上限时最多退避等待的秒数，超出后本次请求直接失败
+        self.rate_limit_wait = float(os.getenv('TIKHUB_RATE_LIMIT_WAIT', '10'))
+        self.limits = httpx.Limits(
+            max_connections=max_connections or int(os.getenv('TIKHUB_MAX_CONNECTIONS', '50')),
+            max_keepalive_connections=max_keepalive or int(os.getenv('TIKHUB_MAX_KEEPALIVE', '20')),
+            keepalive_expiry=60
+        )
+        # httpx.AsyncClient 绑定在创建它的事件循环上，每个循环各持有一个连接池
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=HTTP2_AVAILABLE
+            )
+            self._clients[loop] = client
+            logger.debug(f"创建TikHub连接池 (HTTP/2: {HTTP2_AVAILABLE})")
+        return client
+
+    async def get_json(self, url: str, params: Dict = None, max_retries: int = 3) -> Optional[Dict]:
+        """发送GET请求并解析JSON，带重试机制"""
+        client = self._get_client()
+
+        for attempt in range(max_retries):
+            # 每次尝试（包括重试）都消耗一个令牌
+            if self.rate_limiter is not None:
+                try:
+                    await self.rate_limiter.acquire_async(self.rate_limit_wait)
+                except RateLimitExceeded as e:
+                    # 本地排队已满，重试只会继续排队
+                    logger.warning(f"TikHub请求排队过多，放弃请求: {e}")
+                    return None
+
+            try:
+                response = await client.get(url, params=params)
+                logger.debug(f"请求URL: {response.url}")
+                logger.debug(f"响应状态: {response.status_code}")
+
+                if response.status_code == 200:
+                    return response.json()
+
+                logger.warning(f"请求失败 (尝试 {attempt + 1}/{max_retries}): {response.status_code} - {response.text[:100]}...")
+
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"请求异常 (尝试 {attempt + 1}/{max_retries}): {e}")
+
+            if attempt < max_retries - 1:
+                await asyncio.sleep(2 ** attempt)  # 指数退避
+
+        logger.error(f"所有重试尝试失败，URL: {url}")
+        return None
+
+    async def aclose(self):
+        """关闭当前事件循环上的连接池"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
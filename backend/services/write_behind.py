@@ -0,0 +1,349 @@
+"""
+后台批量写入 (write-behind)
+请求线程只把记录放进进程内队列，后台线程每攒够 N 条或每隔 M 毫秒批量写一次数据库，
+进程退出时把剩余记录写完
+
+gunicorn 下由 worker_exit 钩子调用 close_all()，这时常驻事件循环和它的线程池都还在运行；
+其他情况由 atexit 收尾，那时线程池已经关闭，先让常驻循环改为直接执行阻塞调用再写入
+"""
+
+import asyncio
+import atexit
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+try:
+    from .async_runtime import run_sync, use_inline_executor
+    from .jsonl_journal import JsonlJournal
+    from .supabase_client import db_client
+except ImportError:
+    from async_runtime import run_sync, use_inline_executor
+    from jsonl_journal import JsonlJournal
+    from supabase_client import db_client
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+# 当前进程里的全部写入器，退出时逐个收尾
+_writers: "weakref.WeakSet[BatchWriter]" = weakref.WeakSet()
+
+
+class BatchWriter(ABC):
+    """批量写入器基类，子类实现 write_batch()"""
+
+    def __init__(self, name: str, batch_size: int = 200, flush_interval: float = 1.0, max_queue: int = 10000):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+        _writers.add(self)
+
+    def _ensure_started(self):
+        # 后台线程延迟到第一次提交时启动；fork 出的 worker 进程要各自启动一个
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                thread = threading.Thread(target=self._run, name=f"{self.name}-writer", daemon=True)
+                try:
+                    thread.start()
+                except RuntimeError:
+                    # 解释器正在退出，记录留在队列里由 close() 写完
+                    return
+                self._thread = thread
+                self._pid = os.getpid()
+
+    def submit(self, item: Any) -> bool:
+        """提交一条记录，不阻塞；队列满时丢弃并计数"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return self._on_queue_full(item)
+
+    def _on_queue_full(self, item: Any) -> bool:
+        self.dropped += 1
+        return False
+
+    def _run(self):
+        while True:
+            batch = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            if batch:
+                self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: List[Any]):
+        try:
+            self.write_batch(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"{self.name} 批量写入失败 ({len(batch)} 条): {e}")
+
+    @abstractmethod
+    def write_batch(self, batch: List[Any]):
+        """写入一批记录，失败时抛出异常"""
+
+    def close(self, timeout: float = 10):
+        """停止后台线程，并在当前线程里写完队列中剩余的记录"""
+        thread = self._thread
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                logger.warning(f"{self.name} 队列已满，后台线程未能及时停止")
+            if thread.is_alive():
+                logger.warning(f"{self.name} 后台线程未能在 {timeout} 秒内停止")
+                return
+        self._drain()
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+class UsageLogWriter(BatchWriter):
+    """API使用日志：多行插入 api_usage_logs（数据库触发器同时累加汇总表）；使用计数由计量接口在请求时原子增加"""
+
+    def __init__(self, batch_size: int = 200, flush_interval: float = 1.0):
+        super().__init__("usage-log", batch_size=batch_size, flush_interval=flush_interval)
+
+    def log(self, user_id: str, endpoint: str, method: str, response_status: int,
+            response_time_ms: int, ip_address: str = None, route: str = None) -> bool:
+        return self.submit({
+            'user_id': user_id,
+            'endpoint': endpoint,
+            'route': route,
+            'method': method,
+            'response_status': response_status,
+            'response_time_ms': response_time_ms,
+            'ip_address': ip_address
+        })
+
+    def write_batch(self, batch: List[Dict]):
+        # 没写进去时整批记为失败
+        if not run_sync(db_client.log_api_usage_batch(batch)):
+            raise RuntimeError("api_usage_logs 插入失败")
+
+
+class SearchHistoryWriter(BatchWriter):
+    """
+    搜索历史：多行插入 search_history，快照只保存 unique_id 列表和结果集引用
+
+    数据库写入失败、超时或队列已满时，记录先写到本地 spool 文件（有大小上限），
+    之后某一批写入成功时再补写。每个进程写自己的 spool 文件，
+    已退出进程留下的 spool 由其他进程接手补写
+    """
+
+    def __init__(self, spool_path: str, spool_max_bytes: int = 16 * 1024 * 1024,
+                 batch_size: int = 100, flush_interval: float = 2.0, write_timeout: float = 5.0,
+                 max_queue: int = 2000):
+        """
+        Args:
+            spool_path: spool 文件路径模板，实际文件为 <名称>.<pid>.jsonl
+            spool_max_bytes: 每个进程 spool 文件的大小上限，超出后丢弃新记录
+            write_timeout: 单次批量写入的超时秒数，超时视为数据库变慢，转存到 spool
+        """
+        super().__init__("search-history", batch_size=batch_size, flush_interval=flush_interval, max_queue=max_queue)
+        self.spool_path = spool_path
+        self.spool_max_bytes = spool_max_bytes
+        self.write_timeout = write_timeout
+
+        self._spool_lock = threading.Lock()
+        self._spool: Optional[JsonlJournal] = None
+        self._spool_pid: Optional[int] = None
+
+        self.spooled = 0
+        self.replayed = 0
+
+    @staticmethod
+    def compact_snapshot(creators: List[Dict], result_set_id: str = None) -> Dict[str, Any]:
+        """结果快照：只保留 unique_id，完整数据通过结果集引用获取"""
+        return {
+            'unique_ids': [creator['unique_id'] for creator in creators],
+            'result_set_id': result_set_id
+        }
+
+    def record(self, user_id: str, query: str, filters: Dict[str, Any], creators: List[Dict],
+               result_set_id: str = None, search_type: str = 'creators') -> bool:
+        return self.submit({
+            'user_id': user_id,
+            'search_query': query,
+            'search_type': search_type,
+            'filters': filters,
+            'results_count': len(creators),
+            'results_data': self.compact_snapshot(creators, result_set_id)
+        })
+
+    def _on_queue_full(self, item: Dict) -> bool:
+        # 队列满说明数据库跟不上，先落到 spool 而不是丢弃
+        return self._to_spool([item])
+
+    def _spool_file(self, pid: int) -> str:
+        base, ext = os.path.splitext(self.spool_path)
+        return f"{base}.{pid}{ext or '.jsonl'}"
+
+    def _own_spool(self) -> JsonlJournal:
+        """当前进程的 spool（调用方持有 _spool_lock）"""
+        if self._spool is None or self._spool_pid != os.getpid():
+            self._spool_pid = os.getpid()
+            self._spool = JsonlJournal(self._spool_file(self._spool_pid), fsync_every=self.batch_size, max_bytes=0)
+        return self._spool
+
+    def _to_spool(self, records: List[Dict]) -> bool:
+        with self._spool_lock:
+            spool = self._own_spool()
+            if os.path.exists(spool.path) and os.path.getsize(spool.path) >= self.spool_max_bytes:
+                self.dropped += len(records)
+                logger.warning(f"{self.name} spool 已满，丢弃 {len(records)} 条记录")
+                return False
+            spool.extend(records)
+            self.spooled += len(records)
+        return True
+
+    async def _insert(self, records: List[Dict]) -> bool:
+        try:
+            return await asyncio.wait_for(db_client.save_search_history_batch(records), self.write_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name} 写入超时 ({len(records)} 条)")
+            return False
+
+    def write_batch(self, batch: List[Dict]):
+        if not run_sync(self._insert(batch)):
+            self._to_spool(batch)
+            raise RuntimeError("数据库写入失败，已转存到 spool")
+        self._replay_spools()
+
+    def _claim_spools(self) -> List[Dict]:
+        """取出本进程和已退出进程的 spool 记录，并删除这些文件"""
+        records = []
+        with self._spool_lock:
+            own = self._own_spool()
+            if own.segments():
+                records.extend(own)
+                own.remove()
+
+        base, ext = os.path.splitext(self.spool_path)
+        for path in glob.glob(glob.escape(base) + ".*" + (ext or '.jsonl')):
+            pid = path[len(base) + 1:len(path) - len(ext or '.jsonl')]
+            if not pid.isdigit() or int(pid) == os.getpid() or _process_alive(int(pid)):
+                continue
+            try:
+                # 先改名认领，避免多个进程重复补写
+                claimed = f"{path}.claimed.{os.getpid()}"
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            journal = JsonlJournal(claimed, max_bytes=0)
+            records.extend(journal)
+            journal.remove()
+        return records
+
+    def _replay_spools(self):
+        """数据库恢复后补写 spool 中的记录"""
+        records = self._claim_spools()
+        if not records:
+            return
+
+        for i in range(0, len(records), self.batch_size):
+            chunk = records[i:i + self.batch_size]
+            if not run_sync(self._insert(chunk)):
+                self._to_spool(records[i:])
+                return
+            self.replayed += len(chunk)
+        logger.info(f"{self.name} 已补写 spool 中的 {len(records)} 条记录")
+
+    def close(self, timeout: float = 10):
+        super().close(timeout)
+        with self._spool_lock:
+            if self._spool is not None and self._spool_pid == os.getpid():
+                self._spool.close()
+
+    def stats(self) -> Dict[str, int]:
+        return dict(super().stats(), spooled=self.spooled, replayed=self.replayed)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def close_all(timeout: float = 10):
+    """写完当前进程所有写入器队列中的记录（gunicorn worker_exit 钩子调用）"""
+    for writer in list(_writers):
+        try:
+            writer.close(timeout)
+        except Exception as e:
+            logger.error(f"{writer.name} 退出时写入失败: {e}")
+
+
+def _close_at_exit():
+    use_inline_executor()
+    close_all()
+
+
+atexit.register(_close_at_exit)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+检查后台批量写入器在进程退出时写完队列：
+子进程提交几条使用日志后立即退出，确认这些记录都传给了 log_api_usage_batch；
+另外确认插入失败的一批记为 failed 而不是 written
+"""
+
+import os
+import subprocess
+import sys
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.supabase_client import db_client
+from services.write_behind import UsageLogWriter
+
+CHILD = r'''
+import asyncio
+import socket
+import sys
+
+sys.path.append(sys.argv[1])
+from services.supabase_client import db_client
+from services.write_behind import UsageLogWriter
+
+async def log_api_usage_batch(records):
+    # 和 httpx 解析地址一样经过事件循环的默认线程池
+    await asyncio.get_running_loop().run_in_executor(None, socket.gethostname)
+    with open(sys.argv[3], 'a') as f:
+        f.write(f"{len(records)}\n")
+    return True
+
+db_client.log_api_usage_batch = log_api_usage_batch
+
+# 刷新间隔很长，退出前后台线程不会自己写入
+writer = UsageLogWriter(batch_size=1000, flush_interval=60)
+for i in range(int(sys.argv[2])):
+    writer.log('user-1', '/api/creators/search', 'POST', 200, 12)
+'''
+
+
+def test_flush_on_exit(tmp_path):
+    """子进程退出前提交的记录应当全部写入"""
+    rows = 5
+    written_log = tmp_path / 'written.txt'
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD, os.path.dirname(os.path.abspath(__file__)), str(rows), str(written_log)],
+        capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    assert written_log.exists(), result.stderr
+    assert sum(int(line) for line in written_log.read_text().split()) == rows, result.stderr
+
+
+def test_failed_insert(monkeypatch):
+    """插入失败时记为 failed"""
+    async def log_api_usage_batch(records):
+        return False
+
+    monkeypatch.setattr(db_client, 'log_api_usage_batch', log_api_usage_batch)
+
+    writer = UsageLogWriter(batch_size=10, flush_interval=60)
+    for i in range(3):
+        writer.log('user-1', '/api/creators/search', 'POST', 200, 12)
+    writer.close()
+
+    stats = writer.stats()
+    assert stats['failed'] == 3
+    assert stats['written'] == 0
@@ -0,0 +1,103 @@
+-- 迁移：把已有的非分区 api_usage_logs 改成按天分区的表（新部署直接执行 schema.sql，不需要这个脚本）
+--
+-- 执行前先在 SQL 编辑器里执行 schema.sql 中的这些部分（都不依赖 api_usage_logs 表本身）：
+--   api_usage_hourly / api_usage_daily 两张汇总表及其索引、api_usage_latency_bounds 和 api_usage_histogram* 函数与聚合、
+--   rollup_api_usage_logs / ensure_api_usage_partitions / drop_api_usage_partitions / api_usage_summary 函数、
+--   api_usage_hourly_stats / api_usage_daily_stats 视图
+--
+-- 整个迁移在一个事务里完成：旧表改名为 api_usage_logs_legacy，新建分区表，
+-- 旧记录经父表重新插入，由汇总触发器顺带回填小时 / 天汇总，超出保留期的原始记录随后删除。
+-- 迁移期间旧表只能读不能写，UsageLogWriter 的写入会等到事务提交后进入新表。
+-- 确认数据无误后再手动删除 api_usage_logs_legacy
+
+BEGIN;
+
+LOCK TABLE api_usage_logs IN EXCLUSIVE MODE;
+
+ALTER TABLE api_usage_logs RENAME TO api_usage_logs_legacy;
+-- 索引（含主键）与表同在一个命名空间，改名后新表才能用原来的名字
+ALTER INDEX IF EXISTS api_usage_logs_pkey RENAME TO api_usage_logs_legacy_pkey;
+ALTER INDEX IF EXISTS idx_api_usage_user_id RENAME TO idx_api_usage_legacy_user_id;
+ALTER INDEX IF EXISTS idx_api_usage_created_at RENAME TO idx_api_usage_legacy_created_at;
+ALTER INDEX IF EXISTS idx_api_usage_endpoint RENAME TO idx_api_usage_legacy_endpoint;
+
+-- 与 schema.sql 中的定义一致
+CREATE TABLE api_usage_logs (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    endpoint VARCHAR(255) NOT NULL,
+    route VARCHAR(255),
+    method VARCHAR(10) NOT NULL,
+    response_status INTEGER,
+    response_time_ms INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    ip_address INET,
+
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE api_usage_logs_default PARTITION OF api_usage_logs DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_api_usage_user_created ON api_usage_logs (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_api_usage_endpoint ON api_usage_logs (endpoint);
+
+CREATE TRIGGER rollup_api_usage_logs AFTER INSERT ON api_usage_logs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_api_usage_logs();
+
+-- 保留期内（drop_api_usage_partitions 默认 30 天）有记录的每一天先建好分区，
+-- 再由 ensure_api_usage_partitions 补齐昨天到 7 天后的分区
+DO $$
+DECLARE
+    partition_day DATE;
+    partition_name TEXT;
+BEGIN
+    FOR partition_day IN
+        SELECT DISTINCT (created_at AT TIME ZONE 'UTC')::DATE
+        FROM api_usage_logs_legacy
+        WHERE created_at >= ((NOW() AT TIME ZONE 'UTC')::DATE - 30)::TIMESTAMP AT TIME ZONE 'UTC'
+          AND created_at < ((NOW() AT TIME ZONE 'UTC')::DATE - 1)::TIMESTAMP AT TIME ZONE 'UTC'
+    LOOP
+        partition_name := 'api_usage_logs_' || to_char(partition_day, 'YYYYMMDD');
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF api_usage_logs FOR VALUES FROM (%L) TO (%L)',
+            partition_name,
+            partition_day::TIMESTAMP AT TIME ZONE 'UTC',
+            (partition_day + 1)::TIMESTAMP AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END;
+$$;
+
+SELECT ensure_api_usage_partitions();
+
+-- 一条 INSERT 插入全部旧记录，汇总触发器只聚合一次。
+-- 旧表没有 route 列，汇总按 endpoint 分组；created_at 为空的记录无法分区，不迁移
+INSERT INTO api_usage_logs (id, user_id, endpoint, method, response_status, response_time_ms, created_at, ip_address)
+SELECT id, user_id, endpoint, method, response_status, response_time_ms, created_at, ip_address
+FROM api_usage_logs_legacy
+WHERE created_at IS NOT NULL;
+
+-- 超出保留期的旧记录落在默认分区里，汇总已经回填，按保留策略删掉
+SELECT drop_api_usage_partitions();
+
+COMMIT;
+
+-- 默认分区删除了大量旧记录，之后单独执行（VACUUM 不能和其他语句放在同一次执行里）：
+-- VACUUM ANALYZE api_usage_logs_default;
+
+-- 没有 pg_cron 时由外部定时任务每天调用这两个函数（同 schema.sql）
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'api-usage-partitions',
+            '15 0 * * *',
+            'SELECT ensure_api_usage_partitions(); SELECT drop_api_usage_partitions();'
+        );
+    END IF;
+END;
+$$;
+
+-- 确认无误后：
+-- DROP TABLE api_usage_logs_legacy;
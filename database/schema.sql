@@ -78,23 +78,60 @@ CREATE TABLE user_sessions (
     INDEX idx_user_sessions_token_hash (token_hash)
 );
 
--- API 使用统计表
+-- API 使用统计表（原始日志）
+-- 按 created_at 每天一个分区（UTC），分区由 ensure_api_usage_partitions() 提前创建，
+-- 过期分区由 drop_api_usage_partitions() 整个删除；统计和配额只读下面的汇总表，不扫原始日志
 CREATE TABLE api_usage_logs (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     endpoint VARCHAR(255) NOT NULL,
+    route VARCHAR(255), -- 路由模板（如 /api/creators/favorites/<creator_unique_id>），汇总按它分组
     method VARCHAR(10) NOT NULL,
     response_status INTEGER,
     response_time_ms INTEGER,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     ip_address INET,
     
-    -- 索引
-    INDEX idx_api_usage_user_id (user_id),
-    INDEX idx_api_usage_created_at (created_at),
-    INDEX idx_api_usage_endpoint (endpoint)
+    -- 分区表的主键必须包含分区键
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- 分区还没建好时写入的记录先进默认分区，创建对应分区时会移过去
+CREATE TABLE api_usage_logs_default PARTITION OF api_usage_logs DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_api_usage_user_created ON api_usage_logs (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_api_usage_endpoint ON api_usage_logs (endpoint);
+
+-- API 使用汇总：每用户、每接口每小时 / 每天一行，随原始日志的每次插入增量更新。
+-- 响应时间按固定区间记直方图（api_usage_latency_bounds），直方图可以直接相加，
+-- 所以小时汇总合并成天、多个接口合并成总计时 p50/p95 仍然可以算
+CREATE TABLE api_usage_hourly (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    endpoint VARCHAR(255) NOT NULL,
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    request_count BIGINT NOT NULL DEFAULT 0,
+    error_count BIGINT NOT NULL DEFAULT 0, -- response_status >= 400
+    total_response_time_ms BIGINT NOT NULL DEFAULT 0,
+    latency_histogram BIGINT[] NOT NULL,
+    
+    PRIMARY KEY (user_id, endpoint, bucket_start)
 );
 
+CREATE TABLE api_usage_daily (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    endpoint VARCHAR(255) NOT NULL,
+    bucket_date DATE NOT NULL, -- UTC 日期
+    request_count BIGINT NOT NULL DEFAULT 0,
+    error_count BIGINT NOT NULL DEFAULT 0,
+    total_response_time_ms BIGINT NOT NULL DEFAULT 0,
+    latency_histogram BIGINT[] NOT NULL,
+    
+    PRIMARY KEY (user_id, endpoint, bucket_date)
+);
+
+CREATE INDEX IF NOT EXISTS idx_api_usage_hourly_user_bucket ON api_usage_hourly (user_id, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_api_usage_daily_user_bucket ON api_usage_daily (user_id, bucket_date);
+
 -- 邮箱模板表
 CREATE TABLE email_templates (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -138,6 +175,13 @@ CREATE TABLE system_config (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- 搜索历史 / 收藏列表的键集分页：按 (created_at, id) 倒序翻页，
+-- 复合索引让每一页都是一次索引范围扫描，不需要 OFFSET
+CREATE INDEX IF NOT EXISTS idx_search_history_user_created_id
+    ON search_history (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_favorite_creators_user_created_id
+    ON favorite_creators (user_id, created_at DESC, id DESC);
+
 -- 创建更新时间触发器函数
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -147,6 +191,277 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- API使用计数：一条UPDATE原子地检查额度并增加计数，返回计数和是否超限
+-- （代替先查询再写回的读-改-写，并发请求不会丢失更新）；
+-- 额度不够时不增加计数，只返回当前计数和 exceeded = TRUE，被拒绝的调用不会继续抬高计数
+CREATE OR REPLACE FUNCTION increment_api_usage(p_user_id UUID, p_amount INTEGER DEFAULT 1)
+RETURNS TABLE (usage_count INTEGER, usage_limit INTEGER, exceeded BOOLEAN) AS $$
+    WITH charged AS (
+        UPDATE users
+        SET api_usage_count = COALESCE(api_usage_count, 0) + p_amount
+        WHERE id = p_user_id
+          AND COALESCE(api_usage_count, 0) + p_amount <= COALESCE(api_usage_limit, 100)
+        RETURNING api_usage_count, COALESCE(api_usage_limit, 100) AS usage_limit
+    )
+    SELECT api_usage_count, usage_limit, FALSE FROM charged
+    UNION ALL
+    SELECT COALESCE(api_usage_count, 0), COALESCE(api_usage_limit, 100), TRUE
+    FROM users
+    WHERE id = p_user_id AND NOT EXISTS (SELECT 1 FROM charged);
+$$ language 'sql';
+
+-- 收藏创作者（幂等，支持批量）：一条 INSERT ... ON CONFLICT 完成"没有就插入，已收藏就更新快照"，
+-- 保留用户自己的备注和标签；xmax = 0 表示这一行是本次新插入的
+-- （代替先查询再插入，并发收藏同一个创作者不会违反唯一约束）
+CREATE OR REPLACE FUNCTION upsert_favorite_creators(p_user_id UUID, p_favorites JSONB)
+RETURNS TABLE (
+    id UUID,
+    user_id UUID,
+    creator_unique_id VARCHAR(255),
+    creator_nickname VARCHAR(255),
+    creator_data JSONB,
+    notes TEXT,
+    tags VARCHAR(255)[],
+    created_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE,
+    created BOOLEAN
+) AS $$
+    INSERT INTO favorite_creators AS f (user_id, creator_unique_id, creator_nickname, creator_data, notes, tags)
+    SELECT DISTINCT ON (item->>'creator_unique_id')
+        p_user_id,
+        item->>'creator_unique_id',
+        item->>'creator_nickname',
+        item->'creator_data',
+        COALESCE(item->>'notes', ''),
+        ARRAY(SELECT jsonb_array_elements_text(COALESCE(item->'tags', '[]'::jsonb)))
+    FROM jsonb_array_elements(p_favorites) AS item
+    WHERE item->>'creator_unique_id' IS NOT NULL
+    ON CONFLICT (user_id, creator_unique_id) DO UPDATE
+        SET creator_nickname = EXCLUDED.creator_nickname,
+            creator_data = EXCLUDED.creator_data
+    RETURNING f.id, f.user_id, f.creator_unique_id, f.creator_nickname, f.creator_data,
+              f.notes, f.tags, f.created_at, f.updated_at, f.xmax = 0;
+$$ language 'sql';
+
+-- 响应时间直方图的区间上界（毫秒）。第 i 格统计 [上界[i-1], 上界[i]) 的请求，
+-- 最后一格统计 >= 最后一个上界的请求，共 12 格（修改区间时同步修改 api_usage_histogram 的 INITCOND）
+CREATE OR REPLACE FUNCTION api_usage_latency_bounds()
+RETURNS INTEGER[] AS $$
+    SELECT '{10,25,50,100,250,500,1000,2500,5000,10000,30000}'::INTEGER[];
+$$ language 'sql' IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION api_usage_histogram_add(p_histogram BIGINT[], p_response_time_ms INTEGER)
+RETURNS BIGINT[] AS $$
+DECLARE
+    slot INTEGER := width_bucket(GREATEST(COALESCE(p_response_time_ms, 0), 0), api_usage_latency_bounds()) + 1;
+BEGIN
+    p_histogram[slot] := p_histogram[slot] + 1;
+    RETURN p_histogram;
+END;
+$$ language 'plpgsql' IMMUTABLE;
+
+-- 两个直方图逐格相加
+CREATE OR REPLACE FUNCTION api_usage_histogram_merge(p_left BIGINT[], p_right BIGINT[])
+RETURNS BIGINT[] AS $$
+    SELECT array_agg(COALESCE(l, 0) + COALESCE(r, 0) ORDER BY i)
+    FROM unnest(p_left, p_right) WITH ORDINALITY AS t(l, r, i);
+$$ language 'sql' IMMUTABLE;
+
+-- 聚合函数：api_usage_histogram(response_time_ms) 把一组请求的响应时间记成直方图，
+-- api_usage_histogram_sum(latency_histogram) 把多个直方图合并成一个
+CREATE OR REPLACE AGGREGATE api_usage_histogram(INTEGER) (
+    SFUNC = api_usage_histogram_add,
+    STYPE = BIGINT[],
+    INITCOND = '{0,0,0,0,0,0,0,0,0,0,0,0}'
+);
+
+CREATE OR REPLACE AGGREGATE api_usage_histogram_sum(BIGINT[]) (
+    SFUNC = api_usage_histogram_merge,
+    STYPE = BIGINT[],
+    INITCOND = '{0,0,0,0,0,0,0,0,0,0,0,0}'
+);
+
+-- 直方图分位数：返回累计数量达到该比例的那一格的上界（毫秒），没有请求时返回 NULL
+CREATE OR REPLACE FUNCTION api_usage_histogram_percentile(p_histogram BIGINT[], p_fraction DOUBLE PRECISION)
+RETURNS INTEGER AS $$
+    SELECT (api_usage_latency_bounds())[LEAST(i, array_length(api_usage_latency_bounds(), 1))]
+    FROM (
+        SELECT i, SUM(c) OVER (ORDER BY i) AS running, SUM(c) OVER () AS total
+        FROM unnest(p_histogram) WITH ORDINALITY AS t(c, i)
+    ) s
+    WHERE total > 0 AND running >= p_fraction * total
+    ORDER BY i
+    LIMIT 1;
+$$ language 'sql' IMMUTABLE;
+
+-- 原始日志每次插入（UsageLogWriter 一批一条 INSERT）触发一次，
+-- 把这批记录按用户、接口、小时 / 天聚合后累加到汇总表。
+-- 按主键顺序写入，并发批次更新同一组汇总行时不会互相死锁
+CREATE OR REPLACE FUNCTION rollup_api_usage_logs()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO api_usage_hourly AS h
+        (user_id, endpoint, bucket_start, request_count, error_count, total_response_time_ms, latency_histogram)
+    SELECT user_id,
+           COALESCE(route, endpoint),
+           date_trunc('hour', created_at),
+           COUNT(*),
+           COUNT(*) FILTER (WHERE response_status >= 400),
+           COALESCE(SUM(response_time_ms), 0),
+           api_usage_histogram(response_time_ms)
+    FROM new_rows
+    WHERE user_id IS NOT NULL
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (user_id, endpoint, bucket_start) DO UPDATE
+        SET request_count = h.request_count + EXCLUDED.request_count,
+            error_count = h.error_count + EXCLUDED.error_count,
+            total_response_time_ms = h.total_response_time_ms + EXCLUDED.total_response_time_ms,
+            latency_histogram = api_usage_histogram_merge(h.latency_histogram, EXCLUDED.latency_histogram);
+
+    INSERT INTO api_usage_daily AS d
+        (user_id, endpoint, bucket_date, request_count, error_count, total_response_time_ms, latency_histogram)
+    SELECT user_id,
+           COALESCE(route, endpoint),
+           (created_at AT TIME ZONE 'UTC')::DATE,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE response_status >= 400),
+           COALESCE(SUM(response_time_ms), 0),
+           api_usage_histogram(response_time_ms)
+    FROM new_rows
+    WHERE user_id IS NOT NULL
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (user_id, endpoint, bucket_date) DO UPDATE
+        SET request_count = d.request_count + EXCLUDED.request_count,
+            error_count = d.error_count + EXCLUDED.error_count,
+            total_response_time_ms = d.total_response_time_ms + EXCLUDED.total_response_time_ms,
+            latency_histogram = api_usage_histogram_merge(d.latency_histogram, EXCLUDED.latency_histogram);
+
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- 创建从昨天到 p_days_ahead 天后的每日分区（已存在的跳过），返回新建的分区数。
+-- 默认分区里落在新分区范围内的记录会先移到新分区（这些记录已经计入汇总，移动不会重复统计）。
+-- 移动到挂载期间锁住默认分区，挡住并发写入（只读不受影响）：否则这期间写进默认分区的同一天记录
+-- 会让 ATTACH 校验默认分区时失败。锁持有到事务结束
+CREATE OR REPLACE FUNCTION ensure_api_usage_partitions(p_days_ahead INTEGER DEFAULT 7)
+RETURNS INTEGER AS $$
+DECLARE
+    today DATE := (NOW() AT TIME ZONE 'UTC')::DATE;
+    partition_day DATE;
+    partition_name TEXT;
+    range_start TIMESTAMP WITH TIME ZONE;
+    range_end TIMESTAMP WITH TIME ZONE;
+    created INTEGER := 0;
+BEGIN
+    FOR partition_day IN SELECT generate_series(today - 1, today + p_days_ahead, INTERVAL '1 day')::DATE LOOP
+        partition_name := 'api_usage_logs_' || to_char(partition_day, 'YYYYMMDD');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+
+        range_start := partition_day::TIMESTAMP AT TIME ZONE 'UTC';
+        range_end := (partition_day + 1)::TIMESTAMP AT TIME ZONE 'UTC';
+
+        LOCK TABLE api_usage_logs_default IN EXCLUSIVE MODE;
+        EXECUTE format('CREATE TABLE %I (LIKE api_usage_logs INCLUDING DEFAULTS)', partition_name);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM api_usage_logs_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+            'INSERT INTO %I SELECT * FROM moved',
+            range_start, range_end, partition_name
+        );
+        EXECUTE format(
+            'ALTER TABLE api_usage_logs ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            partition_name, range_start, range_end
+        );
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+-- 保留策略：原始日志整分区删除（DROP 而不是 DELETE，不产生死元组），
+-- 小时汇总和天汇总分别保留更长的时间。返回删除的原始日志分区数
+CREATE OR REPLACE FUNCTION drop_api_usage_partitions(
+    p_keep_days INTEGER DEFAULT 30,
+    p_hourly_keep_days INTEGER DEFAULT 90,
+    p_daily_keep_days INTEGER DEFAULT 730
+)
+RETURNS INTEGER AS $$
+DECLARE
+    today DATE := (NOW() AT TIME ZONE 'UTC')::DATE;
+    cutoff DATE := today - p_keep_days;
+    partition_name TEXT;
+    dropped INTEGER := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'api_usage_logs'::REGCLASS
+          AND c.relname ~ '^api_usage_logs_[0-9]{8}$'
+    LOOP
+        IF to_date(right(partition_name, 8), 'YYYYMMDD') < cutoff THEN
+            EXECUTE format('DROP TABLE %I', partition_name);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+
+    DELETE FROM api_usage_logs_default WHERE created_at < cutoff::TIMESTAMP AT TIME ZONE 'UTC';
+    DELETE FROM api_usage_hourly WHERE bucket_start < (today - p_hourly_keep_days)::TIMESTAMP AT TIME ZONE 'UTC';
+    DELETE FROM api_usage_daily WHERE bucket_date < today - p_daily_keep_days;
+    RETURN dropped;
+END;
+$$ language 'plpgsql';
+
+-- 用户在某段时间内的使用汇总（读天汇总）：每个接口一行，另有一行 endpoint 为 NULL 的合计；
+-- p_until 为 NULL 时统计到今天
+CREATE OR REPLACE FUNCTION api_usage_summary(p_user_id UUID, p_since DATE, p_until DATE DEFAULT NULL)
+RETURNS TABLE (
+    endpoint VARCHAR(255),
+    request_count BIGINT,
+    error_count BIGINT,
+    avg_response_time_ms INTEGER,
+    p50_response_time_ms INTEGER,
+    p95_response_time_ms INTEGER
+) AS $$
+    SELECT d.endpoint,
+           SUM(d.request_count)::BIGINT,
+           SUM(d.error_count)::BIGINT,
+           (SUM(d.total_response_time_ms) / NULLIF(SUM(d.request_count), 0))::INTEGER,
+           api_usage_histogram_percentile(api_usage_histogram_sum(d.latency_histogram), 0.5),
+           api_usage_histogram_percentile(api_usage_histogram_sum(d.latency_histogram), 0.95)
+    FROM api_usage_daily d
+    WHERE d.user_id = p_user_id
+      AND d.bucket_date >= p_since
+      AND (p_until IS NULL OR d.bucket_date <= p_until)
+    GROUP BY GROUPING SETS ((d.endpoint), ())
+    ORDER BY 2 DESC;
+$$ language 'sql' STABLE;
+
+-- 按小时 / 天的使用曲线（仪表盘直接查这两个视图）
+CREATE OR REPLACE VIEW api_usage_hourly_stats AS
+SELECT user_id,
+       endpoint,
+       bucket_start,
+       request_count,
+       error_count,
+       (total_response_time_ms / NULLIF(request_count, 0))::INTEGER AS avg_response_time_ms,
+       api_usage_histogram_percentile(latency_histogram, 0.5) AS p50_response_time_ms,
+       api_usage_histogram_percentile(latency_histogram, 0.95) AS p95_response_time_ms
+FROM api_usage_hourly;
+
+CREATE OR REPLACE VIEW api_usage_daily_stats AS
+SELECT user_id,
+       endpoint,
+       bucket_date,
+       request_count,
+       error_count,
+       (total_response_time_ms / NULLIF(request_count, 0))::INTEGER AS avg_response_time_ms,
+       api_usage_histogram_percentile(latency_histogram, 0.5) AS p50_response_time_ms,
+       api_usage_histogram_percentile(latency_histogram, 0.95) AS p95_response_time_ms
+FROM api_usage_daily;
+
 -- 添加更新时间触发器
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -160,6 +475,26 @@ CREATE TRIGGER update_email_templates_updated_at BEFORE UPDATE ON email_template
 CREATE TRIGGER update_system_config_updated_at BEFORE UPDATE ON system_config
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- 原始日志插入后增量更新汇总（语句级触发器，一批记录只聚合一次）
+CREATE TRIGGER rollup_api_usage_logs AFTER INSERT ON api_usage_logs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_api_usage_logs();
+
+-- 创建初始分区；之后每天由 pg_cron 提前创建分区并删除过期分区（没有 pg_cron 时由外部定时任务调用这两个函数）
+SELECT ensure_api_usage_partitions();
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule(
+            'api-usage-partitions',
+            '15 0 * * *',
+            'SELECT ensure_api_usage_partitions(); SELECT drop_api_usage_partitions();'
+        );
+    END IF;
+END;
+$$;
+
 -- 行级安全策略 (RLS)
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE search_history ENABLE ROW LEVEL SECURITY;
@@ -7,6 +7,16 @@ let itemsPerPage = 10;
 let currentSortField = '';
 let currentSortOrder = 'desc';
 
+// 服务端结果集：有 resultSetId 时排序和分页由后端完成，只保存当前页
+let resultSetId = null;
+let resultTotal = 0;
+let pageResults = [];
+
+// 流式搜索接口和翻页数
+const STREAM_SEARCH_URL = '/api/creators/search/stream';
+const STREAM_SEARCH_PAGES = 3;
+const RESULT_SET_URL = '/api/creators/results';
+
 // 页面加载完成后初始化
 document.addEventListener('DOMContentLoaded', function() {
     // 检查认证状态
@@ -79,12 +89,52 @@ async function performSearch() {
     hideEmptyState();
     hideResultsSection();
 
+    // 优先使用流式API：每页结果到达就逐行渲染
+    searchResults = [];
+    currentPage = 1;
+    currentSortField = '';
+    resultSetId = null;
+    try {
+        const summary = await performStreamingSearch(searchParams);
+        if (summary && summary.result_set_id) {
+            resultSetId = summary.result_set_id;
+            await loadResultPage();
+        }
+        displaySearchResults();
+        if (summary && summary.error) {
+            // 上游失败：和"没有找到创作者"区分开提示
+            const message = summary.error.message || summary.error.error;
+            if (searchResults.length > 0) {
+                showNotification(`${message}，已显示 ${searchResults.length} 个创作者`, 'warning');
+            } else {
+                showNotification(message, 'error');
+            }
+            return;
+        }
+        showNotification(`找到 ${summary ? summary.total : searchResults.length} 个创作者`, 'success');
+        return;
+    } catch (error) {
+        if (error.fatal) {
+            displaySearchResults();
+            showNotification(error.message, 'error');
+            return;
+        }
+        if (searchResults.length > 0) {
+            // 已经收到部分结果，保留并提示
+            displaySearchResults();
+            showNotification(`搜索中断，已显示 ${searchResults.length} 个创作者`, 'warning');
+            return;
+        }
+        console.warn('流式搜索不可用，改用普通搜索:', error);
+    }
+
     try {
         // 调用后端API
         const response = await fetch('/.netlify/functions/creators-search', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                ...authHeaders()
             },
             body: JSON.stringify(searchParams)
         });
@@ -115,6 +165,108 @@ async function performSearch() {
     }
 }
 
+// 流式搜索：逐行读取NDJSON事件，收到创作者就追加并刷新当前页
+async function performStreamingSearch(searchParams) {
+    const [minFollowers, maxFollowers] = parseFollowerRange(searchParams.followerRange);
+
+    const response = await fetch(STREAM_SEARCH_URL, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Accept': 'application/x-ndjson',
+            // 登录用户的流式搜索同样计入使用额度和搜索记录
+            ...authHeaders()
+        },
+        body: JSON.stringify({
+            keyword: searchParams.searchKeyword.trim(),
+            country: searchParams.country || 'US',
+            min_followers: minFollowers,
+            max_followers: maxFollowers,
+            pages: STREAM_SEARCH_PAGES
+        })
+    });
+
+    if (response.status === 429) {
+        // 额度用完或请求过快：直接提示，不再改用其他搜索方式
+        const result = await response.json().catch(() => ({}));
+        const error = new Error(result.message || '请求过于频繁，请稍后再试');
+        error.fatal = true;
+        throw error;
+    }
+
+    if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    // 同一帧内收到的多条结果只渲染一次
+    let renderScheduled = false;
+    const scheduleRender = () => {
+        if (renderScheduled) return;
+        renderScheduled = true;
+        requestAnimationFrame(() => {
+            renderScheduled = false;
+            displaySearchResults();
+        });
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let summary = null;
+    let streamError = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const event = JSON.parse(line);
+            if (event.type === 'error') {
+                // 记下错误继续读，已收到的结果和最后的汇总事件照常处理
+                streamError = event;
+                continue;
+            }
+            summary = handleStreamEvent(event, scheduleRender) || summary;
+        }
+    }
+
+    return streamError ? { ...summary, error: streamError } : summary;
+}
+
+// 处理一条流式事件（error 事件由调用方处理），返回最终的汇总事件
+function handleStreamEvent(event, scheduleRender) {
+    switch (event.type) {
+        case 'creator':
+            searchResults.push(event.data);
+            scheduleRender();
+            break;
+        case 'update': {
+            // 增强数据到达后更新已显示的创作者
+            const creator = searchResults.find(c => c.unique_id === event.unique_id);
+            if (creator) {
+                Object.assign(creator, event.data);
+                scheduleRender();
+            }
+            break;
+        }
+        case 'done':
+            return event;
+    }
+    return null;
+}
+
+// 粉丝数范围 "最小-最大" 转为数字
+function parseFollowerRange(range) {
+    if (!range) return [0, 10000000];
+    const [min, max] = range.split('-').map(Number);
+    return [min || 0, max || 10000000];
+}
+
 // 生成模拟数据
 function generateMockData(params) {
     const mockCreators = [];
@@ -168,17 +320,58 @@ function generateMockData(params) {
     return mockCreators;
 }
 
+// 从服务端结果集取当前页（按当前排序）
+async function loadResultPage() {
+    const params = new URLSearchParams({ page: currentPage, per_page: itemsPerPage });
+    if (currentSortField) {
+        params.set('sort', currentSortField);
+        params.set('order', currentSortOrder);
+    }
+
+    try {
+        const response = await fetch(`${RESULT_SET_URL}/${resultSetId}?${params}`);
+        const result = await response.json();
+        if (!response.ok || !result.success) {
+            const error = new Error(result.message || result.error || `HTTP error! status: ${response.status}`);
+            error.expired = response.status === 404;
+            throw error;
+        }
+        pageResults = result.data;
+        resultTotal = result.total;
+    } catch (error) {
+        // 结果集过期或服务端出错：明确提示用户，再退回到浏览器里已有结果的本地分页
+        console.error('服务端结果集不可用:', error);
+        resultSetId = null;
+        const reason = error.expired ? '搜索结果已过期' : `加载结果失败：${error.message}`;
+        showNotification(`${reason}，当前排序和分页仅基于已加载的 ${searchResults.length} 个创作者，如需完整结果请重新搜索`, 'warning');
+    }
+}
+
+// 当前结果总数
+function getResultCount() {
+    return resultSetId ? resultTotal : searchResults.length;
+}
+
+// 翻页：服务端结果集先取数据再渲染
+async function goToPage(page) {
+    currentPage = page;
+    if (resultSetId) {
+        await loadResultPage();
+    }
+    displaySearchResults();
+}
+
 // 显示搜索结果
 function displaySearchResults() {
     const startIndex = (currentPage - 1) * itemsPerPage;
     const endIndex = startIndex + itemsPerPage;
-    const pageData = searchResults.slice(startIndex, endIndex);
+    const pageData = resultSetId ? pageResults : searchResults.slice(startIndex, endIndex);
 
     const tableBody = document.getElementById('resultsTableBody');
     const countNumber = document.getElementById('countNumber');
 
     // 更新结果数量
-    countNumber.textContent = searchResults.length;
+    countNumber.textContent = getResultCount();
 
     // 清空表格
     tableBody.innerHTML = '';
@@ -355,9 +548,15 @@ function hideModal() {
     }
 }
 
+// 按 unique_id 查找创作者（服务端分页时优先在当前页里找）
+function findCreator(creatorId) {
+    return pageResults.find(c => c.unique_id === creatorId)
+        || searchResults.find(c => c.unique_id === creatorId);
+}
+
 // 查看创作者详情
 function viewCreatorDetails(creatorId) {
-    const creator = searchResults.find(c => c.unique_id === creatorId);
+    const creator = findCreator(creatorId);
     if (!creator) return;
 
     const modalBody = document.getElementById('modalBody');
@@ -462,7 +661,7 @@ function viewCreatorDetails(creatorId) {
 
 // 联系创作者
 function contactCreator(creatorId) {
-    const creator = searchResults.find(c => c.unique_id === creatorId);
+    const creator = findCreator(creatorId);
     if (!creator) return;
 
     // 这里可以打开联系表单或直接发送邮件
@@ -482,7 +681,8 @@ function getLanguageName(code) {
         'pt': '葡萄牙文',
         'ru': '俄文'
     };
-    return languages[code] || code;
+    // 没有识别出语言时为空
+    return languages[code] || code || '未知';
 }
 
 // 初始化分页
@@ -493,18 +693,16 @@ function initializePagination() {
     if (prevBtn) {
         prevBtn.addEventListener('click', function() {
             if (currentPage > 1) {
-                currentPage--;
-                displaySearchResults();
+                goToPage(currentPage - 1);
             }
         });
     }
 
     if (nextBtn) {
         nextBtn.addEventListener('click', function() {
-            const totalPages = Math.ceil(searchResults.length / itemsPerPage);
+            const totalPages = Math.ceil(getResultCount() / itemsPerPage);
             if (currentPage < totalPages) {
-                currentPage++;
-                displaySearchResults();
+                goToPage(currentPage + 1);
             }
         });
     }
@@ -512,7 +710,7 @@ function initializePagination() {
 
 // 更新分页
 function updatePagination() {
-    const totalPages = Math.ceil(searchResults.length / itemsPerPage);
+    const totalPages = Math.ceil(getResultCount() / itemsPerPage);
     const currentPageSpan = document.getElementById('currentPage');
     const totalPagesSpan = document.getElementById('totalPages');
     const prevBtn = document.getElementById('prevBtn');
@@ -665,11 +863,19 @@ function showSortOptions() {
     });
 }
 
-// 排序数据
-function sortData(field) {
+// 排序数据（有服务端结果集时由后端排序，只取第一页）
+async function sortData(field) {
     currentSortField = field;
     currentSortOrder = currentSortOrder === 'asc' ? 'desc' : 'asc';
 
+    if (resultSetId) {
+        await goToPage(1);
+        if (resultSetId) {
+            showNotification(`已按${getSortFieldName(field)}${currentSortOrder === 'asc' ? '升序' : '降序'}排序`, 'success');
+            return;
+        }
+    }
+
     searchResults.sort((a, b) => {
         let aVal = a[field];
         let bVal = b[field];
@@ -938,6 +1144,12 @@ function getAuthToken() {
     return localStorage.getItem('auth_token');
 }
 
+// 已登录时附带的认证头，未登录时为空（搜索接口允许匿名访问）
+function authHeaders() {
+    const token = getAuthToken();
+    return token ? { 'Authorization': `Bearer ${token}` } : {};
+}
+
 // 获取用户数据
 function getUserData() {
     const userData = localStorage.getItem('user_data');
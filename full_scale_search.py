@@ -5,15 +5,21 @@
 支持上千次搜索，去重优化，基于官方配置
 """
 
+import argparse
+import asyncio
 import time
 import json
 import logging
-import math
 import os
 from datetime import datetime
-from typing import Dict, List, Set, Optional
+from typing import Awaitable, Callable, Dict, List, Set, Optional, Tuple
+from async_runtime import run_sync
+from bio_analysis import BioFields, analyze_bios
+from creator_metrics import score_creators
 from comprehensive_search_client import ComprehensiveSearchClient
 from comprehensive_automation import TikTokCreatorAutomation
+from jsonl_journal import JsonlJournal
+from search_checkpoint import SearchCheckpoint
 import pandas as pd
 
 # 配置日志
@@ -23,9 +29,10 @@ logger = logging.getLogger(__name__)
 class FullScaleSearchEngine:
     """全量搜索引擎"""
     
-    def __init__(self):
-        self.client = ComprehensiveSearchClient()
-        self.automation = TikTokCreatorAutomation()
+    def __init__(self, client: ComprehensiveSearchClient = None):
+        # 多关键词调度时多个引擎共享同一个客户端（连接池、限流、缓存）
+        self.client = client or ComprehensiveSearchClient()
+        self._automation: Optional[TikTokCreatorAutomation] = None
         
         # 去重和缓存
         self.seen_creator_ids: Set[str] = set()
@@ -33,18 +40,42 @@ class FullScaleSearchEngine:
         self.collected_creators: List[Dict] = []
         
         # 搜索配置 - 基于官方配置优化
-        self.qps_limit = 10  # 每秒10次请求
-        self.request_interval = 0.1  # 100ms间隔，支持10 QPS
+        # 请求节奏由客户端共享的令牌桶控制（TIKHUB_QPS / TIKHUB_BURST）
+        self.qps_limit = self.client.rate_limiter.qps
         self.max_retries = 3
         self.timeout = 45  # 45秒超时
         
         # 分页搜索配置
         self.max_per_search = 30  # 每次搜索30个，保证稳定性
         self.max_offset = 10000  # 最大偏移量，支持深度搜索
+        self.prefetch_window = int(os.getenv('SEARCH_PREFETCH_WINDOW', '4'))  # 预取后续页数，1表示逐页搜索
+        
+        # 数据增强并发数（总请求速率仍受令牌桶约束）
+        self.enhance_workers = int(os.getenv('ENHANCE_WORKERS', '8'))
+        # 由调度器注入：跨关键词共享的增强并发池，以及按创作者去重的增强结果
+        self.enhance_semaphore: Optional[asyncio.Semaphore] = None
+        self.shared_enhancements: Optional[Dict[str, asyncio.Future]] = None
+        
+        # 中间结果日志：每条记录fsync间隔、单个分段大小上限
+        self.journal_fsync_every = int(os.getenv('INTERMEDIATE_FSYNC_EVERY', '500'))
+        self.journal_max_bytes = int(os.getenv('INTERMEDIATE_MAX_MB', '64')) * 1024 * 1024
+        
+        # 检查点：搜索/增强进度的追加日志，以及从中恢复的状态
+        self.checkpoint: Optional[SearchCheckpoint] = None
+        self.restored_enhancements: Dict[str, Dict] = {}
+        self._resume_position = (0, 0, 0)  # (offset, consecutive_empty, search_count)
+        self._search_done = False
         
         # 文件编号管理
         self.next_file_number = self._get_next_file_number()
     
+    @property
+    def automation(self) -> TikTokCreatorAutomation:
+        """旧版自动化工具，用到时才创建，和引擎共用同一个客户端"""
+        if self._automation is None:
+            self._automation = TikTokCreatorAutomation(client=self.client)
+        return self._automation
+    
     def _get_next_file_number(self) -> int:
         """获取下一个文件编号"""
         if not os.path.exists("output"):
@@ -67,80 +98,156 @@ class FullScaleSearchEngine:
         
         return max(existing_numbers) + 1
         
+    def reset_state(self):
+        """清空上一个关键词的收集结果和恢复状态"""
+        self.seen_creator_ids.clear()
+        self.seen_video_ids.clear()
+        self.collected_creators.clear()
+        self.restored_enhancements = {}
+        self._resume_position = (0, 0, 0)
+        self._search_done = False
+    
+    def restore_from_checkpoint(self, state: Dict):
+        """用检查点回放出的状态恢复引擎，之后的搜索从中断处继续"""
+        self.seen_video_ids = set(state["seen_video_ids"])
+        self.seen_creator_ids = set(state["seen_creator_ids"])
+        self.collected_creators = list(state["collected_creators"])
+        self.restored_enhancements = dict(state["enhanced"])
+        self._resume_position = (state["next_offset"], state["consecutive_empty"], state["search_count"])
+        self._search_done = state["search_done"]
+    
     def full_scale_search(self, keyword: str, target_creators: int = 1000) -> List[Dict]:
+        """全量搜索指定关键词（同步封装，参见 full_scale_search_async）"""
+        return run_sync(self.full_scale_search_async(keyword, target_creators))
+    
+    async def full_scale_search_async(self, keyword: str, target_creators: int = 1000,
+                                      on_new_creators: Callable[[List[Dict]], Awaitable[None]] = None) -> List[Dict]:
         """
         全量搜索指定关键词
         
         Args:
             keyword: 搜索关键词
             target_creators: 目标创作者数量
+            on_new_creators: 每页发现新创作者时的回调（流水线模式用于投递给增强任务）
             
         Returns:
             List[Dict]: 去重后的创作者列表
         """
-        logger.info(f"🚀 开始全量搜索关键词: '{keyword}', 目标: {target_creators} 个创作者")
+        if self._search_done:
+            logger.info(f"♻️ 检查点显示 '{keyword}' 的搜索阶段已完成，直接使用 {len(self.collected_creators)} 个创作者")
+            return self.collected_creators
         
-        all_videos = []
-        search_count = 0
-        offset = 0
-        consecutive_empty = 0
+        offset, consecutive_empty, search_count = self._resume_position
+        if offset:
+            logger.info(f"♻️ 从检查点继续搜索: offset={offset}, 已收集={len(self.collected_creators)}")
+        else:
+            logger.info(f"🚀 开始全量搜索关键词: '{keyword}', 目标: {target_creators} 个创作者")
         
-        while len(self.collected_creators) < target_creators and offset < self.max_offset:
-            search_count += 1
-            
-            logger.info(f"📦 搜索批次 {search_count}, offset={offset}, 已收集={len(self.collected_creators)}")
-            
-            # 执行分页搜索
-            videos = self._paginated_search(keyword, offset=offset, count=self.max_per_search)
-            
-            if not videos:
-                consecutive_empty += 1
-                logger.warning(f"空结果 {consecutive_empty}/3")
+        total_videos = 0
+        
+        # 中间结果：每页只追加新视频和新创作者
+        journal = self._open_intermediate_journal(keyword)
+        
+        # 预取窗口：offset -> 正在进行的分页请求，结果仍按offset顺序处理
+        pending: Dict[int, asyncio.Task] = {}
+        
+        try:
+            while len(self.collected_creators) < target_creators and offset < self.max_offset:
+                search_count += 1
                 
-                if consecutive_empty >= 3:
-                    logger.warning("连续3次空结果，可能已达搜索极限")
-                    break
+                logger.info(f"📦 搜索批次 {search_count}, offset={offset}, 已收集={len(self.collected_creators)}")
+                
+                # 执行分页搜索（同时预取后续几页）
+                self._prefetch_pages(pending, keyword, offset)
+                videos = await pending.pop(offset)
+                
+                if not videos:
+                    consecutive_empty += 1
+                    logger.warning(f"空结果 {consecutive_empty}/3")
                     
-                # 空结果时，跳跃更大的偏移量
-                offset += self.max_per_search * 2
-                continue
-            else:
-                consecutive_empty = 0
+                    if consecutive_empty >= 3:
+                        logger.warning("连续3次空结果，可能已达搜索极限")
+                        break
+                        
+                    # 空结果时，跳跃更大的偏移量
+                    page_offset, offset = offset, offset + self.max_per_search * 2
+                    self._cancel_skipped_pages(pending, offset)
+                    if self.checkpoint:
+                        self.checkpoint.record_page(page_offset, offset, consecutive_empty, search_count, [], [])
+                    continue
+                else:
+                    consecutive_empty = 0
+                    
+                # 去重新视频
+                new_videos = self._deduplicate_videos(videos)
+                total_videos += len(new_videos)
                 
-            # 去重新视频
-            new_videos = self._deduplicate_videos(videos)
-            all_videos.extend(new_videos)
-            
-            logger.info(f"本批次: {len(videos)} 个视频, 去重后: {len(new_videos)} 个新视频")
-            
-            # 提取和去重创作者
-            new_creators = self._extract_and_deduplicate_creators(new_videos)
-            self.collected_creators.extend(new_creators)
-            
-            # 如果超过目标数量，截取前N个（按粉丝数排序）
-            if len(self.collected_creators) > target_creators:
-                logger.info(f"🎯 达到目标数量，截取前 {target_creators} 个创作者")
-                self.collected_creators = sorted(self.collected_creators, 
-                                               key=lambda x: x.get('follower_count', 0), 
-                                               reverse=True)[:target_creators]
-                break
-            
-            logger.info(f"累计视频: {len(all_videos)}, 累计创作者: {len(self.collected_creators)}")
-            
-            # 更新偏移量
-            offset += self.max_per_search
-            
-            # 速率限制
-            time.sleep(self.request_interval)
-            
-            # 每100次搜索保存一次中间结果
-            if search_count % 100 == 0:
-                self._save_intermediate_results(keyword, search_count)
-        
-        logger.info(f"✅ 全量搜索完成: {search_count} 次搜索, {len(all_videos)} 个视频, {len(self.collected_creators)} 个唯一创作者")
+                logger.info(f"本批次: {len(videos)} 个视频, 去重后: {len(new_videos)} 个新视频")
+                
+                # 提取和去重创作者
+                new_creators = self._extract_and_deduplicate_creators(new_videos)
+                self.collected_creators.extend(new_creators)
+                
+                self._journal_page(journal, new_videos, new_creators)
+                
+                if self.checkpoint:
+                    self.checkpoint.record_page(offset, offset + self.max_per_search, consecutive_empty, search_count,
+                                                [video.get("aweme_id", "") for video in new_videos], new_creators)
+                
+                if on_new_creators and new_creators:
+                    await on_new_creators(new_creators)
+                
+                # 如果超过目标数量，截取前N个（按粉丝数排序）
+                if len(self.collected_creators) > target_creators:
+                    logger.info(f"🎯 达到目标数量，截取前 {target_creators} 个创作者")
+                    self.collected_creators = sorted(self.collected_creators, 
+                                                   key=lambda x: x.get('follower_count', 0), 
+                                                   reverse=True)[:target_creators]
+                    break
+                
+                logger.info(f"累计视频: {total_videos}, 累计创作者: {len(self.collected_creators)}")
+                
+                # 更新偏移量
+                offset += self.max_per_search
+                
+                # 每100次搜索确保中间结果落盘一次
+                if search_count % 100 == 0:
+                    journal.sync()
+                    logger.info(f"💾 中间结果已写入: {journal.path} ({len(self.collected_creators)} 个创作者)")
+        finally:
+            journal.close()
+            # 停止时取消不再需要的预取请求
+            self._cancel_skipped_pages(pending, self.max_offset)
+            if pending:
+                await asyncio.gather(*pending.values(), return_exceptions=True)
+        
+        if self.checkpoint:
+            self.checkpoint.record_search_done([self._creator_key(creator) for creator in self.collected_creators])
+        
+        logger.info(f"✅ 全量搜索完成: {search_count} 次搜索, {total_videos} 个视频, {len(self.collected_creators)} 个唯一创作者")
         return self.collected_creators
     
+    def _prefetch_pages(self, pending: Dict[int, asyncio.Task], keyword: str, offset: int):
+        """确保从offset开始的 prefetch_window 页都已发出请求"""
+        for i in range(max(1, self.prefetch_window)):
+            page_offset = offset + i * self.max_per_search
+            if page_offset >= self.max_offset:
+                break
+            if page_offset not in pending:
+                pending[page_offset] = asyncio.create_task(
+                    self._paginated_search_async(keyword, offset=page_offset, count=self.max_per_search)
+                )
+    
+    def _cancel_skipped_pages(self, pending: Dict[int, asyncio.Task], offset: int):
+        """取消offset之前（已被跳过）的预取请求"""
+        for page_offset in [o for o in pending if o < offset]:
+            pending.pop(page_offset).cancel()
+    
     def _paginated_search(self, keyword: str, offset: int = 0, count: int = 30) -> List[Dict]:
+        """执行分页搜索（同步封装）"""
+        return run_sync(self._paginated_search_async(keyword, offset, count))
+    
+    async def _paginated_search_async(self, keyword: str, offset: int = 0, count: int = 30) -> List[Dict]:
         """执行分页搜索"""
         url = f"{self.client.base_url}/api/v1/tiktok/app/v3/fetch_general_search_result"
         
@@ -155,7 +262,7 @@ class FullScaleSearchEngine:
         # 使用重试机制
         for attempt in range(self.max_retries):
             try:
-                result = self.client._make_request(url, params)
+                result = await self.client._make_request_async(url, params)
                 if result:
                     data = result.get("data", {})
                     items = data.get("data", [])
@@ -168,11 +275,11 @@ class FullScaleSearchEngine:
                     return videos
                 else:
                     logger.warning(f"搜索失败，尝试 {attempt + 1}/{self.max_retries}")
-                    time.sleep(2 ** attempt)  # 指数退避
+                    await asyncio.sleep(2 ** attempt)  # 指数退避
                     
             except Exception as e:
                 logger.error(f"搜索异常 {attempt + 1}/{self.max_retries}: {e}")
-                time.sleep(2 ** attempt)
+                await asyncio.sleep(2 ** attempt)
         
         return []
     
@@ -186,6 +293,11 @@ class FullScaleSearchEngine:
                 new_videos.append(video)
         return new_videos
     
+    @staticmethod
+    def _creator_key(creator: Dict) -> str:
+        """创作者去重键，与 _extract_and_deduplicate_creators 保持一致"""
+        return creator.get("unique_id") or creator.get("user_id") or creator.get("sec_user_id", "")
+    
     def _extract_and_deduplicate_creators(self, videos: List[Dict]) -> List[Dict]:
         """提取并去重创作者"""
         new_creators = []
@@ -232,28 +344,50 @@ class FullScaleSearchEngine:
         
         return new_creators
     
-    def _save_intermediate_results(self, keyword: str, search_count: int):
-        """保存中间结果"""
+    def _open_intermediate_journal(self, keyword: str) -> JsonlJournal:
+        """打开本次搜索的中间结果日志 (JSONL，只追加)"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"output/intermediate_{keyword}_{search_count}_{timestamp}.json"
-        
-        data = {
-            "keyword": keyword,
-            "search_count": search_count,
-            "total_creators": len(self.collected_creators),
-            "total_videos": len(self.seen_video_ids),
-            "creators": self.collected_creators
-        }
+        return JsonlJournal(
+            f"output/intermediate_{keyword}_{timestamp}.jsonl",
+            fsync_every=self.journal_fsync_every,
+            max_bytes=self.journal_max_bytes
+        )
+    
+    def _journal_page(self, journal: JsonlJournal, new_videos: List[Dict], new_creators: List[Dict]):
+        """把一页新增的视频（精简字段）和创作者追加到中间结果日志"""
+        records = []
+        for video in new_videos:
+            author = video.get("author") or {}
+            records.append({
+                "type": "video",
+                "aweme_id": video.get("aweme_id", ""),
+                "author": author.get("unique_id") or author.get("uid") or author.get("sec_uid", ""),
+                "create_time": video.get("create_time", 0),
+                "play_count": video.get("statistics", {}).get("play_count", 0)
+            })
+        records.extend(dict(creator, type="creator") for creator in new_creators)
         
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            logger.info(f"💾 中间结果已保存: {filename}")
+            journal.extend(records)
         except Exception as e:
-            logger.error(f"保存中间结果失败: {e}")
+            logger.error(f"写入中间结果失败: {e}")
     
-    def enhance_creators_batch(self, creators: List[Dict], batch_size: int = 50) -> List[Dict]:
-        """批量增强创作者数据"""
+    def enhance_creators_batch(self, creators: List[Dict], batch_size: int = 50, workers: int = None) -> List[Dict]:
+        """
+        批量增强创作者数据
+        
+        Args:
+            creators: 待增强的创作者列表
+            batch_size: 每处理多少个创作者输出一次进度
+            workers: 并发数，默认使用 self.enhance_workers；1 表示逐个处理
+            
+        Returns:
+            List[Dict]: 增强后的创作者列表，顺序与输入一致，失败的创作者被跳过
+        """
+        workers = workers or self.enhance_workers
+        if workers > 1:
+            return run_sync(self.enhance_creators_batch_async(creators, batch_size, workers))
+        
         logger.info(f"🔧 开始批量增强 {len(creators)} 个创作者的数据")
         
         enhanced_creators = []
@@ -265,83 +399,201 @@ class FullScaleSearchEngine:
             
             logger.info(f"📦 处理批次 {batch_num}/{total_batches} ({len(batch)} 个创作者)")
             
+            batch_enhanced = []
             for j, creator in enumerate(batch, 1):
                 try:
+                    key = self._creator_key(creator)
+                    if key in self.restored_enhancements:
+                        batch_enhanced.append(self.restored_enhancements[key])
+                        continue
+                    
                     logger.info(f"📊 增强创作者 {i+j}/{len(creators)}: {creator.get('nickname', 'Unknown')}")
                     enhanced = self.client.enhance_creator_data(creator)
                     
                     if enhanced:
-                        # 应用字段顺序和数据处理
-                        processed = self._process_creator_data(enhanced)
-                        enhanced_creators.append(processed)
+                        batch_enhanced.append(enhanced)
+                        if self.checkpoint:
+                            self.checkpoint.record_enhanced(key, enhanced)
                     
                 except Exception as e:
                     logger.error(f"增强创作者数据失败: {e}")
                     continue
             
-            # 批次间休息
-            if batch_num < total_batches:
-                logger.info(f"⏳ 批次完成，休息1秒...")
-                time.sleep(1)
+            # 应用字段顺序和数据处理，整批一次计算
+            enhanced_creators.extend(self._process_creator_batch(batch_enhanced))
+        
+        logger.info(f"✅ 批量增强完成: {len(enhanced_creators)}/{len(creators)} 成功")
+        return enhanced_creators
+    
+    async def enhance_creators_batch_async(self, creators: List[Dict], batch_size: int = 50, workers: int = None) -> List[Dict]:
+        """并发增强创作者数据，结果保持输入顺序"""
+        workers = workers or self.enhance_workers
+        logger.info(f"🔧 开始并发增强 {len(creators)} 个创作者的数据 (并发数: {workers})")
+        
+        semaphore = self.enhance_semaphore or asyncio.Semaphore(workers)
+        progress = {"done": 0}
+        
+        async def enhance(creator: Dict) -> Optional[Dict]:
+            enhanced = await self._enhance_one_async(creator, semaphore)
+            progress["done"] += 1
+            if progress["done"] % batch_size == 0:
+                logger.info(f"📦 增强进度 {progress['done']}/{len(creators)}")
+            return enhanced
+        
+        # gather 按输入顺序返回结果，全部到齐后整批处理
+        results = await asyncio.gather(*(enhance(creator) for creator in creators))
+        enhanced_creators = self._process_creator_batch([enhanced for enhanced in results if enhanced])
         
         logger.info(f"✅ 批量增强完成: {len(enhanced_creators)}/{len(creators)} 成功")
         return enhanced_creators
     
-    def _process_creator_data(self, enhanced: Dict) -> Dict:
-        """处理创作者数据，应用字段顺序"""
-        # 计算平均播放数
+    async def _enhance_one_async(self, creator: Dict, semaphore: asyncio.Semaphore) -> Optional[Dict]:
+        """增强单个创作者，返回接口的原始增强数据（由调用方整批处理），失败时返回None而不影响其他创作者"""
+        key = self._creator_key(creator)
+        
+        # 检查点里已有的增强结果直接复用，不再重复请求
+        if key in self.restored_enhancements:
+            return self.restored_enhancements[key]
+        
+        enhanced = await self._enhance_shared_async(creator, semaphore)
+        if enhanced and self.checkpoint:
+            self.checkpoint.record_enhanced(key, enhanced)
+        return enhanced
+    
+    async def _enhance_shared_async(self, creator: Dict, semaphore: asyncio.Semaphore) -> Optional[Dict]:
+        if self.shared_enhancements is None:
+            return await self._enhance_uncached_async(creator, semaphore)
+        
+        # 跨关键词去重：同一创作者只增强一次，其他关键词复用结果
+        key = self._creator_key(creator)
+        future = self.shared_enhancements.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.shared_enhancements[key] = future
+            try:
+                future.set_result(await self._enhance_uncached_async(creator, semaphore))
+            except BaseException:
+                # 被取消时让其他关键词自行重试
+                del self.shared_enhancements[key]
+                future.cancel()
+                raise
+            if future.result() is None:
+                # 增强失败不缓存：正在等待的关键词拿到失败结果，之后的关键词重新增强
+                del self.shared_enhancements[key]
+        else:
+            try:
+                await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                return await self._enhance_shared_async(creator, semaphore)
+            logger.debug(f"♻️ 复用已增强的创作者: {key}")
+        
+        # 原始数据只读，各关键词处理时另生成新字典
+        return future.result()
+    
+    async def _enhance_uncached_async(self, creator: Dict, semaphore: asyncio.Semaphore) -> Optional[Dict]:
+        async with semaphore:
+            try:
+                logger.debug(f"📊 增强创作者: {creator.get('nickname', 'Unknown')}")
+                enhanced = await self.client.enhance_creator_data_async(creator)
+                if enhanced:
+                    return enhanced
+            except Exception as e:
+                logger.error(f"增强创作者数据失败 {creator.get('nickname', 'Unknown')}: {e}")
+        return None
+    
+    async def search_and_enhance_pipelined_async(self, keyword: str, target_creators: int = 1000,
+                                                 workers: int = None, queue_size: int = None) -> Tuple[List[Dict], List[Dict]]:
+        """
+        流水线模式：搜索到的创作者立即进入有界队列，由增强任务并发消费
+        
+        队列满时搜索协程会等待（背压）。搜索结束后按两阶段模式相同的规则
+        选出最终创作者并按其顺序输出，结果与 full_scale_search + enhance_creators_batch 一致；
+        因超出目标数量而被截掉的创作者最多只多增强一页
+        
+        Returns:
+            Tuple[List[Dict], List[Dict]]: (搜索得到的创作者, 增强后的创作者)
+        """
+        workers = workers or self.enhance_workers
+        queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or workers * 4)
+        semaphore = self.enhance_semaphore or asyncio.Semaphore(workers)
+        enhanced_by_key: Dict[str, Dict] = {}
+        start_time = time.time()
+        
+        async def consume():
+            while True:
+                creator = await queue.get()
+                try:
+                    if creator is None:
+                        return
+                    enhanced = await self._enhance_one_async(creator, semaphore)
+                    if enhanced:
+                        if not enhanced_by_key:
+                            logger.info(f"⚡ 首个创作者增强完成，用时 {time.time() - start_time:.1f} 秒")
+                        enhanced_by_key[self._creator_key(creator)] = enhanced
+                finally:
+                    queue.task_done()
+        
+        async def produce(new_creators: List[Dict]):
+            for creator in new_creators:
+                await queue.put(creator)
+        
+        async def search() -> List[Dict]:
+            # 从检查点恢复时，先把已收集的创作者投入队列（已增强过的会直接复用结果）
+            await produce(list(self.collected_creators))
+            found = await self.full_scale_search_async(keyword, target_creators, on_new_creators=produce)
+            for _ in range(workers):
+                await queue.put(None)
+            return found
+        
+        logger.info(f"🔀 流水线模式: {workers} 个增强任务, 队列容量 {queue.maxsize}")
+        searcher = asyncio.create_task(search())
+        tasks = [searcher] + [asyncio.create_task(consume()) for _ in range(workers)]
+        
+        try:
+            # 任何一个任务出错都立即结束：搜索可能正等在已满的队列上，不能等它自己退出
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        raw_creators = searcher.result()
+        
+        enhanced_creators = self._process_creator_batch(
+            [enhanced_by_key[key] for key in map(self._creator_key, raw_creators) if key in enhanced_by_key])
+        logger.info(f"✅ 流水线完成: {len(enhanced_creators)}/{len(raw_creators)} 个创作者增强成功")
+        return raw_creators, enhanced_creators
+    
+    def _process_creator_batch(self, creators: List[Dict]) -> List[Dict]:
+        """批量处理创作者数据，整批的简介一次解析、指标一次向量化计算"""
+        bios = analyze_bios(creator.get("signature", "") for creator in creators)
+        metrics = score_creators(creators).records()
+        return [
+            self._process_creator_data(creator, BioFields([email], [link], [language]), creator_metrics)
+            for creator, email, link, language, creator_metrics
+            in zip(creators, bios.emails, bios.links, bios.languages, metrics)
+        ]
+    
+    def _process_creator_data(self, enhanced: Dict, bio: BioFields = None, metrics: Dict = None) -> Dict:
+        """
+        处理创作者数据，应用字段顺序
+        
+        bio / metrics 为批量预先算好的单条简介解析结果和指标，不传则现场计算
+        """
         video_1_count = enhanced.get("video_1_play_count", 0)
         video_2_count = enhanced.get("video_2_play_count", 0)
         video_3_count = enhanced.get("video_3_play_count", 0)
         video_4_count = enhanced.get("video_4_play_count", 0)
         video_5_count = enhanced.get("video_5_play_count", 0)
         
-        video_counts = [video_1_count, video_2_count, video_3_count, video_4_count, video_5_count]
-        valid_counts = [count for count in video_counts if count > 0]
-        avg_play_count = sum(valid_counts) / len(valid_counts) if valid_counts else 0
-        
-        # 计算中位数播放量
-        if valid_counts:
-            sorted_counts = sorted(valid_counts)
-            n = len(sorted_counts)
-            if n % 2 == 0:
-                # 偶数个数，取中间两个数的平均值
-                median_view_count = (sorted_counts[n//2 - 1] + sorted_counts[n//2]) / 2
-            else:
-                # 奇数个数，取中间的数
-                median_view_count = sorted_counts[n//2]
-        else:
-            median_view_count = 0
-        
-        # 计算预期价格: 使用新的复杂公式
-        # weighted_views = 0.4 * V1 + 0.25 * V2 + 0.15 * V3 + 0.1 * V4 + 0.1 * V5
-        weights = [0.4, 0.25, 0.15, 0.1, 0.1]
-        weighted_views = 0
-        for i, count in enumerate([video_1_count, video_2_count, video_3_count, video_4_count, video_5_count]):
-            if i < len(weights) and count > 0:
-                weighted_views += weights[i] * count
-        
-        # follower_factor = log10(follower_count + 1)
-        follower_count = enhanced.get("follower_count", 0)
-        follower_factor = math.log10(follower_count + 1) if follower_count >= 0 else 0
-        
-        # engagement_rate = (total_likes_count / total_video_count) / avg_video_play_count
-        total_likes = enhanced.get("total_favorited", 0)
-        total_videos = enhanced.get("aweme_count", 1)  # 避免除零
-        if total_videos > 0 and avg_play_count > 0:
-            engagement_rate = (total_likes / total_videos) / avg_play_count
-        else:
-            engagement_rate = 0
-        
-        # final_price = max(80, weighted_views/1000 * 1 + follower_factor * 5 + engagement_rate * 50)
-        calculated_price = (weighted_views / 1000) * 1 + follower_factor * 5 + engagement_rate * 50
-        expected_price = max(80, calculated_price)
+        # 平均/中位数播放量和预期价格（公式见 creator_metrics）
+        metrics = metrics or score_creators([enhanced]).records()[0]
         
-        # 提取邮箱
+        # 解析简介：邮箱；主页接口没有返回链接时用简介里的（语言只用主页接口的，识别不出时留空）
         bio_description = enhanced.get("signature", "")
-        email = self.client._extract_email_from_bio(bio_description)
-        if not email:
-            email = ""
+        bio = bio or analyze_bios([bio_description])
+        email = bio.emails[0]
         
         # 获取活跃度
         days_since_last_video = enhanced.get("days_since_last_video", -1)
@@ -354,14 +606,14 @@ class FullScaleSearchEngine:
             "follower_count": enhanced.get("follower_count", 0),
             "total_video_count": enhanced.get("aweme_count", 0),
             "total_likes_count": enhanced.get("total_favorited", 0),
-            "avg_video_play_count": int(avg_play_count),
-            "median_view_count": int(median_view_count),
-            "expected_price": round(expected_price, 2),
+            "avg_video_play_count": metrics["avg_video_play_count"],
+            "median_view_count": metrics["median_view_count"],
+            "expected_price": metrics["expected_price"],
             "days_since_last_video": days_since_last_video,
             "tiktok_account_url": enhanced.get("tiktok_account_url", ""),
             "tiktok_account_bio_description": bio_description,
             "email": email,
-            "bio_link_url": enhanced.get("bio_link_url", ""),
+            "bio_link_url": enhanced.get("bio_link_url") or bio.links[0],
             "language": enhanced.get("language", ""),
             "latest_video_link": enhanced.get("video_1_link", ""),
             "latest_video_play_count": video_1_count,
@@ -372,7 +624,8 @@ class FullScaleSearchEngine:
             "fourth_latest_video_link": enhanced.get("video_4_link", ""),
             "fourth_latest_video_play_count": video_4_count,
             "fifth_latest_video_link": enhanced.get("video_5_link", ""),
-            "fifth_latest_video_play_count": video_5_count
+            "fifth_latest_video_play_count": video_5_count,
+            "enhancement_missing": "; ".join(enhanced.get("enhancement_missing", []))
         }
     
     def save_results(self, keyword: str, enhanced_creators: List[Dict], output_format: str = "csv", keyword_index: int = 1) -> Dict[str, str]:
@@ -445,7 +698,14 @@ class FullScaleSearchEngine:
             ]
         }
 
-def process_single_keyword(engine, keyword: str, target_creators: int, enhance_data: bool, output_format: str) -> dict:
+def process_single_keyword(engine, keyword: str, target_creators: int, enhance_data: bool, output_format: str,
+                           pipeline: bool = False, resume: bool = False) -> dict:
+    """处理单个关键词的搜索（同步封装）"""
+    return run_sync(process_single_keyword_async(engine, keyword, target_creators, enhance_data, output_format,
+                                                 pipeline, resume))
+
+async def process_single_keyword_async(engine, keyword: str, target_creators: int, enhance_data: bool, output_format: str,
+                                       pipeline: bool = False, resume: bool = False) -> dict:
     """处理单个关键词的搜索"""
     print(f"\n🔍 开始搜索关键词: '{keyword}'")
     print(f"目标数量: {target_creators} | 增强数据: {'是' if enhance_data else '否'}")
@@ -454,31 +714,45 @@ def process_single_keyword(engine, keyword: str, target_creators: int, enhance_d
     start_time = time.time()
     
     # 重置引擎状态（清空之前的收集结果）
-    engine.seen_creator_ids.clear()
-    engine.seen_video_ids.clear()
-    engine.collected_creators.clear()
-    
-    # 第一阶段：全量搜索
-    print("📦 第一阶段: 全量搜索创作者...")
-    raw_creators = engine.full_scale_search(keyword, target_creators)
-    
-    if not raw_creators:
-        print(f"❌ 关键词 '{keyword}' 未找到任何创作者")
-        return {"keyword": keyword, "success": False, "creators": [], "file_paths": {}, "time": 0}
+    engine.reset_state()
     
-    phase1_time = time.time() - start_time
-    print(f"✅ 第一阶段完成: {len(raw_creators)} 个创作者, 用时 {phase1_time/60:.1f} 分钟")
+    # 检查点：--resume 时从日志恢复，否则重新开始记录
+    engine.checkpoint = SearchCheckpoint.for_keyword(keyword)
+    state = engine.checkpoint.load() if resume else None
+    if state:
+        engine.restore_from_checkpoint(state)
+        print(f"♻️ 从检查点恢复: 已收集 {len(engine.collected_creators)} 个创作者, "
+              f"已增强 {len(engine.restored_enhancements)} 个, 下一页 offset={state['next_offset']}")
+    else:
+        engine.checkpoint.reset()
     
-    # 第二阶段：数据增强
-    if enhance_data:
-        print(f"📊 第二阶段: 数据增强...")
-        enhanced_creators = engine.enhance_creators_batch(raw_creators)
+    if enhance_data and pipeline:
+        # 流水线模式：搜索与增强同时进行
+        print("🔀 流水线模式: 边搜索边增强...")
+        raw_creators, enhanced_creators = await engine.search_and_enhance_pipelined_async(keyword, target_creators)
+        
+        if not raw_creators:
+            print(f"❌ 关键词 '{keyword}' 未找到任何创作者")
+            return {"keyword": keyword, "success": False, "creators": [], "file_paths": {}, "time": 0}
     else:
-        # 不增强数据，直接处理
-        enhanced_creators = []
-        for creator in raw_creators:
-            processed = engine._process_creator_data(creator)
-            enhanced_creators.append(processed)
+        # 第一阶段：全量搜索
+        print("📦 第一阶段: 全量搜索创作者...")
+        raw_creators = await engine.full_scale_search_async(keyword, target_creators)
+        
+        if not raw_creators:
+            print(f"❌ 关键词 '{keyword}' 未找到任何创作者")
+            return {"keyword": keyword, "success": False, "creators": [], "file_paths": {}, "time": 0}
+        
+        phase1_time = time.time() - start_time
+        print(f"✅ 第一阶段完成: {len(raw_creators)} 个创作者, 用时 {phase1_time/60:.1f} 分钟")
+        
+        # 第二阶段：数据增强
+        if enhance_data:
+            print(f"📊 第二阶段: 数据增强...")
+            enhanced_creators = await engine.enhance_creators_batch_async(raw_creators)
+        else:
+            # 不增强数据，直接处理
+            enhanced_creators = engine._process_creator_batch(raw_creators)
     
     total_time = time.time() - start_time
     
@@ -490,8 +764,11 @@ def process_single_keyword(engine, keyword: str, target_creators: int, enhance_d
                                  key=lambda x: x.get('follower_count', 0), 
                                  reverse=True)[:target_creators]
     
-    # 保存结果
-    file_paths = engine.save_results(keyword, enhanced_creators, output_format)
+    # 保存结果（写文件放到线程里，不阻塞其他关键词）
+    file_paths = await asyncio.to_thread(engine.save_results, keyword, enhanced_creators, output_format)
+    
+    # 结果已保存，检查点不再需要
+    engine.checkpoint.reset()
     
     # 显示结果
     print(f"✅ 关键词 '{keyword}' 搜索完成!")
@@ -510,13 +787,71 @@ def process_single_keyword(engine, keyword: str, target_creators: int, enhance_d
         "time": total_time
     }
 
+class MultiKeywordScheduler:
+    """
+    多关键词调度器
+    
+    多个关键词同时运行，共享同一个客户端（令牌桶、连接池、响应缓存）
+    和同一个增强并发池；每个关键词使用独立的引擎，去重状态和输出文件互不影响。
+    开启跨关键词去重后，已在其他关键词下增强过的创作者直接复用结果
+    """
+    
+    def __init__(self, max_concurrent_keywords: int = None, enhance_workers: int = None,
+                 cross_keyword_dedupe: bool = True):
+        self.client = ComprehensiveSearchClient()
+        self.max_concurrent_keywords = max_concurrent_keywords or int(os.getenv('KEYWORD_CONCURRENCY', '3'))
+        self.enhance_workers = enhance_workers or int(os.getenv('ENHANCE_WORKERS', '8'))
+        self.cross_keyword_dedupe = cross_keyword_dedupe
+        self.engines: Dict[str, FullScaleSearchEngine] = {}
+    
+    def run(self, keywords: List[str], target_creators: int, enhance_data: bool,
+            output_format: str, pipeline: bool = True, resume: bool = False) -> List[dict]:
+        """运行所有关键词（同步封装）"""
+        return run_sync(self.run_async(keywords, target_creators, enhance_data, output_format, pipeline, resume))
+    
+    async def run_async(self, keywords: List[str], target_creators: int, enhance_data: bool,
+                        output_format: str, pipeline: bool = True, resume: bool = False) -> List[dict]:
+        """运行所有关键词，结果顺序与keywords一致；resume=True 时从各关键词的检查点继续"""
+        keyword_slots = asyncio.Semaphore(self.max_concurrent_keywords)
+        enhance_semaphore = asyncio.Semaphore(self.enhance_workers)
+        shared_enhancements = {} if self.cross_keyword_dedupe else None
+        first_file_number = None
+        
+        async def run_keyword(index: int, keyword: str) -> dict:
+            nonlocal first_file_number
+            async with keyword_slots:
+                engine = FullScaleSearchEngine(client=self.client)
+                engine.enhance_workers = self.enhance_workers
+                engine.enhance_semaphore = enhance_semaphore
+                engine.shared_enhancements = shared_enhancements
+                # 文件编号按关键词顺序分配，避免并发时冲突
+                if first_file_number is None:
+                    first_file_number = engine.next_file_number
+                engine.next_file_number = first_file_number + index
+                self.engines[keyword] = engine
+                
+                print(f"\n🚀 处理关键词 {index + 1}/{len(keywords)}: '{keyword}'")
+                try:
+                    return await process_single_keyword_async(engine, keyword, target_creators,
+                                                              enhance_data, output_format, pipeline, resume)
+                except Exception as e:
+                    logger.error(f"关键词 '{keyword}' 处理失败: {e}", exc_info=True)
+                    return {"keyword": keyword, "success": False, "creators": [], "file_paths": {}, "time": 0}
+        
+        return await asyncio.gather(*(run_keyword(i, keyword) for i, keyword in enumerate(keywords)))
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="TikTok全量创作者搜索系统")
+    parser.add_argument("--resume", action="store_true",
+                        help="从上次中断的检查点继续（output/checkpoints/）")
+    args = parser.parse_args()
+    
     print("🚀 TikTok全量创作者搜索系统")
     print("支持多关键词搜索，智能去重，基于官方配置优化")
     print("="*70)
     
-    engine = FullScaleSearchEngine()
+    scheduler = MultiKeywordScheduler()
     
     try:
         # 获取搜索参数
@@ -544,35 +879,41 @@ def main():
         enhance_choice = input("是否获取详细视频数据? (会显著增加时间) (y/n，默认y): ").strip().lower() or "y"
         enhance_data = enhance_choice in ['y', 'yes', '是']
         
+        pipeline = False
+        if enhance_data:
+            pipeline_choice = input("是否边搜索边增强(流水线模式)? (y/n，默认y): ").strip().lower() or "y"
+            pipeline = pipeline_choice in ['y', 'yes', '是']
+        
+        if len(keywords) > 1:
+            try:
+                scheduler.max_concurrent_keywords = int(input(f"同时处理的关键词数（默认{scheduler.max_concurrent_keywords}）: ") or scheduler.max_concurrent_keywords)
+            except ValueError:
+                pass
+            if enhance_data:
+                dedupe_choice = input("不同关键词下的相同创作者只增强一次? (y/n，默认y): ").strip().lower() or "y"
+                scheduler.cross_keyword_dedupe = dedupe_choice in ['y', 'yes', '是']
+        
         print(f"\n🎯 搜索配置:")
         print(f"关键词数量: {len(keywords)}")
         print(f"每个关键词目标: {target_creators} 个创作者")
-        print(f"增强数据: {'是' if enhance_data else '否'}")
+        print(f"增强数据: {'是' if enhance_data else '否'} (并发数: {scheduler.enhance_workers}{', 流水线模式' if pipeline else ''})")
+        print(f"同时处理关键词: {min(scheduler.max_concurrent_keywords, len(keywords))} 个")
         print(f"输出格式: {output_format}")
-        print(f"配置: QPS=10, 重试=3次, 超时=45s")
+        print(f"配置: QPS={scheduler.client.rate_limiter.qps:g}, 重试=3次, 超时=45s")
         print("="*70)
         
         overall_start_time = time.time()
-        all_results = []
         total_creators = 0
         
-        # 逐个处理关键词
-        for i, keyword in enumerate(keywords, 1):
-            print(f"\n🚀 处理关键词 {i}/{len(keywords)}: '{keyword}'")
-            
-            result = process_single_keyword(engine, keyword, target_creators, enhance_data, output_format)
-            all_results.append(result)
-            
+        # 多个关键词并发处理，共享限流额度和增强并发池
+        all_results = scheduler.run(keywords, target_creators, enhance_data, output_format, pipeline, args.resume)
+        
+        for result in all_results:
             if result["success"]:
                 total_creators += len(result["creators"])
-                print(f"📁 生成文件:")
+                print(f"📁 '{result['keyword']}' 生成文件:")
                 for file_type, path in result["file_paths"].items():
                     print(f"  📄 {file_type}: {path}")
-            
-            # 关键词间休息（除了最后一个）
-            if i < len(keywords):
-                print(f"⏳ 准备处理下一个关键词...")
-                time.sleep(2)
         
         overall_time = time.time() - overall_start_time
         
@@ -584,6 +925,9 @@ def main():
         print(f"  • 成功关键词: {sum(1 for r in all_results if r['success'])} 个")
         print(f"  • 总创作者数: {total_creators} 个")
         print(f"  • 平均每个关键词: {total_creators/len(keywords):.1f} 个")
+        if scheduler.client.cache:
+            cache_stats = scheduler.client.cache.stats()
+            print(f"  • 响应缓存: 命中 {cache_stats['hits']} 次 / 未命中 {cache_stats['misses']} 次 (命中率 {cache_stats['hit_rate']:.0%})")
         
         # 显示每个关键词的结果
         print(f"\n📋 详细结果:")
@@ -594,8 +938,10 @@ def main():
         
     except KeyboardInterrupt:
         print(f"\n⚠️ 用户中断执行")
-        if hasattr(engine, 'collected_creators') and engine.collected_creators:
-            print(f"💾 保存已收集的 {len(engine.collected_creators)} 个创作者...")
+        for keyword, engine in scheduler.engines.items():
+            if engine.collected_creators:
+                print(f"💾 '{keyword}' 已收集 {len(engine.collected_creators)} 个创作者")
+        print("💡 进度已写入检查点，使用相同关键词加 --resume 参数运行即可继续")
     except Exception as e:
         print(f"\n❌ 程序出错: {e}")
         logger.error(f"程序出错: {e}", exc_info=True)